@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import threading
 import time
 from collections.abc import Mapping
-from copy import deepcopy
-from typing import TYPE_CHECKING, Any, Generic, TypeVar
+from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar
+
+from .util import freeze, freeze_shallow
 
 if TYPE_CHECKING:
     from .device import Device
@@ -11,6 +13,12 @@ if TYPE_CHECKING:
 AnyDataPointType = str, int | float | str | bytes | Mapping[str, Any] | None
 DataPointTypeVar = TypeVar("DataPointTypeVar")
 
+# Results of DataPoint.should_push()
+DROP = 0
+PUSH = 1
+# Deliver even if the host already has the same value
+FORCE_PUSH = 2
+
 
 class DataPoint(Generic[DataPointTypeVar]):
     def __init__(
@@ -19,6 +27,7 @@ class DataPoint(Generic[DataPointTypeVar]):
         datapoint_name: str,
         requestable: bool = True,
         writable: bool = True,
+        handle: Any = None,
     ):
         self.device = device
         self.datapoint_name = datapoint_name
@@ -26,18 +35,76 @@ class DataPoint(Generic[DataPointTypeVar]):
             device.name, datapoint_name
         )
 
+        self.handle = handle
+        """Opaque handle the host returned when the point was registered.
+        If set, get and set go straight through it instead of by name."""
+
+        self._host = device.host
+
     def __repr__(self) -> str:
         formarttedtime = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
         return f"<{self.__class__.__name__}({self.full_name}): {str(self.get()[0])[:20]} at {formarttedtime} annotation={str(self.get()[2])[:20]}>"  # noqa: E501
 
     def get(self) -> tuple[DataPointTypeVar, float, Any]:
-        raise NotImplementedError
+        if self.handle is not None:
+            return self._host.get_data_point_by_handle(self.handle)
+        return self._get_by_name()
 
     def set(
         self,
         value: DataPointTypeVar,
         timestamp: float | None = None,
         annotation: Any | None = None,
+        *,
+        take_ownership: bool = False,
+    ) -> None:
+        """Args:
+        take_ownership: The caller promises to never touch value
+            again, so it can be stored without copying it.
+        """
+        value = self.coerce(value, take_ownership)
+        push = self.should_push(value)
+        if push:
+            self.push(value, timestamp, annotation, push == FORCE_PUSH)
+
+    def push(
+        self,
+        value: DataPointTypeVar,
+        timestamp: float | None = None,
+        annotation: Any | None = None,
+        force: bool = False,
+    ) -> None:
+        """Hand an already coerced value to the host,
+        skipping should_push()."""
+        if self.handle is not None:
+            self._host.set_data_point_by_handle(
+                self.handle, value, timestamp, annotation, force
+            )
+        else:
+            self._set_by_name(value, timestamp, annotation, force)
+
+    def coerce(
+        self, value: Any, take_ownership: bool = False
+    ) -> DataPointTypeVar:
+        """Convert a value into the form the host stores for this point,
+        the same way set() would."""
+        return value
+
+    def should_push(self, value: DataPointTypeVar) -> int:
+        """Called with the coerced value before it goes to the host.
+        Returns DROP to silently drop the update, PUSH, or FORCE_PUSH
+        to deliver it even if it is the same as the last value."""
+        return PUSH
+
+    def _get_by_name(self) -> tuple[DataPointTypeVar, float, Any]:
+        raise NotImplementedError
+
+    def _set_by_name(
+        self,
+        value: DataPointTypeVar,
+        timestamp: float | None,
+        annotation: Any | None,
+        force: bool = False,
     ) -> None:
         raise NotImplementedError
 
@@ -49,76 +116,166 @@ class DataPoint(Generic[DataPointTypeVar]):
 
 
 class StringDataPoint(DataPoint[str]):
-    def get(self) -> tuple[str, float, Any]:
-        return self.device.host.get_string(
-            self.device.name, self.datapoint_name
-        )
+    def _get_by_name(self) -> tuple[str, float, Any]:
+        return self._host.get_string(self.device.name, self.datapoint_name)
 
-    def set(
+    def _set_by_name(
         self,
         value: str,
-        timestamp: float | None = None,
-        annotation: Any | None = None,
+        timestamp: float | None,
+        annotation: Any | None,
+        force: bool = False,
     ) -> None:
-        self.device.host.set_string(
-            self.device.name, self.datapoint_name, value, timestamp, annotation
+        self._host.set_string(
+            self.device.name,
+            self.datapoint_name,
+            value,
+            timestamp,
+            annotation,
+            force,
         )
 
 
 class NumericDataPoint(DataPoint[float]):
-    def get(self) -> tuple[float, float, Any]:
-        return self.device.host.get_number(
-            self.device.name, self.datapoint_name
-        )
+    def __init__(
+        self,
+        device: Device,
+        datapoint_name: str,
+        requestable: bool = True,
+        writable: bool = True,
+        handle: Any = None,
+        *,
+        deadband: float = 0,
+        deadband_mode: Literal["abs", "pct"] = "abs",
+        max_silence: float = 0,
+        hi: float | None = None,
+        lo: float | None = None,
+    ):
+        super().__init__(device, datapoint_name, requestable, writable, handle)
+        self.deadband = deadband
+        self.deadband_mode = deadband_mode
+        self.max_silence = max_silence
+        self.hi = hi
+        self.lo = lo
 
-    def set(
+        # Last value that passed the deadband, and time.monotonic() then.
+        # set() may be called from any thread.
+        self._push_lock = threading.Lock()
+        self._pushed_value: float | None = None
+        self._pushed_time = 0.0
+
+    def coerce(self, value: float | int, take_ownership: bool = False) -> float:
+        return float(value)
+
+    def should_push(self, value: float) -> int:
+        """Absorb changes smaller than the deadband. Crossing hi or lo
+        always goes through. After max_silence seconds without a push,
+        the next value is forced through even if it is unchanged,
+        as a heartbeat, with or without a deadband."""
+        if not self.deadband and not self.max_silence:
+            return PUSH
+
+        with self._push_lock:
+            now = time.monotonic()
+            last = self._pushed_value
+
+            if last is None:
+                result = PUSH
+            elif (
+                self.max_silence and now - self._pushed_time >= self.max_silence
+            ):
+                result = FORCE_PUSH
+            else:
+                if self.deadband_mode == "pct":
+                    limit = abs(last) * self.deadband / 100
+                else:
+                    limit = self.deadband
+
+                result = PUSH
+                # The host would drop a repeat anyway, and it must not
+                # count as a push or the heartbeat never comes
+                if value == last or abs(value - last) < limit:
+                    hi = self.hi
+                    lo = self.lo
+                    if not (
+                        (hi is not None and (last >= hi) != (value >= hi))
+                        or (lo is not None and (last <= lo) != (value <= lo))
+                    ):
+                        return DROP
+
+            self._pushed_value = value
+            self._pushed_time = now
+            return result
+
+    def _get_by_name(self) -> tuple[float, float, Any]:
+        return self._host.get_number(self.device.name, self.datapoint_name)
+
+    def _set_by_name(
         self,
-        value: float | int,
-        timestamp: float | None = None,
-        annotation: Any | None = None,
+        value: float,
+        timestamp: float | None,
+        annotation: Any | None,
+        force: bool = False,
     ) -> None:
-        self.device.host.set_number(
+        self._host.set_number(
             self.device.name,
             self.datapoint_name,
-            float(value),
+            value,
             timestamp,
             annotation,
+            force,
         )
 
 
 class ObjectDataPoint(DataPoint[dict[str, Any]]):
-    def get(self) -> tuple[dict[str, Any], float, Any]:
-        return self.device.host.get_object(
-            self.device.name, self.datapoint_name
-        )
+    def coerce(
+        self, value: dict[str, Any], take_ownership: bool = False
+    ) -> dict[str, Any]:
+        """Values are stored frozen, see util.freeze. Frozen parts of
+        the value are shared rather than copied, and an owned value
+        only has it's top level wrapped, see util.freeze_shallow."""
+        if take_ownership:
+            return freeze_shallow(value)
+        return freeze(value)
 
-    def set(
+    def _get_by_name(self) -> tuple[dict[str, Any], float, Any]:
+        return self._host.get_object(self.device.name, self.datapoint_name)
+
+    def _set_by_name(
         self,
         value: dict[str, Any],
-        timestamp: float | None = None,
-        annotation: Any | None = None,
+        timestamp: float | None,
+        annotation: Any | None,
+        force: bool = False,
     ) -> None:
-        self.device.host.set_object(
+        self._host.set_object(
             self.device.name,
             self.datapoint_name,
-            deepcopy(value),
+            value,
             timestamp,
             annotation,
+            force,
         )
 
 
 class BytesDataPoint(DataPoint[bytes]):
-    def get(self) -> tuple[bytes, float, Any]:
-        return self.device.host.get_bytes(self.device.name, self.datapoint_name)
+    def _get_by_name(self) -> tuple[bytes, float, Any]:
+        return self._host.get_bytes(self.device.name, self.datapoint_name)
 
-    def set(
+    def _set_by_name(
         self,
         value: bytes,
-        timestamp: float | None = None,
-        annotation: Any | None = None,
+        timestamp: float | None,
+        annotation: Any | None,
+        force: bool = False,
     ) -> None:
-        self.device.host.set_bytes(
-            self.device.name, self.datapoint_name, value, timestamp, annotation
+        self._host.set_bytes(
+            self.device.name,
+            self.datapoint_name,
+            value,
+            timestamp,
+            annotation,
+            force,
         )
 
     def fast_push(
@@ -127,6 +284,6 @@ class BytesDataPoint(DataPoint[bytes]):
         timestamp: float | None = None,
         annotation: Any | None = None,
     ) -> None:
-        self.device.host.fast_push_bytes(
+        self._host.fast_push_bytes(
             self.device.name, self.datapoint_name, value, timestamp, annotation
         )
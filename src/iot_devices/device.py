@@ -1,25 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
 import copy
 import json
 import threading
+import time
 import traceback
 import warnings
 import weakref
-from collections.abc import Callable, Mapping
+from collections.abc import Callable, Iterable, Mapping
+from types import MappingProxyType
 from typing import Any, Literal, TypeVar, final
 
 import pydantic
-from jsonschema import validate
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 
 from . import host
 from .datapoints import (
+    FORCE_PUSH,
     BytesDataPoint,
     DataPoint,
     NumericDataPoint,
     ObjectDataPoint,
     StringDataPoint,
 )
+from .util import freeze
 
 # type alias
 
@@ -30,8 +37,69 @@ DeviceClassTypeVar = TypeVar("DeviceClassTypeVar", bound="Device")
 
 _devices_list_lock = threading.RLock()
 
-all_devices: dict[str, weakref.ref[Device]] = {}
+# The registry itself, only touched under _devices_list_lock.
+# Readers get an immutable snapshot via get_all_devices(), which is only
+# rebuilt when the generation has changed since the last one was made.
 _all_devices: dict[str, weakref.ref[Device]] = {}
+_all_devices_generation = 0
+_all_devices_snapshot: tuple[int, Mapping[str, weakref.ref[Device]]] = (
+    0,
+    MappingProxyType({}),
+)
+
+# Set from weakref callbacks, so dead entries get purged in bulk
+# the next time someone touches the registry.
+_all_devices_has_dead = False
+
+
+def _on_device_collected(_ref: weakref.ref[Device]) -> None:
+    # Runs inside the garbage collector, must not take locks.
+    global _all_devices_has_dead
+    _all_devices_has_dead = True
+
+
+def _purge_dead_devices() -> None:
+    """Must be called under _devices_list_lock"""
+    global _all_devices_has_dead, _all_devices_generation
+    if not _all_devices_has_dead:
+        return
+    _all_devices_has_dead = False
+    dead = [k for k, v in _all_devices.items() if v() is None]
+    for k in dead:
+        del _all_devices[k]
+    if dead:
+        _all_devices_generation += 1
+
+
+def _register_device(d: Device) -> None:
+    global _all_devices_generation
+    with _devices_list_lock:
+        _purge_dead_devices()
+        _all_devices[d.name] = weakref.ref(d, _on_device_collected)
+        _all_devices_generation += 1
+
+
+def get_all_devices() -> Mapping[str, weakref.ref[Device]]:
+    """Immutable snapshot of every device by name, safe to iterate.
+    Values are weak references that may already be dead.
+    """
+    global _all_devices_snapshot
+    generation, snapshot = _all_devices_snapshot
+    if generation == _all_devices_generation and not _all_devices_has_dead:
+        return snapshot
+
+    with _devices_list_lock:
+        _purge_dead_devices()
+        snapshot = MappingProxyType(dict(_all_devices))
+        _all_devices_snapshot = (_all_devices_generation, snapshot)
+    return snapshot
+
+
+def __getattr__(name: str) -> Any:
+    # all_devices used to be a plain module level dict
+    if name == "all_devices":
+        return get_all_devices()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _key_to_title(k: str) -> str:
@@ -42,6 +110,53 @@ def _key_to_title(k: str) -> str:
     return title
 
 
+def _legacy_property_type(v: Any) -> str:
+    """JSON schema type inferred for a legacy config value"""
+    if isinstance(v, bool):
+        return "boolean"
+    elif isinstance(v, int | float):
+        return "integer"
+    elif isinstance(v, str):
+        return "string"
+    elif isinstance(v, list):
+        return "array"
+    else:
+        return "object"
+
+
+class _CompiledSchema:
+    """A full schema and the validator compiled from it"""
+
+    __slots__ = ("source", "schema", "validator")
+
+    def __init__(self, source: dict[str, Any], schema: dict[str, Any]):
+        # The class level config_schema this was built from
+        self.source = source
+        self.schema = schema
+        validator_cls = validator_for(schema)
+        validator_cls.check_schema(schema)
+        self.validator = validator_cls(schema)
+
+
+_SCHEMA_CACHE_MAX_PER_CLASS = 256
+
+_schema_cache_lock = threading.Lock()
+
+# Full schemas by device class, then by (id(config_schema), is_subdevice,
+# legacy key), where the legacy key is the inferred property types of the
+# config for devices without a config_schema.
+_schema_cache: weakref.WeakKeyDictionary[
+    type[Device], dict[tuple[Any, ...], _CompiledSchema]
+] = weakref.WeakKeyDictionary()
+
+
+def clear_schema_cache() -> None:
+    """Forget all cached schemas. Only needed if you modify
+    a config_schema in place instead of assigning a new one."""
+    with _schema_cache_lock:
+        _schema_cache.clear()
+
+
 @final
 class DataRequest:
     pass
@@ -80,6 +195,12 @@ class Device:
         to the schema too.
     """
 
+    ready_after_init: bool = True
+    """If True, the host marks the device ready as soon as __init__ returns.
+        Devices that finish setting up asynchronously set this to False
+        and call set_ready() themselves.
+    """
+
     def __init__(self, config: dict[str, Any], **kw: Any):  # pylint: disable=unused-argument
         """
 
@@ -142,13 +263,26 @@ class Device:
 
         self.__closing = False
 
+        # Set by set_ready(), wait_ready() blocks on these
+        self.__ready = threading.Event()
+        self.__ready_future: concurrent.futures.Future[Device] = (
+            concurrent.futures.Future()
+        )
+
         self.host: host.Host = host.get_host()
 
         self.host_data: dict[str, Any] = {}
 
         self._name = config["name"]
 
-        self._config = copy.deepcopy(config)
+        self._config: Mapping[str, Any] = freeze(config)
+        """This dict is the signle source of truth for the configuration.
+            Device and host must both be aware that the other side may change
+            this.
+
+            Must be immutable!  It is a FrozenDict, changes replace the
+            whole thing.
+        """
 
         self.datapoint_getter_functions: dict[str, Callable] = {}
 
@@ -171,15 +305,7 @@ class Device:
 
         # Use the defaults
         if self.config_schema:
-            validate(config, self.get_full_schema())
-
-        self._config: Mapping[str, Any] = config
-        """This dict is the signle source of truth for the configuration.
-            Device and host must both be aware that the other side may change
-            this.
-
-            Must be immutable!
-        """
+            self._validate_config(config)
 
         self.title: str = _key_to_title(
             self._config.get("title", "").strip() or self.name
@@ -191,10 +317,7 @@ class Device:
         """Device instanes all have unique names not shared with anything
         else in that host."""
 
-        with _devices_list_lock:
-            global all_devices
-            _all_devices[self.name] = weakref.ref(self)
-            all_devices = copy.deepcopy(_all_devices)
+        _register_device(self)
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} {self.title} ({self.name})>"
@@ -228,8 +351,11 @@ class Device:
     def config(self) -> Mapping[str, Any]:
         """Immutable snapshot of config.  Any changes will not
         affect the device itself, you must use update_config for that.
+
+        This is a read only FrozenDict, so reading it costs nothing.
+        Use copy.deepcopy() on it to get an ordinary editable dict.
         """
-        return copy.deepcopy(self._config)
+        return self._config
 
     @property
     def is_subdevice(self) -> bool:
@@ -255,7 +381,58 @@ class Device:
     def get_full_schema(self) -> dict[str, Any]:
         """Returns a full normalized schema of the device. Including
         generic things all devices should have.
+
+        The schema is built once per class and cached, this returns
+        a fresh copy that is safe to modify.
         """
+        return copy.deepcopy(self._get_compiled_schema().schema)
+
+    @final
+    def _validate_config(self, config: Mapping[str, Any]) -> None:
+        """Validate a config against the full schema with the
+        cached validator, raising like jsonschema.validate() would."""
+        error = best_match(
+            self._get_compiled_schema().validator.iter_errors(config)
+        )
+        if error is not None:
+            raise error
+
+    @final
+    def _get_compiled_schema(self) -> _CompiledSchema:
+        cls = type(self)
+        source = self.config_schema
+        config = getattr(self, "_config", None) or {}
+
+        legacy_key = None
+        if not source:
+            legacy_key = tuple(
+                (k, _legacy_property_type(v)) for k, v in config.items()
+            )
+
+        key = (
+            id(source),
+            bool(config.get("is_subdevice", False)),
+            legacy_key,
+        )
+
+        per_class = _schema_cache.get(cls)
+        if per_class is not None:
+            entry = per_class.get(key)
+            # Identity check so a replaced schema never matches a reused id
+            if entry is not None and entry.source is source:
+                return entry
+
+        entry = _CompiledSchema(source, self._build_full_schema())
+
+        with _schema_cache_lock:
+            per_class = _schema_cache.setdefault(cls, {})
+            if len(per_class) > _SCHEMA_CACHE_MAX_PER_CLASS:
+                per_class.clear()
+            per_class[key] = entry
+        return entry
+
+    @final
+    def _build_full_schema(self) -> dict[str, Any]:
         d = copy.deepcopy(self.config_schema)
         if "properties" not in d:
             d["properties"] = {}
@@ -264,21 +441,13 @@ class Device:
 
         d["type"] = "object"
 
-        if not self.config_schema and hasattr(self, "config"):
+        if not self.config_schema and hasattr(self, "_config"):
             for i in self._config:
                 if i not in d["properties"]:
-                    v = self._config[i]
-                    title = _key_to_title(i)
-                    if isinstance(v, bool):
-                        d["properties"][i] = {"type": "boolean", "title": title}
-                    elif isinstance(v, int | float):
-                        d["properties"][i] = {"type": "integer", "title": title}
-                    elif isinstance(v, str):
-                        d["properties"][i] = {"type": "string", "title": title}
-                    elif isinstance(v, list):
-                        d["properties"][i] = {"type": "array", "title": title}
-                    else:
-                        d["properties"][i] = {"type": "object", "title": title}
+                    d["properties"][i] = {
+                        "type": _legacy_property_type(self._config[i]),
+                        "title": _key_to_title(i),
+                    }
 
         if "is_subdevice" in self._config and self._config["is_subdevice"]:
             d["properties"]["is_subdevice"] = {"type": "boolean", "const": True}
@@ -529,21 +698,43 @@ class Device:
             x[key] = value
 
         if self.config_schema:
-            validate(x, self.get_full_schema())
+            self._validate_config(x)
 
         self.update_config(x)
 
-    def wait_ready(self, timeout: float = 15):  # pylint: disable=unused-argument
+    @final
+    def set_ready(self):
+        """Mark the device as fully initialized, waking up anything
+        in wait_ready().  Devices with ready_after_init = False must
+        call this themselves, for everything else the host does it.
+        """
+        with self.__config_lock:
+            self.__ready.set()
+            if not self.__ready_future.done():
+                self.__ready_future.set_result(self)
+
+    def wait_ready(self, timeout: float = 15) -> bool:
         """Call this to block for up to timeout seconds for the
         device to be fully initialized.
         Use this in quick scripts with a devices
         that readies itself asynchronously.
 
-        May be implemented by the device, but is not required.
+        Returns:
+            True if the device is ready.
         """
-        warnings.warn(
-            "This device does not implement wait_ready", DeprecationWarning
-        )
+        return self.__ready.wait(timeout)
+
+    @final
+    async def async_wait_ready(self, timeout: float = 15) -> bool:
+        """Same as wait_ready, but can be awaited from any event loop."""
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(self.__ready_future)),
+                timeout,
+            )
+        except TimeoutError:
+            return False
+        return True
 
     def print(self, s: str, title: str = ""):
         """used by the device to print to the hosts live device message feed,
@@ -576,8 +767,8 @@ class Device:
         *,
         min: float | None = None,
         max: float | None = None,
-        hi: float | None = None,  # pylint: disable=unused-argument
-        lo: float | None = None,  # pylint: disable=unused-argument
+        hi: float | None = None,
+        lo: float | None = None,
         default: float | None = None,
         description: str = "",  # pylint: disable=unused-argument
         unit: str = "",  # pylint: disable=unused-argument
@@ -587,6 +778,9 @@ class Device:
         writable: bool = True,  # pylint: disable=unused-argument
         dashboard: bool = True,  # pylint: disable=unused-argument
         on_request: Callable[[DataRequest], Any] | None = None,
+        deadband: float = 0,
+        deadband_mode: Literal["abs", "pct"] = "abs",
+        max_silence: float = 0,
         **kwargs: Any,  # pylint: disable=unused-argument
     ) -> NumericDataPoint:
         """Register a new numeric data point with the given properties.
@@ -637,6 +831,17 @@ class Device:
             on_request: If set, will be called when the host
                 requests the value of this datapoint.  Must be threadsafe.
 
+            deadband: Changes smaller than this, compared to the last
+                value actually sent, are dropped before reaching the host.
+                Crossing hi or lo is never dropped.
+
+            deadband_mode: "abs" for deadband in the point's unit,
+                "pct" for a percentage of the last sent value.
+
+            max_silence: After this many seconds without a push, the
+                next value goes to the host and it's handlers even if
+                it did not change. Works with or without a deadband.
+
         """
 
         if min is None:
@@ -649,11 +854,13 @@ class Device:
         else:
             maxval = max
 
-        self.host.numeric_data_point(
+        handle = self.host.numeric_data_point(
             self.name,
             name,
             min=minval,
             max=maxval,
+            hi=hi,
+            lo=lo,
             default=default,
             description=description,
             unit=unit,
@@ -662,13 +869,25 @@ class Device:
             subtype=subtype,
             writable=writable,
             dashboard=dashboard,
+            deadband=deadband,
+            deadband_mode=deadband_mode,
+            max_silence=max_silence,
             **kwargs,
         )
 
         if on_request is not None:
             self.datapoint_getter_functions[name] = on_request
 
-        dp = NumericDataPoint(self, name)
+        dp = NumericDataPoint(
+            self,
+            name,
+            handle=handle,
+            deadband=deadband,
+            deadband_mode=deadband_mode,
+            max_silence=max_silence,
+            hi=hi,
+            lo=lo,
+        )
         self.datapoints[name] = dp
         return dp
 
@@ -730,7 +949,7 @@ class Device:
             on_request: If set, will be called when the host
                 requests the value of this datapoint.  Must be threadsafe."""
 
-        self.host.string_data_point(
+        handle = self.host.string_data_point(
             self.name,
             name,
             default=default,
@@ -746,7 +965,7 @@ class Device:
 
         if on_request is not None:
             self.datapoint_getter_functions[name] = on_request
-        dp = StringDataPoint(self, name)
+        dp = StringDataPoint(self, name, handle=handle)
         self.datapoints[name] = dp
         return dp
 
@@ -801,7 +1020,7 @@ class Device:
             on_request: If set, will be called when the host
                 requests the value of this datapoint.  Must be threadsafe.
         """
-        self.host.object_data_point(
+        handle = self.host.object_data_point(
             self.name,
             name,
             handler=handler,
@@ -817,7 +1036,7 @@ class Device:
         if on_request is not None:
             self.datapoint_getter_functions[name] = on_request
 
-        dp = ObjectDataPoint(self, name)
+        dp = ObjectDataPoint(self, name, handle=handle)
         self.datapoints[name] = dp
         return dp
 
@@ -849,7 +1068,7 @@ class Device:
             requests the value of this datapoint.  Must be threadsafe.
         """
 
-        self.host.bytestream_data_point(
+        handle = self.host.bytestream_data_point(
             self.name,
             name,
             handler=handler,
@@ -863,7 +1082,7 @@ class Device:
         if on_request is not None:
             self.datapoint_getter_functions[name] = on_request
 
-        dp = BytesDataPoint(self, name)
+        dp = BytesDataPoint(self, name, handle=handle)
         self.datapoints[name] = dp
         return dp
 
@@ -879,9 +1098,69 @@ class Device:
         value: int | float | str | bytes | Mapping[str, Any] | list[Any],
         timestamp: float | None = None,
         annotation: Any | None = None,
+        *,
+        take_ownership: bool = False,
+    ):
+        """Callable by the device or by the host, thread safe.
+
+        With take_ownership, the caller promises to never modify the
+        value again, so object values are stored without a deep copy.
+        """
+        self.datapoints[name].set(
+            value, timestamp, annotation, take_ownership=take_ownership
+        )
+
+    @final
+    def set_data_points(
+        self,
+        values: Mapping[str, Any]
+        | Iterable[tuple[str, Any, float | None, Any]],
+        timestamp: float | None = None,
+        *,
+        take_ownership: bool = False,
     ):
-        """Callable by the device or by the host, thread safe."""
-        self.datapoints[name].set(value, timestamp, annotation)
+        """Set several data points at once as a single frame.
+        Callable by the device or by the host, thread safe.
+
+        The whole frame is handed to the host in one call, so it
+        can be stored and notified together.
+
+        Args:
+            values: Either a mapping of datapoint name to value,
+                or an iterable of (name, value, timestamp, annotation)
+                tuples, where timestamp and annotation may be None.
+
+            timestamp: Used for every value that does not have
+                it's own timestamp. Defaults to the current time,
+                taken once for the whole frame.
+
+            take_ownership: See set_data_point(), applies to every value.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        if isinstance(values, Mapping):
+            values = [(k, v, None, None) for k, v in values.items()]
+
+        frame: list[tuple[DataPoint, Any, float, Any]] = []
+        forced: list[tuple[DataPoint, Any, float, Any]] = []
+        for name, value, ts, annotation in values:
+            dp = self.datapoints[name]
+            value = dp.coerce(value, take_ownership)
+            push = dp.should_push(value)
+            if not push:
+                continue
+            entry = (dp, value, timestamp if ts is None else ts, annotation)
+            if push == FORCE_PUSH:
+                # Frames can't force a repeat, heartbeats go alone
+                forced.append(entry)
+            else:
+                frame.append(entry)
+
+        if frame:
+            self.host.set_data_points(self.name, frame)
+        for dp, value, ts, annotation in forced:
+            dp.push(value, ts, annotation, force=True)
 
     @final
     def request_data_point(self, name: str):
@@ -1005,12 +1284,12 @@ class Device:
             )
 
         if self.config_schema:
-            validate(config, self.get_full_schema())
+            self._validate_config(config)
 
         with self.__config_lock:
             if config == self._config:
                 return
-            config = copy.deepcopy(config)
+            config = freeze(config)
             self._config = config
             self.title = self._config.get("title", "").strip() or self.name
 
@@ -1050,4 +1329,10 @@ class UnusedSubdevice(Device):
         super().__init__(data)
 
 
-__all__ = ["Device", "UnusedSubdevice", "DeviceClassTypeVar"]
+__all__ = [
+    "Device",
+    "UnusedSubdevice",
+    "DeviceClassTypeVar",
+    "get_all_devices",
+    "clear_schema_cache",
+]
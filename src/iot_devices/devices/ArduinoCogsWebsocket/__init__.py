@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import json
 import logging
 import time
@@ -463,7 +464,7 @@ class ArduinoCogsServer(iot_devices.device.Device):
 
             if not t == "FromRemoteDevice":
                 if self.should_run:
-                    asyncio.run_coroutine_threadsafe(push(), self.loop)
+                    self.host.create_task(self, push())
 
     def __init__(self, data, **kw):
         iot_devices.device.Device.__init__(self, data, **kw)
@@ -509,15 +510,8 @@ class ArduinoCogsServer(iot_devices.device.Device):
 
                 self.clients: list[starlette.websockets.WebSocket] = []
 
-                self.loop = asyncio.new_event_loop()
-
-                def f():
-                    self.loop.run_until_complete(server)
-
-                self.thread_handle = Thread(
-                    target=f, daemon=True, name="ArduinoCogsServer:" + self.name
-                )
-                self.thread_handle.start()
+                self.loop = self.host.get_event_loop(self)
+                self.server_task = self.host.create_task(self, server)
 
             except Exception:
                 self.handle_exception()
@@ -594,25 +588,10 @@ class ArduinoCogsServer(iot_devices.device.Device):
         self.should_run = False
         try:
             self.loop.call_soon_threadsafe(self.shutdown_trigger.set)
-
-            if self.loop.is_running():
-                try:
-                    asyncio.run_coroutine_threadsafe(
-                        self.loop.shutdown_asyncgens(), self.loop
-                    )
-                except RuntimeError:
-                    pass
-
-            time.sleep(0.05)
-            self.loop.stop()
-
-            for _i in range(50):
-                if not self.loop.is_running():
-                    self.loop.close()
-                    break
-                time.sleep(0.1)
-
+            # Whatever is left gets cancelled by the host, and
+            # errors from inside the task are already reported
+            concurrent.futures.wait([self.server_task], 5)
+            if not self.server_task.done():
+                self.handle_error("Timeout waiting for server shutdown")
         except Exception:
             self.handle_exception()
-
-        return super().close()
@@ -1,5 +1,5 @@
 import asyncio
-import threading
+import concurrent.futures
 import time
 from typing import Any
 
@@ -30,13 +30,13 @@ class ESPHomeDevice(iot_devices.device.Device):
         "device.apikey": "apikey",
     }
 
+    # Ready once the native API connects
+    ready_after_init = False
+
     def wait_ready(self, timeout=15):
-        # Wait for connection ready
-        s = time.time()
-        while not self.datapoints["native_api_connected"].get()[0]:
-            if (time.time() - s) > timeout:
-                raise RuntimeError("Could not connect")
-            time.sleep(timeout / 100)
+        if not super().wait_ready(timeout):
+            raise RuntimeError("Could not connect")
+        return True
 
     def async_on_service_call(
         self, service: model.HomeassistantServiceCall
@@ -72,7 +72,9 @@ class ESPHomeDevice(iot_devices.device.Device):
                     )
 
                 self.set_data_point(
-                    "scanned_tag", [str(tag_id), time.time(), ""]
+                    "scanned_tag",
+                    [str(tag_id), time.time(), ""],
+                    take_ownership=True,
                 )
                 return
 
@@ -254,11 +256,8 @@ class ESPHomeDevice(iot_devices.device.Device):
 
         self.stopper = asyncio.Event()
 
-        self.loop = asyncio.new_event_loop()
-
-        self.thread = threading.Thread(
-            target=self.asyncloop, name="ESPHOME " + self.name
-        )
+        # Shared with other devices, owned by the host
+        self.loop = self.host.get_event_loop(self)
         self.numeric_data_point(
             "native_api_connected", min=0, max=1, subtype="bool", writable=False
         )
@@ -271,61 +270,29 @@ class ESPHomeDevice(iot_devices.device.Device):
         )
 
         if self.config.get("hostname") and self.config.get("apikey"):
-            self.thread.start()
-
-    def asyncloop(self):
-        self.loop.run_until_complete(self.main())
+            self.host.create_task(self, self.main())
 
     def on_before_close(self):
         if hasattr(self, "api") and self.api:
             try:
-                t = asyncio.run_coroutine_threadsafe(
-                    self.api.disconnect(), self.loop
-                )
-
-                d = False
-
-                st = time.time()
-                while (time.time() - st) < 1:
-                    if t.done():
-                        d = True
-                        break
-                    time.sleep(0.025)
-
-                if not d:
+                f = self.host.create_task(self, self.api.disconnect())
+                # The host already reports errors from inside the task
+                concurrent.futures.wait([f], 1)
+                if not f.done():
                     self.handle_error("Timeout waiting for clean disconnect")
             except Exception:
                 self.handle_exception()
 
-        self.loop.call_soon_threadsafe(self.stopper.set)
-
-        if self.loop.is_running():
-            try:
-                asyncio.run_coroutine_threadsafe(
-                    self.loop.shutdown_asyncgens(), self.loop
-                )
-            except RuntimeError:
-                pass
-
-        time.sleep(0.05)
         try:
-            self.loop.stop()
+            self.loop.call_soon_threadsafe(self.stopper.set)
         except RuntimeError:
-            return super().close()
-
-        for i in range(50):
-            if not self.loop.is_running():
-                self.loop.close()
-                break
-            time.sleep(0.1)
+            pass
 
         try:
             self.zc.close()
         except Exception:
             pass
 
-        return super().close()
-
     async def main(self, *a, **k):
         """Connect to an ESPHome device and get details."""
         try:
@@ -382,8 +349,9 @@ class ESPHomeDevice(iot_devices.device.Device):
                 self.handle_log, log_level=aioesphomeapi.LogLevel.LOG_LEVEL_INFO
             )
             api.subscribe_service_calls(self.async_on_service_call)
-            time.sleep(0.5)
+            await asyncio.sleep(0.5)
             self.set_data_point("native_api_connected", 1)
+            self.set_ready()
 
         except Exception:
             self.handle_exception()
@@ -39,10 +39,12 @@ class GPSDClient(device.Device):
                         else:
                             result = result_raw
                         if not dev or result["device"] == dev:
-                            self.set_data_point(
-                                "has_fix",
-                                1 if (result.get("mode", 0) > 1) else 0,
-                            )
+                            # One fix is one frame, set it all at once
+                            frame: dict[str, Any] = {
+                                "has_fix": 1
+                                if (result.get("mode", 0) > 1)
+                                else 0
+                            }
                             alt = 0
                             fix_time = 0
 
@@ -54,42 +56,36 @@ class GPSDClient(device.Device):
                                 )
 
                             if "speed" in result:
-                                self.set_data_point("speed", result["speed"])
+                                frame["speed"] = result["speed"]
 
                             if "altMSE" in result:
-                                self.set_data_point(
-                                    "altitude", result["altMSE"]
-                                )
                                 alt = result["altMSE"]
+                                frame["altitude"] = alt
                             elif "altHAE" in result:
-                                self.set_data_point(
-                                    "altitude", result["altHAE"]
-                                )
                                 alt = result["altHAE"]
+                                frame["altitude"] = alt
                             elif "alt" in result:
-                                self.set_data_point("altitude", result["alt"])
                                 alt = result["alt"]
+                                frame["altitude"] = alt
 
                             if "lat" in result and "lon" in result:
-                                self.set_data_point(
-                                    "location",
-                                    {
-                                        "latitude": result["lat"],
-                                        "longitude": result["lon"],
-                                        "altitude": alt,
-                                        "time": fix_time,
-                                    },
-                                )
+                                frame["location"] = {
+                                    "latitude": result["lat"],
+                                    "longitude": result["lon"],
+                                    "altitude": alt,
+                                    "time": fix_time,
+                                }
 
                             if "track" in result:
-                                self.set_data_point("heading", result["track"])
+                                frame["heading"] = result["track"]
 
                             if "jamming" in result:
-                                self.set_data_point(
-                                    "jamming_detected",
-                                    result["jamming"] / 255.0,
+                                frame["jamming_detected"] = (
+                                    result["jamming"] / 255.0
                                 )
 
+                            self.set_data_points(frame, take_ownership=True)
+
             except Exception:
                 self.handle_exception()
                 time.sleep(60)
@@ -106,9 +106,13 @@ class RemoteLazyMeshNode(Device):
         # Incomimg data is telling us the state of the remote node
         # So update accordingly
 
+        frame: list[tuple[str, Any, float | None, Any]] = []
+
         if time.time() > (self.set_rssi_ts + 3600):
             self.set_rssi_ts = time.time()
-            self.set_data_point("path_loss", (-50) - (10 * data.path_loss))
+            frame.append(
+                ("path_loss", (-50) - (10 * data.path_loss), None, None)
+            )
 
         for i in data:
             # If it's the value we are trying to set
@@ -120,15 +124,22 @@ class RemoteLazyMeshNode(Device):
             if i.id in self.ids_to_numeric_points:
                 assert isinstance(i.data, int)
                 val = i.data / self.ids_to_numeric_points_resolution[i.id]
-                self.set_data_point(
-                    self.ids_to_numeric_points[i.id], val, None, "from_remote"
+                frame.append(
+                    (self.ids_to_numeric_points[i.id], val, None, "from_remote")
                 )
             elif i.id in self.ids_to_string_points:
                 assert isinstance(i.data, str)
-                self.set_data_point(
-                    self.ids_to_string_points[i.id], i.data, None, "from_remote"
+                frame.append(
+                    (
+                        self.ids_to_string_points[i.id],
+                        i.data,
+                        None,
+                        "from_remote",
+                    )
                 )
 
+        self.set_data_points(frame)
+
     def on_before_close(self):
         self.should_run = False
         return super().close()
@@ -381,7 +392,9 @@ class LazyMeshNode(Device):
                 else:
                     raise ValueError(f"Unknown type {i['type']}")
 
-            self.node = MeshNode(self.transports)
+            self.node = MeshNode(
+                self.transports, loop=self.host.get_event_loop(self)
+            )
 
             self.channel = self.node.add_channel(
                 self.config["channel_password"]
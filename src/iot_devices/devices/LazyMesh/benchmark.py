@@ -0,0 +1,180 @@
+"""Micro-benchmarks for LazyMesh packet handling.
+
+python -m iot_devices.devices.LazyMesh.benchmark
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import struct
+import time
+from collections.abc import Callable
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from . import crypto, mesh_packet
+from .mesh import MeshNode
+from .transports.udp import MAX_PACKET_SIZE, UDPTransport
+
+PSK = b"0123456789abcdef"
+TAG_LENGTH = 6
+
+
+# The old uncached versions, for comparison
+
+
+def _uncached_key(psk: bytes, hour: int) -> bytes:
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(b"c" + struct.pack("<I", hour) + psk)
+    return digest.finalize()[:16]
+
+
+def _uncached_encrypt(key: bytes, payload: bytes, iv: bytes) -> bytes:
+    encryptor = Cipher(
+        algorithms.AES(key), modes.GCM(iv), backend=default_backend()
+    ).encryptor()
+    ciphertext = encryptor.update(payload) + encryptor.finalize()
+    return ciphertext + encryptor.tag[:TAG_LENGTH]
+
+
+def _uncached_decrypt(key: bytes, ciphertext: bytes, iv: bytes) -> bytes:
+    decryptor = Cipher(
+        algorithms.AES(key),
+        modes.GCM(iv, ciphertext[-TAG_LENGTH:], min_tag_length=TAG_LENGTH),
+        backend=default_backend(),
+    ).decryptor()
+    return decryptor.update(ciphertext[:-TAG_LENGTH]) + decryptor.finalize()
+
+
+def _rate(f: Callable[[], object], seconds: float) -> float:
+    n = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for _i in range(100):
+            f()
+        n += 100
+    return n / seconds
+
+
+def bench_crypto(seconds: float = 1) -> dict[str, float]:
+    """Packets per second for a key lookup, encrypt and decrypt of
+    a 64 byte payload, the same work as sending and receiving one packet.
+    """
+    hour = int(time.time()) // 3600
+    payload = os.urandom(64)
+    iv = os.urandom(12)
+
+    def before():
+        key = _uncached_key(PSK, hour)
+        _uncached_decrypt(key, _uncached_encrypt(key, payload, iv), iv)
+
+    def after():
+        key = crypto.derive_crypto_key(PSK, hour)
+        crypto.aes_gcm_decrypt(
+            key,
+            crypto.aes_gcm_encrypt(key, payload, iv, TAG_LENGTH),
+            iv,
+            TAG_LENGTH,
+        )
+
+    return {"before": _rate(before, seconds), "after": _rate(after, seconds)}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_udp_repeater(seconds: float = 2) -> float:
+    """Packets per second a MeshNode repeats from one UDP socket to
+    another over loopback. Packets are for an unknown channel, so this
+    is the replay check, TTL handling and UDP I/O without crypto."""
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(("127.0.0.1", 0))
+        sink.setblocking(False)
+        received = 0
+
+        def count():
+            nonlocal received
+            while True:
+                try:
+                    sink.recv(MAX_PACKET_SIZE)
+                except BlockingIOError:
+                    return
+                received += 1
+
+        loop.add_reader(sink.fileno(), count)
+
+        node_port = _free_port()
+        transport = UDPTransport(
+            "127.0.0.1",
+            sink.getsockname()[1],
+            bind_address="127.0.0.1",
+            bind_port=node_port,
+            rcvbuf=4 * 1024 * 1024,
+        )
+        node = MeshNode([transport], loop=loop)
+        # Let it bind
+        await asyncio.sleep(0.1)
+
+        source = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        source.setblocking(False)
+
+        template = bytearray(mesh_packet.PACKET_OVERHEAD + 32)
+        template[0] = mesh_packet.header1(1, 3, False, False, False)
+        template[4:20] = os.urandom(16)
+
+        n = 0
+        start = time.perf_counter()
+        end = start + seconds
+        while time.perf_counter() < end:
+            # Keep a window in flight instead of flooding, past the
+            # socket buffers that would only measure drops
+            if n - received > 256:
+                await asyncio.sleep(0)
+                continue
+            template[28:32] = struct.pack("<I", int(time.time()))
+            for _i in range(32):
+                n += 1
+                # Packet ID is bytes 24..32, the last 4 are the time
+                template[24:28] = struct.pack("<I", n)
+                try:
+                    source.sendto(template, ("127.0.0.1", node_port))
+                except BlockingIOError:
+                    pass
+            await asyncio.sleep(0)
+
+        # Let the last ones through
+        await asyncio.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+        loop.remove_reader(sink.fileno())
+        node.close()
+        # Let the node's tasks see the cancellation
+        await asyncio.sleep(0.1)
+        await transport.close()
+        source.close()
+        sink.close()
+        return received / elapsed
+
+    return asyncio.run(run())
+
+
+def main():
+    r = bench_crypto()
+    print(f"crypto uncached: {r['before']:.0f} packets/s")
+    print(f"crypto cached:   {r['after']:.0f} packets/s")
+    print(f"UDP repeater:    {bench_udp_repeater():.0f} packets/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 import struct
+from functools import lru_cache
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
+# Keys only change hourly, and there are a few per channel,
+# so these caches stay small.
+_CACHE_SIZE = 1024
 
+
+@lru_cache(maxsize=_CACHE_SIZE)
 def derive_routing_key(psk: bytes, hours_since_epoch: int) -> bytes:
     data = b"r" + struct.pack("<I", hours_since_epoch) + psk
     digest = hashes.Hash(hashes.SHA256())
@@ -12,6 +19,7 @@ def derive_routing_key(psk: bytes, hours_since_epoch: int) -> bytes:
     return digest.finalize()[:16]
 
 
+@lru_cache(maxsize=_CACHE_SIZE)
 def derive_crypto_key(psk: bytes, hours_since_epoch: int) -> bytes:
     data = b"c" + struct.pack("<I", hours_since_epoch) + psk
     digest = hashes.Hash(hashes.SHA256())
@@ -19,32 +27,48 @@ def derive_crypto_key(psk: bytes, hours_since_epoch: int) -> bytes:
     return digest.finalize()[:16]
 
 
+@lru_cache(maxsize=_CACHE_SIZE)
+def routing_id_topic_hash(routing_id: bytes) -> str:
+    """Hex of the first 8 bytes of sha256(routing_id), used for MQTT topics"""
+    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
+    digest.update(routing_id)
+    return digest.finalize()[:8].hex()
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _aesgcm(key: bytes) -> AESGCM:
+    return AESGCM(key)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _aes(key: bytes) -> algorithms.AES:
+    return algorithms.AES(key)
+
+
 def aes_gcm_encrypt(
     key: bytes, payload: bytes, iv: bytes, tagLength: int
 ) -> bytes:
-    encryptor = Cipher(
-        algorithms.AES(key), modes.GCM(iv), backend=default_backend()
-    ).encryptor()
-
-    ciphertext = encryptor.update(payload) + encryptor.finalize()
-    full_tag = encryptor.tag  # 16 bytes
-
-    short_tag = full_tag[:tagLength]  # truncate
+    # Ciphertext followed by the full 16 byte tag
+    r = _aesgcm(key).encrypt(iv, payload, None)
 
-    return ciphertext + short_tag
+    # truncate the tag
+    return r[: len(r) - 16 + tagLength]
 
 
 def aes_gcm_decrypt(
     key: bytes, ciphertext: bytes, iv: bytes, tagLength: int
 ) -> bytes:
-    short_tag = ciphertext[-tagLength:]
-    ciphertext = ciphertext[:-tagLength]
+    if tagLength == 16:
+        return _aesgcm(key).decrypt(iv, ciphertext, None)
 
-    # # Pad back to 16 bytes
-    # full_tag = short_tag + b'\x00' * (16 - len(short_tag))
+    # GCM wants the tag as bytes, ciphertext may be a memoryview
+    short_tag = bytes(ciphertext[-tagLength:])
+    ciphertext = ciphertext[:-tagLength]
 
+    # AESGCM can't check truncated tags, so this still needs
+    # a Cipher per packet, only the AES key object is reused.
     decryptor = Cipher(
-        algorithms.AES(key),
+        _aes(key),
         modes.GCM(iv, short_tag, min_tag_length=tagLength),
         backend=default_backend(),
     ).decryptor()
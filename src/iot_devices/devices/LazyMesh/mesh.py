@@ -1,4 +1,6 @@
 import asyncio
+import heapq
+import itertools
 import logging
 import os
 import threading
@@ -12,7 +14,8 @@ from aiostream import stream
 
 from . import mesh_packet
 from .crypto import derive_crypto_key, derive_routing_key
-from .mesh_packet import MeshPacket, Payload, header1
+from .mesh_packet import MeshPacket, PacketBuffer, Payload, header1
+from .seen_packets import SeenPacketReport, SeenPacketTable
 from .transports import ITransport, RawPacketMetadata
 
 
@@ -54,6 +57,14 @@ class MeshChannel:
             keys["closest_crypto_key"] = derive_crypto_key(self.psk, prev_hour)
         return keys
 
+    def get_routing_index(self, hour: int) -> dict[bytes, bytes]:
+        """Routing ID to crypto key for the hour before, this
+        hour and the hour after"""
+        return {
+            derive_routing_key(self.psk, h): derive_crypto_key(self.psk, h)
+            for h in (hour - 1, hour, hour + 1)
+        }
+
     async def announce(self, first: bool = False):
         self.temp_keys = self.get_temp_keys()
         if self.mesh_node:
@@ -134,36 +145,28 @@ class MeshChannel:
             m = RawPacketMetadata(packet.serialize(), None)
             await self.mesh_node.handle_packet(m)
 
-    async def handle_packet(self, meta: RawPacketMetadata):
+    async def deliver(
+        self, packet: MeshPacket, crypto_key: bytes, meta: RawPacketMetadata
+    ) -> bool:
+        """Decrypt a packet already known to be for this channel
+        and pass it to the callbacks"""
         decoded = False
         try:
-            data = meta.raw
-            packet = MeshPacket.parse(data)
-
-            if packet.routing_id == self.temp_keys["routing_key"]:
-                packet.decrypt(self.temp_keys["crypto_key"])
-                if packet.plaintext:
-                    payload = Payload.from_buffer(packet.plaintext, meta)
-                    payload.path_loss = packet.path_loss
-                    payload.unix_time = packet.timestamp
-                    if self.callback:
-                        self.callback(payload)
-                    if self.async_callback:
-                        await self.async_callback(payload)
-                    decoded = True
-
-            elif "closest_routing_key" in self.temp_keys:
-                if packet.routing_id == self.temp_keys["closest_routing_key"]:
-                    packet.decrypt(self.temp_keys["closest_crypto_key"])
-                    if packet.plaintext:
-                        payload = Payload.from_buffer(packet.plaintext, meta)
-                        payload.path_loss = packet.path_loss
-                        payload.unix_time = packet.timestamp
-                        if self.callback:
-                            self.callback(payload)
-                        if self.async_callback:
-                            await self.async_callback(payload)
-                        decoded = True
+            packet.decrypt(crypto_key)
+            if packet.plaintext:
+                # The node repeats meta.raw in place after this,
+                # so listeners that keep the payload get their own copy
+                payload = Payload.from_buffer(
+                    packet.plaintext,
+                    RawPacketMetadata(PacketBuffer(meta.raw), meta.source),
+                )
+                payload.path_loss = packet.path_loss
+                payload.unix_time = packet.timestamp
+                if self.callback:
+                    self.callback(payload)
+                if self.async_callback:
+                    await self.async_callback(payload)
+                decoded = True
 
         except Exception:
             print("Error handling packet")
@@ -171,11 +174,22 @@ class MeshChannel:
 
         return decoded
 
+    async def handle_packet(self, meta: RawPacketMetadata):
+        """Deliver the packet if it is for this channel.
+        MeshNode uses it's routing index instead of calling this."""
+        routing_id = bytes(meta.raw.routing_id)
+        crypto_key = self.get_routing_index(int(time.time()) // 3600).get(
+            routing_id
+        )
+        if crypto_key is None:
+            return False
+        return await self.deliver(MeshPacket.parse(meta.raw), crypto_key, meta)
+
 
 class QueuedOutgoingPacket:
     def __init__(
         self,
-        packet: bytes,
+        packet: bytes | bytearray,
         expect_repeaters: int,
         expect_subscribers: int,
         exclude: list[ITransport] = [],
@@ -183,33 +197,44 @@ class QueuedOutgoingPacket:
         if len(packet) < 32:
             raise ValueError("Packet must be at least 32 bytes long")
 
+        # Header bits are changed in place between attempts
+        if not isinstance(packet, PacketBuffer):
+            packet = PacketBuffer(packet)
         self.packet = packet
         self.expect_repeaters = expect_repeaters
         self.expect_subscribers = expect_subscribers
 
         self.send_attempts = 0
+        # time.monotonic()
         self.last_send_time: float = 0
-        self.packet_id = packet[24:32]
+        self.packet_id = bytes(packet[24:32])
+        self.id = packet.packet_id
 
         self.exclude = exclude
 
         self.stopSending = False
 
-
-class SeenPacketReport:
-    def __init__(self, packetID: bytes):
-        self.timestamp: int = int(time.time())
-        self.packet_id = packetID
-
-        self.repeaters_seen = 0
-        self.subscribers_seen = 0
-        self.real_copies_seen = 0
+        # When the scheduler should next look at this packet,
+        # older heap entries for it are ignored.
+        self.due: float = 0
 
 
 class MeshNode:
-    def __init__(self, transports: list[ITransport]):
+    def __init__(
+        self,
+        transports: list[ITransport],
+        loop: asyncio.AbstractEventLoop | None = None,
+    ):
+        """If a loop is given, the node runs on it and leaves it
+        running on close, otherwise it starts a private loop thread."""
         self.transports: list[ITransport] = transports
         self.channels: dict[bytes, MeshChannel] = {}
+
+        # Routing ID -> (channel, crypto key) for every channel, for the
+        # previous, current and next hour. Replaced whenever the
+        # hour or the channels change.
+        self.routing_index: dict[bytes, tuple[MeshChannel, bytes]] = {}
+        self._routing_index_hour = 0
         self.should_run = True
 
         self.routes_enabled: dict[int, bool] = {0: True}
@@ -221,33 +246,49 @@ class MeshNode:
         self.expect_repeater_id = 0
 
         self.do_queued_packets = asyncio.Event()
-        self.loop = asyncio.new_event_loop()
-        asyncio.run_coroutine_threadsafe(self._run(), self.loop)
-        asyncio.run_coroutine_threadsafe(self.maintainance_loop(), self.loop)
-        asyncio.run_coroutine_threadsafe(self.send_queued_packets(), self.loop)
-        self.thread_handle = threading.Thread(
-            target=self.loop.run_forever, daemon=True, name="MeshNodeThread"
-        )
-        self.thread_handle.start()
 
-        self.seenPackets: dict[bytes, SeenPacketReport] = {}
-        self.outgoingQueue: list[QueuedOutgoingPacket] = []
+        self.seenPackets = SeenPacketTable()
+
+        # Packets being sent or waiting for replies, by packet ID
+        self.outgoing: dict[int, QueuedOutgoingPacket] = {}
+        # (due, seq, packet) for send_queued_packets()
+        self._outgoing_heap: list[tuple[float, int, QueuedOutgoingPacket]] = []
+        self._outgoing_seq = itertools.count()
 
         self.repeater_interest_by_route_id: dict[int, float] = {}
         self.subscriber_interest_by_channel: OrderedDict[bytes, float] = (
             OrderedDict()
         )
 
-    async def send_packet(
+        self.owns_loop = loop is None
+        self.loop = loop or asyncio.new_event_loop()
+
+        # Started last, a shared loop is already running
+        self.tasks = [
+            asyncio.run_coroutine_threadsafe(i, self.loop)
+            for i in (
+                self._run(),
+                self.maintainance_loop(),
+                self.send_queued_packets(),
+            )
+        ]
+
+        if self.owns_loop:
+            self.thread_handle = threading.Thread(
+                target=self.loop.run_forever, daemon=True, name="MeshNodeThread"
+            )
+            self.thread_handle.start()
+
+    async def _prepare_send(
         self,
-        b: bytes,
-        exclude: list[ITransport] = [],
-        interface: ITransport | None = None,
-    ):
+        b: bytes | bytearray,
+        exclude: list[ITransport],
+        interface: ITransport | None,
+    ) -> bytes | bytearray:
+        """Global route if needed, returns the packet to send locally.
+        A PacketBuffer is marked as global routed in place."""
         self.has_seen_packet(b)
 
-        c: list[Coroutine[None, None, None]] = []
-
         global_routed = False
 
         header_1 = b[0]
@@ -276,10 +317,21 @@ class MeshNode:
         # Mark as already global routed if at least one global transport worked
         # Otherwise everyone else will be spewing packets we already sent
         if global_routed and packet_type in [1, 2]:
-            header_1 = b[0]
-            header_1 = header_1 | (1 << 7)
-            b = b[:0] + bytes([header_1]) + b[1:]
+            if not isinstance(b, PacketBuffer):
+                b = PacketBuffer(b)
+            b.set_was_global_routed()
+
+        return b
+
+    async def send_packet(
+        self,
+        b: bytes | bytearray,
+        exclude: list[ITransport] = [],
+        interface: ITransport | None = None,
+    ):
+        b = await self._prepare_send(b, exclude, interface)
 
+        c: list[Coroutine[None, None, None]] = []
         for i in self.transports:
             if i in exclude:
                 continue
@@ -289,8 +341,34 @@ class MeshNode:
 
         await asyncio.gather(*c)
 
+    async def send_packets(
+        self, packets: list[tuple[bytes | bytearray, list[ITransport]]]
+    ):
+        """Send (packet, exclude) pairs, grouped by transport.
+        A transport with a send_batch(list[bytes]) method gets all of
+        it's packets in one call, others get them one at a time."""
+        by_transport: dict[ITransport, list[bytes | bytearray]] = {}
+        for b, exclude in packets:
+            b = await self._prepare_send(b, exclude, None)
+            for i in self.transports:
+                if i not in exclude:
+                    by_transport.setdefault(i, []).append(b)
+
+        async def f(transport: ITransport, batch: list[bytes | bytearray]):
+            send_batch = getattr(transport, "send_batch", None)
+            if send_batch is not None:
+                await send_batch(batch)
+            else:
+                for b in batch:
+                    await transport.send(b)
+
+        await asyncio.gather(*[f(k, v) for k, v in by_transport.items()])
+
     async def send_ack(
-        self, packet: bytes, destination: ITransport | None, ack_type: int
+        self,
+        packet: bytes | bytearray,
+        destination: ITransport | None,
+        ack_type: int,
     ):
         header1 = 0
 
@@ -308,19 +386,18 @@ class MeshNode:
             mesh_packet.PACKET_ID_64_OFFSET : mesh_packet.PACKET_ID_64_OFFSET
             + 8
         ]
-        ack_packet = p + packet_id
+        ack_packet = p + bytes(packet_id)
         await self.send_packet(ack_packet, interface=destination)
 
-    def has_seen_packet(self, packet: bytes, source: ITransport | None = None):
+    def has_seen_packet(
+        self, packet: bytes | bytearray, source: ITransport | None = None
+    ):
         # Too small to be anthig but control and control doesn't have replay detect
 
         if len(packet) < mesh_packet.PACKET_OVERHEAD:
             return False
 
-        packetID: bytes = packet[
-            mesh_packet.PACKET_ID_64_OFFSET : mesh_packet.PACKET_ID_64_OFFSET
-            + 8
-        ]
+        packetID = mesh_packet.read_packet_id(packet)
 
         firstAttempt = packet[1] & (
             1 << mesh_packet.HEADER_2_FIRST_SEND_ATTEMPT_BIT
@@ -331,13 +408,7 @@ class MeshNode:
             1 << mesh_packet.HEADER_2_INTERESTED_BIT
         )
 
-        # 4 bytes
-        packetTime = int.from_bytes(
-            packet[
-                mesh_packet.TIME_BYTE_OFFSET : mesh_packet.TIME_BYTE_OFFSET + 4
-            ],
-            "little",
-        )
+        packetTime = mesh_packet.read_timestamp(packet)
 
         if packetTime < time.time() - 180:
             return True
@@ -345,7 +416,7 @@ class MeshNode:
         if packetTime > time.time() + 120:
             return True
 
-        x = self.ensure_seen_packet_report_exists(packetID)
+        x = self.seenPackets.get_or_create(packetID)
         seen = False
         if x:
             if x.real_copies_seen > 0:
@@ -362,48 +433,32 @@ class MeshNode:
             if source and isSourceInterested:
                 x.subscribers_seen += 1
 
+            if source:
+                self._check_outgoing(x.packet_id)
+
         return seen
 
     def ensure_seen_packet_report_exists(
         self, packetID: bytes
-    ) -> SeenPacketReport | None:
-        if packetID not in self.seenPackets:
-            if len(self.seenPackets) > 10**6:
-                # Oldest packet is too recent to clear, return true, we have to assume
-                # everything has been seen since we can't actually check
-                for i in self.seenPackets:
-                    if self.seenPackets[i].timestamp > time.time() - 180:
-                        return None
-                    break
-
-                # Delete old
-                for i in range(1000):
-                    first = next(iter(self.seenPackets))
-                    if self.seenPackets[first].timestamp < time.time() - 180:
-                        del self.seenPackets[first]
-                    else:
-                        break
-            report = SeenPacketReport(packetID)
-            self.seenPackets[packetID] = report
-
-        if packetID in self.seenPackets:
-            return self.seenPackets[packetID]
-        return None
+    ) -> SeenPacketReport:
+        return self.seenPackets.get_or_create(
+            int.from_bytes(packetID[:8], "little")
+        )
 
     def close(self):
         self.should_run = False
-        self.loop.call_soon_threadsafe(self.loop.stop)
-
-    def decrement_ttl(self, packet: bytes) -> bytes | None:
-        h = packet[0]
-        ttl = (h & (0b111 << 2)) >> 2
-        without_ttl = h & ~(0b111 << 2)
-        if ttl == 0:
+        for i in self.tasks:
+            i.cancel()
+        if self.owns_loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def decrement_ttl(self, packet: bytes | bytearray) -> PacketBuffer | None:
+        """Copy of the packet with TTL decremented, None if it was 0.
+        See PacketBuffer.decrement_ttl() to do it in place."""
+        p = PacketBuffer(packet)
+        if not p.decrement_ttl():
             return None
-
-        h = without_ttl | ((ttl - 1) << 2)
-
-        return packet[:0] + bytes([h]) + packet[1:]
+        return p
 
     async def _run(self):
         try:
@@ -423,7 +478,7 @@ class MeshNode:
         self.routes_enabled[route_id] = False
 
     async def handle_packet(self, meta: RawPacketMetadata):
-        if self.has_seen_packet(meta.raw):
+        if self.has_seen_packet(meta.raw, meta.source):
             return
 
         packet_type = meta.raw[0] & 0b11
@@ -432,39 +487,30 @@ class MeshNode:
 
         if packet_type in [1, 2]:
             if meta.source is not None:
-                for channel in self.channels.values():
-                    if await channel.handle_packet(meta):
+                found = self.lookup_routing_id(bytes(meta.raw.routing_id))
+                # Unknown channels are only repeated, never decrypted
+                if found is not None:
+                    channel, crypto_key = found
+                    packet = MeshPacket.parse(meta.raw)
+                    if await channel.deliver(packet, crypto_key, meta):
                         local_interested = True
             else:
                 local_interested = True
 
-            decremented = self.decrement_ttl(meta.raw)
-            route_id = meta.raw[mesh_packet.MESH_ROUTE_NUMBER_BYTE_OFFSET]
+            raw = meta.raw
+            route_id = raw[mesh_packet.MESH_ROUTE_NUMBER_BYTE_OFFSET]
 
             did_repeat = False
 
-            if self.routes_enabled.get(route_id, False):
-                if decremented:
-                    # Set the is repeater bit
-                    header2 = decremented[1]
-                    header2 = header2 | (1 << mesh_packet.HEADER_2_REPEATER_BIT)
+            # Repeat the buffer we were given, changing the header in place
+            if self.routes_enabled.get(route_id, False) and raw.decrement_ttl():
+                raw.set_header2_bit(mesh_packet.HEADER_2_REPEATER_BIT)
+                if local_interested:
+                    raw.set_header2_bit(mesh_packet.HEADER_2_INTERESTED_BIT)
 
-                    # Set the local interested bit
-                    if local_interested:
-                        header2 = header2 | (
-                            1 << mesh_packet.HEADER_2_INTERESTED_BIT
-                        )
-
-                    decremented = (
-                        decremented[:1] + bytes([header2]) + decremented[2:]
-                    )
+                self.enqueue_packet(raw)
 
-                    # Local packet
-                    self.enqueue_packet(
-                        decremented,
-                    )
-
-                    did_repeat = True
+                did_repeat = True
 
             if local_interested and not did_repeat:
                 # Local packets can just use the implicit ack bit
@@ -481,17 +527,21 @@ class MeshNode:
         if packet_type == 0:
             if meta.source is not None:
                 control_type = meta.raw[2]
-                control_payload = meta.raw[3:]
 
                 if meta.source.use_reliable_retransmission:
-                    if control_type == mesh_packet.CONTROL_TYPE_ACK:
-                        x = self.ensure_seen_packet_report_exists(
-                            control_payload
+                    if (
+                        control_type == mesh_packet.CONTROL_TYPE_ACK
+                        and len(meta.raw) >= 11
+                    ):
+                        x = self.seenPackets.get_or_create(
+                            mesh_packet.read_packet_id(meta.raw, 3)
                         )
-                        if x:
-                            x.subscribers_seen += 1
+                        x.subscribers_seen += 1
+                        self._check_outgoing(x.packet_id)
 
-    def enqueue_packet(self, packet: bytes, exclude: list[ITransport] = []):
+    def enqueue_packet(
+        self, packet: bytes | bytearray, exclude: list[ITransport] = []
+    ):
         if len(packet) < mesh_packet.PACKET_OVERHEAD:
             raise ValueError(
                 "Can't queue this, it doesn't look like a data packet"
@@ -504,10 +554,12 @@ class MeshNode:
 
         if packet_type == mesh_packet.PACKET_TYPE_RELIABLE_DATA:
             route_number = packet[mesh_packet.MESH_ROUTE_NUMBER_BYTE_OFFSET]
-            routing_id = packet[
-                mesh_packet.ROUTING_ID_BYTE_OFFSET : mesh_packet.ROUTING_ID_BYTE_OFFSET
-                + 8
-            ]
+            routing_id = bytes(
+                packet[
+                    mesh_packet.ROUTING_ID_BYTE_OFFSET : mesh_packet.ROUTING_ID_BYTE_OFFSET
+                    + 8
+                ]
+            )
 
             expect_repeaters = min(
                 4,
@@ -531,148 +583,146 @@ class MeshNode:
         #     f"Queuing packet with {expect_repeaters} expected repeaters and {expect_subscribers} expected subscribers"
         # )
 
-        self.outgoingQueue.append(
-            QueuedOutgoingPacket(
-                packet, expect_repeaters, expect_subscribers, exclude
-            )
+        entry = QueuedOutgoingPacket(
+            packet, expect_repeaters, expect_subscribers, exclude
+        )
+        self.outgoing[entry.id] = entry
+        self._schedule(entry, time.monotonic())
+
+    def _schedule(self, entry: QueuedOutgoingPacket, due: float):
+        entry.due = due
+        heap = self._outgoing_heap
+        heapq.heappush(heap, (due, next(self._outgoing_seq), entry))
+        # Wake the scheduler if it is sleeping past this
+        if heap[0][2] is entry:
+            self.do_queued_packets.set()
+
+    def _is_satisfied(self, entry: QueuedOutgoingPacket) -> bool:
+        report = self.seenPackets.get(entry.id)
+        if report is None:
+            return entry.expect_subscribers <= 0 and entry.expect_repeaters <= 0
+        return (
+            report.subscribers_seen >= entry.expect_subscribers
+            and report.repeaters_seen >= entry.expect_repeaters
         )
 
-        self.do_queued_packets.set()
+    def _stop_sending(self, entry: QueuedOutgoingPacket):
+        entry.stopSending = True
+        # Wait a while to see how many replies we get
+        self._schedule(entry, entry.last_send_time + 2)
 
-    async def send_queued_packets(self):
-        while self.should_run:
-            try:
-                self.do_queued_packets.clear()
-                try:
-                    await asyncio.wait_for(self.do_queued_packets.wait(), 0.2)
-                except TimeoutError:
-                    pass
-
-                for i in self.outgoingQueue:
-                    # print("Sending packet attempt", i.send_attempts)
-                    if i.last_send_time < time.time() - 0.2:
-                        # Set or clear the first send attempt bit
-                        if i.send_attempts > 1:
-                            header2 = i.packet[1]
-                            header2 &= ~(
-                                1 << mesh_packet.HEADER_2_FIRST_SEND_ATTEMPT_BIT
-                            )
-                            i.packet = (
-                                i.packet[:1] + bytes([header2]) + i.packet[2:]
-                            )
-                        else:
-                            header2 = i.packet[1]
-                            header2 |= (
-                                1 << mesh_packet.HEADER_2_FIRST_SEND_ATTEMPT_BIT
-                            )
-                            i.packet = (
-                                i.packet[:1] + bytes([header2]) + i.packet[2:]
-                            )
+    def _check_outgoing(self, packet_id: int):
+        """Called when replies arrive, so an acknowledged packet
+        stops right away instead of at it's next retry."""
+        entry = self.outgoing.get(packet_id)
+        if entry is None or entry.stopSending or not entry.send_attempts:
+            return
+        if self._is_satisfied(entry):
+            self._stop_sending(entry)
 
-                        if not i.stopSending:
-                            i.last_send_time = time.time()
-                            i.send_attempts += 1
-                            await self.send_packet(i.packet, exclude=i.exclude)
+    def _finish(self, entry: QueuedOutgoingPacket):
+        if self.outgoing.get(entry.id) is entry:
+            del self.outgoing[entry.id]
 
-                torm: list[QueuedOutgoingPacket] = []
-                for i in self.outgoingQueue:
-                    packet_type = i.packet[0] & 0b11
+        if entry.packet[0] & 0b11 != 2:
+            return
 
-                    if i.send_attempts > 5:
-                        i.stopSending = True
-                        # Wait a while to see how many replies we get
-                        if i.last_send_time < time.time() - 2:
-                            torm.append(i)
+        # Learn how many replies to expect next time
+        report = self.seenPackets.get(entry.id)
+        repeaters_seen = 0
+        subscribers_seen = 0
 
-                        continue
+        if report:
+            repeaters_seen = report.repeaters_seen
+            subscribers_seen = report.subscribers_seen
 
-                    if packet_type == 1 and i.send_attempts > 1:
-                        i.stopSending = True
-                        if i.last_send_time < time.time() - 2:
-                            torm.append(i)
-                        continue
+        route_id = entry.packet[mesh_packet.MESH_ROUTE_NUMBER_BYTE_OFFSET]
 
-                    seenReport = self.ensure_seen_packet_report_exists(
-                        i.packet[
-                            mesh_packet.PACKET_ID_64_OFFSET : mesh_packet.PACKET_ID_64_OFFSET
-                            + 8
-                        ]
-                    )
-                    repeaters_seen = 0
-                    subscribers_seen = 0
-
-                    if seenReport:
-                        repeaters_seen = seenReport.repeaters_seen
-                        subscribers_seen = seenReport.subscribers_seen
-
-                    if subscribers_seen >= i.expect_subscribers:
-                        if repeaters_seen >= i.expect_repeaters:
-                            i.stopSending = True
-                            if i.last_send_time < time.time() - 2:
-                                torm.append(i)
-
-                for i in torm:
-                    # print("Done with packet after", i.send_attempts, "attempts")
-                    # print(i.repeaters_seen, i.expect_repeaters, i.subscribers_seen, i.expect_subscribers)
-                    self.outgoingQueue.remove(i)
-
-                    packet_type = i.packet[0] & 0b11
-
-                    if packet_type == 2:
-                        seenReport = self.ensure_seen_packet_report_exists(
-                            i.packet[
-                                mesh_packet.PACKET_ID_64_OFFSET : mesh_packet.PACKET_ID_64_OFFSET
-                                + 8
-                            ]
-                        )
-                        repeaters_seen = 0
-                        subscribers_seen = 0
+        old = self.repeater_interest_by_route_id.get(route_id, 0)
+        new = repeaters_seen
+
+        if new > old:
+            self.repeater_interest_by_route_id[route_id] = new
+        else:
+            new = old * 0.90 + new * 0.10
+            self.repeater_interest_by_route_id[route_id] = new
 
-                        if seenReport:
-                            repeaters_seen = seenReport.repeaters_seen
-                            subscribers_seen = seenReport.subscribers_seen
+        channel_hash = bytes(entry.packet.routing_id)
 
-                        route_id = i.packet[
-                            mesh_packet.MESH_ROUTE_NUMBER_BYTE_OFFSET
-                        ]
+        old = self.subscriber_interest_by_channel.get(channel_hash, 0)
+        new = subscribers_seen
 
-                        old = self.repeater_interest_by_route_id.get(
-                            route_id, 0
-                        )
-                        new = repeaters_seen
+        if new > old:
+            self.subscriber_interest_by_channel[channel_hash] = new
+        else:
+            new = old * 0.90 + new * 0.10
+            self.subscriber_interest_by_channel[channel_hash] = new
 
-                        if new > old:
-                            self.repeater_interest_by_route_id[route_id] = new
-                        else:
-                            new = old * 0.90 + new * 0.10
-                            self.repeater_interest_by_route_id[route_id] = new
+        if len(self.subscriber_interest_by_channel) > 3096:
+            self.subscriber_interest_by_channel = OrderedDict(
+                list(self.subscriber_interest_by_channel.items())[-2048:]
+            )
 
-                        channel_hash = i.packet[
-                            mesh_packet.ROUTING_ID_BYTE_OFFSET : mesh_packet.ROUTING_ID_BYTE_OFFSET
-                            + 16
-                        ]
+    def _send_attempt(self, entry: QueuedOutgoingPacket, now: float):
+        # Set or clear the first send attempt bit
+        entry.packet.set_header2_bit(
+            mesh_packet.HEADER_2_FIRST_SEND_ATTEMPT_BIT,
+            entry.send_attempts <= 1,
+        )
 
-                        old = self.subscriber_interest_by_channel.get(
-                            channel_hash, 0
-                        )
-                        new = subscribers_seen
-
-                        if new > old:
-                            self.subscriber_interest_by_channel[
-                                channel_hash
-                            ] = new
-                        else:
-                            new = old * 0.90 + new * 0.10
-                            self.subscriber_interest_by_channel[
-                                channel_hash
-                            ] = new
-
-                        if len(self.subscriber_interest_by_channel) > 3096:
-                            self.subscriber_interest_by_channel = OrderedDict(
-                                list(
-                                    self.subscriber_interest_by_channel.items()
-                                )[-2048:]
+        entry.last_send_time = now
+        entry.send_attempts += 1
+
+        if (
+            entry.send_attempts > 5
+            or (entry.packet[0] & 0b11 == 1)
+            or self._is_satisfied(entry)
+        ):
+            self._stop_sending(entry)
+        else:
+            self._schedule(entry, now + 0.2)
+
+    async def send_queued_packets(self):
+        """Sends everything that is due, then sleeps until the next
+        retry or finish time, or until something new is queued.
+
+        Each packet is sent up to 6 times, 0.2s apart, until enough
+        repeaters and subscribers have replied, and forgotten 2s after
+        the last send.
+        """
+        heap = self._outgoing_heap
+        while self.should_run:
+            try:
+                self.do_queued_packets.clear()
+                if not heap:
+                    await self.do_queued_packets.wait()
+                else:
+                    timeout = heap[0][0] - time.monotonic()
+                    if timeout > 0:
+                        try:
+                            await asyncio.wait_for(
+                                self.do_queued_packets.wait(), timeout
                             )
+                        except TimeoutError:
+                            pass
+
+                now = time.monotonic()
+                batch: list[QueuedOutgoingPacket] = []
+                while heap and heap[0][0] <= now:
+                    due, _seq, entry = heapq.heappop(heap)
+                    if due != entry.due:
+                        # Rescheduled since
+                        continue
+                    if entry.stopSending:
+                        self._finish(entry)
+                    else:
+                        self._send_attempt(entry, now)
+                        batch.append(entry)
+
+                if batch:
+                    await self.send_packets(
+                        [(i.packet, i.exclude) for i in batch]
+                    )
 
             except Exception:
                 print(traceback.format_exc())
@@ -693,12 +743,31 @@ class MeshNode:
             print(traceback.format_exc())
             logging.exception("Error in maintainance loop")
 
+    def rebuild_routing_index(self, hour: int | None = None):
+        if hour is None:
+            hour = int(time.time()) // 3600
+        index: dict[bytes, tuple[MeshChannel, bytes]] = {}
+        for channel in list(self.channels.values()):
+            for routing_id, key in channel.get_routing_index(hour).items():
+                index[routing_id] = (channel, key)
+        self._routing_index_hour = hour
+        self.routing_index = index
+
+    def lookup_routing_id(
+        self, routing_id: bytes
+    ) -> tuple[MeshChannel, bytes] | None:
+        hour = int(time.time()) // 3600
+        if hour != self._routing_index_hour:
+            self.rebuild_routing_index(hour)
+        return self.routing_index.get(routing_id)
+
     def add_channel(self, password: str):
         psk = password.encode("utf-8")
         psk = sha256(psk).digest()[:16]
 
         self.channels[psk] = MeshChannel(psk)
         self.channels[psk].mesh_node = self
+        self.rebuild_routing_index()
 
         def f():
             self.loop.create_task(self.channels[psk].announce(first=True))
@@ -710,3 +779,4 @@ class MeshNode:
         psk = password.encode("utf-8")
         psk = sha256(psk).digest()[:16]
         del self.channels[psk]
+        self.rebuild_routing_index()
@@ -1,11 +1,15 @@
+from __future__ import annotations
+
 import struct
 from dataclasses import dataclass
-from typing import NamedTuple, Union
+from typing import TYPE_CHECKING, NamedTuple, Union
 
 import msgpack
 
 from .crypto import aes_gcm_decrypt, aes_gcm_encrypt
-from .transports import RawPacketMetadata
+
+if TYPE_CHECKING:
+    from .transports import RawPacketMetadata
 
 DataItemValue = Union[
     str, int, float, list[int], list[str], list[float] | bytes
@@ -35,7 +39,7 @@ class Payload:
         return iter(self.items)
 
     @classmethod
-    def from_buffer(cls, buf: bytes, raw: RawPacketMetadata) -> "Payload":
+    def from_buffer(cls, buf: bytes, raw: RawPacketMetadata) -> Payload:
         unpacked: list[int | DataItemValue] = msgpack.unpackb(buf, raw=False)
 
         if not isinstance(unpacked, list):  # type: ignore
@@ -91,27 +95,92 @@ AUTH_TAG_LEN = 6
 PACKET_ID_64_OFFSET = RANDOMNESS_BYTE_OFFSET + 4
 
 
-def add_packet_loss(packet: bytes, extra_loss: int):
-    """Set the last hop field and adds to the total field"""
-    if extra_loss > 7:
-        extra_loss = 7
+_TIMESTAMP = struct.Struct("<I")
+_PACKET_ID = struct.Struct("<Q")
+
+
+def read_packet_id(
+    packet: bytes | bytearray, offset: int = PACKET_ID_64_OFFSET
+) -> int:
+    """The 64 bit ID used for replay detection and ACKs, without slicing"""
+    return _PACKET_ID.unpack_from(packet, offset)[0]
+
+
+def read_timestamp(packet: bytes | bytearray) -> int:
+    return _TIMESTAMP.unpack_from(packet, TIME_BYTE_OFFSET)[0]
+
+
+class PacketBuffer(bytearray):
+    """A raw packet that is changed in place as it is forwarded.
+
+    Header fields are read and written directly at the offsets above,
+    and the longer fields are memoryviews into the buffer, so
+    forwarding doesn't copy the packet.
+    """
+
+    @property
+    def packet_type(self) -> int:
+        return self[HEADER_1_BYTE_OFFSET] & PACKET_TYPE_MASK
+
+    @property
+    def ttl(self) -> int:
+        return (self[HEADER_1_BYTE_OFFSET] >> TTL_OFFSET) & 0b111
+
+    def decrement_ttl(self) -> bool:
+        """Returns False, leaving the packet alone, if TTL is already 0"""
+        ttl = self.ttl
+        if ttl == 0:
+            return False
+        h = self[HEADER_1_BYTE_OFFSET] & ~(0b111 << TTL_OFFSET)
+        self[HEADER_1_BYTE_OFFSET] = h | ((ttl - 1) << TTL_OFFSET)
+        return True
+
+    def set_header2_bit(self, bit: int, value: bool = True):
+        if value:
+            self[HEADER_2_BYTE_OFFSET] |= 1 << bit
+        else:
+            self[HEADER_2_BYTE_OFFSET] &= ~(1 << bit)
+
+    def set_was_global_routed(self):
+        self[HEADER_1_BYTE_OFFSET] |= 1 << WAS_GLOBAL_ROUTED_OFFSET
+
+    def add_packet_loss(self, extra_loss: int):
+        """Set the last hop field and adds to the total field"""
+        if extra_loss > 7:
+            extra_loss = 7
+
+        old: int = self[PATH_LOSS_BYTE_OFFSET]
+        without_last_hop: int = old & 0b11111
+
+        without_last_hop += extra_loss
+        if without_last_hop > 31:
+            without_last_hop = 31
+
+        self[PATH_LOSS_BYTE_OFFSET] = without_last_hop | (extra_loss << 5)
+
+    def field(self, offset: int, length: int) -> memoryview:
+        return memoryview(self)[offset : offset + length]
+
+    @property
+    def routing_id(self) -> memoryview:
+        return self.field(ROUTING_ID_BYTE_OFFSET, MeshPacket.ROUTING_ID_LENGTH)
 
-    old: int = packet[PATH_LOSS_BYTE_OFFSET]
-    without_last_hop: int = old & 0b11111
+    @property
+    def packet_id(self) -> int:
+        return read_packet_id(self)
 
-    without_last_hop += extra_loss
-    if without_last_hop > 31:
-        without_last_hop = 31
+    @property
+    def timestamp(self) -> int:
+        return read_timestamp(self)
 
-    n = without_last_hop | (extra_loss << 5)
 
-    modified = (
-        packet[:PATH_LOSS_BYTE_OFFSET]
-        + bytes([n])
-        + packet[PATH_LOSS_BYTE_OFFSET + 1 :]
-    )
-    assert len(modified) == len(packet)
-    return modified
+def add_packet_loss(packet: bytes | bytearray, extra_loss: int) -> bytearray:
+    """Set the last hop field and adds to the total field.
+    A PacketBuffer is changed in place, anything else is copied."""
+    if not isinstance(packet, PacketBuffer):
+        packet = PacketBuffer(packet)
+    packet.add_packet_loss(extra_loss)
+    return packet
 
 
 def header1(
@@ -138,10 +207,10 @@ class MeshPacket:
     mesh_route_num: int
     path_loss: int
     last_hop_loss: int
-    routing_id: bytes
-    entropy: bytes
+    routing_id: bytes | memoryview
+    entropy: bytes | memoryview
     timestamp: int
-    ciphertext: bytes | None = None
+    ciphertext: bytes | memoryview | None = None
     plaintext: bytes | None = None
 
     ROUTING_ID_LENGTH = 16
@@ -169,12 +238,14 @@ class MeshPacket:
         return bytes(buf)
 
     @classmethod
-    def parse(cls, data: bytes) -> "MeshPacket":
-        routing_id = data[4:20]
-        entropy = data[20:28]
-        timestamp = struct.unpack("<I", data[28:32])[0]
-        ciphertext = data[32:]
-        header, header2, mesh_route_num, path_loss_byte = data[:4]
+    def parse(cls, data: bytes | bytearray) -> MeshPacket:
+        """The variable length fields are views into data, not copies"""
+        view = memoryview(data)
+        routing_id = view[ROUTING_ID_BYTE_OFFSET:RANDOMNESS_BYTE_OFFSET]
+        entropy = view[RANDOMNESS_BYTE_OFFSET:TIME_BYTE_OFFSET]
+        timestamp = _TIMESTAMP.unpack_from(data, TIME_BYTE_OFFSET)[0]
+        ciphertext = view[CIPHERTEXT_BYTE_OFFSET:]
+        header, header2, mesh_route_num, path_loss_byte = view[:4]
         path_loss = path_loss_byte >> 3
         last_hop_loss = path_loss_byte & 0b111
         return cls(
@@ -192,7 +263,7 @@ class MeshPacket:
     def encrypt(self, key: bytes):
         if self.plaintext is None:
             raise ValueError("No plaintext to encrypt")
-        iv = self.entropy + struct.pack("<I", self.timestamp)
+        iv = bytes(self.entropy) + _TIMESTAMP.pack(self.timestamp)
         self.ciphertext = aes_gcm_encrypt(
             key, self.plaintext, iv, self.AUTH_TAG_LENGTH
         )
@@ -201,7 +272,7 @@ class MeshPacket:
     def decrypt(self, key: bytes):
         if self.ciphertext is None:
             raise ValueError("No ciphertext/tag")
-        iv = self.entropy + struct.pack("<I", self.timestamp)
+        iv = bytes(self.entropy) + _TIMESTAMP.pack(self.timestamp)
         self.plaintext = aes_gcm_decrypt(
             key, self.ciphertext, iv, self.AUTH_TAG_LENGTH
         )
@@ -0,0 +1,99 @@
+"""Replay detection table for packet IDs.
+
+Reports are kept in one dict per time bucket, newest last, so
+expiring old packets drops a whole bucket at once instead of
+walking entries.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+
+
+class SeenPacketReport:
+    __slots__ = (
+        "timestamp",
+        "packet_id",
+        "repeaters_seen",
+        "subscribers_seen",
+        "real_copies_seen",
+    )
+
+    def __init__(self, packetID: int):
+        self.timestamp: int = int(time.time())
+        self.packet_id = packetID
+
+        self.repeaters_seen = 0
+        self.subscribers_seen = 0
+        self.real_copies_seen = 0
+
+
+class SeenPacketTable:
+    """Packet ID to SeenPacketReport, for at least horizon seconds.
+
+    If more than max_packets arrive within the horizon, the oldest
+    buckets are dropped early. That can let an old replay through,
+    but a new packet is never reported as already seen.
+    """
+
+    def __init__(
+        self,
+        horizon: float = 180,
+        bucket_seconds: float = 10,
+        max_packets: int = 10**6,
+    ):
+        self.bucket_seconds = bucket_seconds
+        # One extra so the oldest bucket is always a full horizon old
+        self.bucket_count = int(horizon // bucket_seconds) + 1
+        self.max_packets = max_packets
+
+        # (bucket number, reports), oldest first
+        self._buckets: deque[tuple[int, dict[int, SeenPacketReport]]] = deque()
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, packet_id: int) -> bool:
+        return self.get(packet_id) is not None
+
+    def get(self, packet_id: int) -> SeenPacketReport | None:
+        # Newest first, repeats usually arrive soon after the original
+        for _n, reports in reversed(self._buckets):
+            r = reports.get(packet_id)
+            if r is not None:
+                return r
+        return None
+
+    def _current(self, now: float) -> dict[int, SeenPacketReport]:
+        n = int(now // self.bucket_seconds)
+        buckets = self._buckets
+
+        if not buckets or buckets[-1][0] < n:
+            buckets.append((n, {}))
+            while buckets[0][0] <= n - self.bucket_count:
+                self._count -= len(buckets.popleft()[1])
+
+        return buckets[-1][1]
+
+    def get_or_create(
+        self, packet_id: int, now: float | None = None
+    ) -> SeenPacketReport:
+        r = self.get(packet_id)
+        if r is not None:
+            return r
+
+        current = self._current(time.time() if now is None else now)
+
+        while self._count >= self.max_packets and len(self._buckets) > 1:
+            self._count -= len(self._buckets.popleft()[1])
+        if self._count >= self.max_packets:
+            # Everything is in the current bucket
+            self._count -= len(current)
+            current.clear()
+
+        r = SeenPacketReport(packet_id)
+        current[packet_id] = r
+        self._count += 1
+        return r
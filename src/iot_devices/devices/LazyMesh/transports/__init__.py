@@ -3,10 +3,19 @@ from __future__ import annotations
 from collections.abc import AsyncGenerator
 from typing import Protocol
 
+from ..mesh_packet import PacketBuffer
+
 
 class RawPacketMetadata:
-    def __init__(self, raw: bytes, source: ITransport | None):
-        self.raw = raw
+    def __init__(
+        self, raw: bytes | bytearray | memoryview, source: ITransport | None
+    ):
+        # Transports that already read into a PacketBuffer avoid the copy.
+        # MeshNode changes the header in place when repeating it,
+        # channel listeners are given a copy.
+        self.raw: PacketBuffer = (
+            raw if isinstance(raw, PacketBuffer) else PacketBuffer(raw)
+        )
         self.source: ITransport | None = source
 
 
@@ -13,7 +13,7 @@ LAZYMESH_UUID = "d1a77e11-420f-9f11-1a00-10a6beef0001"
 
 class BLETransport(ITransport):
     def __init__(self):
-        self.queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self.queue: asyncio.Queue[mesh_packet.PacketBuffer] = asyncio.Queue()
         self.should_run = True
 
         # We can't transmit at all and if we could it wouldn't be reliable
@@ -29,8 +29,9 @@ class BLETransport(ITransport):
             if svc_data:
                 rssi = advertisement_data.rssi
                 loss = int(max(0, (rssi * 50) / 10))
-                svc_data = mesh_packet.add_packet_loss(svc_data, loss)
-                await self.queue.put(svc_data)
+                packet = mesh_packet.PacketBuffer(svc_data)
+                packet.add_packet_loss(loss)
+                await self.queue.put(packet)
 
         async with BleakScanner(detection_callback):
             while self.should_run:
@@ -6,11 +6,10 @@ from threading import RLock
 from typing import Any
 
 import paho.mqtt.client as mqtt
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
 from scullery.ratelimits import RateLimiter
 
-from ..crypto import aes_gcm_decrypt, aes_gcm_encrypt
+from ..crypto import aes_gcm_decrypt, aes_gcm_encrypt, routing_id_topic_hash
+from ..mesh_packet import PacketBuffer
 from . import ITransport, RawPacketMetadata
 
 logger = logging.getLogger(__name__)
@@ -25,7 +24,7 @@ class MQTTTransport(ITransport):
         port = int(self.url.split("://", 1)[-1].split(":")[1])
 
         self.lock = RLock()
-        self.queue: asyncio.Queue[bytes] = asyncio.Queue()
+        self.queue: asyncio.Queue[PacketBuffer] = asyncio.Queue()
         self.should_run = True
         self.should_subscribe: list[tuple[float, str]] = []
 
@@ -72,13 +71,11 @@ class MQTTTransport(ITransport):
                 if decrypted:
                     # strip metadata (first byte), same as TS version
                     metadata_length = decrypted[0]
-                    payload = decrypted[1 + metadata_length :]
-
-                    header_1 = payload[0]
-                    # Ensure was global routed bit is set
-                    payload = (
-                        payload[:1] + bytes([header_1 | (1 << 7)]) + payload[2:]
+                    payload = PacketBuffer(
+                        memoryview(decrypted)[1 + metadata_length :]
                     )
+                    # Ensure was global routed bit is set
+                    payload.set_was_global_routed()
 
                     if self.loop:
                         asyncio.run_coroutine_threadsafe(
@@ -130,11 +127,13 @@ class MQTTTransport(ITransport):
         if not self.ratelimiter.limit():
             return False
 
-        # set the was global routed bit
-        data = data[:1] + bytes([header_1 | (1 << 7)]) + data[2:]
+        # set the was global routed bit, on a copy since the mesh node
+        # may still be sending the original locally
+        data = PacketBuffer(data)
+        data.set_was_global_routed()
 
         # Extract routingID at offset 4 (ROUTING_ID_OFFSET)
-        routing_id = data[4:20]
+        routing_id = bytes(data.routing_id)
         topic = await self.routing_id_to_hex_topic(routing_id)
 
         # save routingID as encryption key
@@ -154,12 +153,7 @@ class MQTTTransport(ITransport):
         return self.client.is_connected()
 
     async def routing_id_to_hex_topic(self, routing_id: bytes) -> str:
-        digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-        digest.update(routing_id)
-        full_hash = digest.finalize()
-        short_hash = full_hash[:8]  # first 8 bytes
-        hexkey = short_hash.hex()
-        return f"{self.topic_prefix}{hexkey}"
+        return f"{self.topic_prefix}{routing_id_topic_hash(routing_id)}"
 
     def encrypt_msg(self, key: bytes, payload: bytes) -> bytes:
         iv = os.urandom(12)
@@ -1,34 +1,94 @@
 import asyncio
+import collections
+import ipaddress
+import logging
 import socket
 import struct
 from collections.abc import AsyncGenerator
 
+from ..mesh_packet import PacketBuffer
 from . import ITransport, RawPacketMetadata
 
 MCAST_GROUP = "224.0.0.251"
 MCAST_PORT = 2221
 
+# Bigger than any LazyMesh packet
+MAX_PACKET_SIZE = 2048
+
+# Let other callbacks run in between under a flood
+MAX_READS_PER_WAKEUP = 256
+
+logger = logging.getLogger(__name__)
+
 
 class UDPTransport(ITransport):
-    def __init__(self):
-        self.sock = None
+    def __init__(
+        self,
+        address: str = MCAST_GROUP,
+        port: int = MCAST_PORT,
+        *,
+        bind_address: str = "",
+        bind_port: int | None = None,
+        rcvbuf: int | None = None,
+        sndbuf: int | None = None,
+        max_queued: int = 4096,
+    ):
+        """Sends to address:port, joining the group if it is multicast.
+
+        Args:
+            bind_port: Port to listen on, defaults to port.
+            rcvbuf: SO_RCVBUF in bytes, the OS default if None.
+            sndbuf: SO_SNDBUF in bytes, the OS default if None.
+            max_queued: Received packets waiting for the mesh node.
+                The oldest are dropped past this.
+        """
+        self.sock: socket.socket | None = None
         self.use_reliable_retransmission = True
 
+        self.address = address
+        self.port = port
+        self.bind_address = bind_address
+        self.bind_port = port if bind_port is None else bind_port
+        self.rcvbuf = rcvbuf
+        self.sndbuf = sndbuf
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._received: collections.deque[PacketBuffer] = collections.deque(
+            maxlen=max_queued
+        )
+        self._received_event = asyncio.Event()
+        # Packets the socket had no room for, sent when it is writable
+        self._backlog: collections.deque[bytes] = collections.deque()
+        self._use_reader = False
+
     async def setup(self):
+        self.loop = asyncio.get_running_loop()
+
         # Create UDP socket
         self.sock = socket.socket(
             socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP
         )
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.rcvbuf:
+            self.sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf
+            )
+        if self.sndbuf:
+            self.sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf
+            )
 
         try:
-            self.sock.bind(("", MCAST_PORT))  # bind to all interfaces
+            self.sock.bind((self.bind_address, self.bind_port))
         except Exception as e:
             raise RuntimeError(f"Failed to bind UDP socket: {e}")
 
+        if ipaddress.ip_address(self.address).is_multicast:
             # Join multicast group
-            group = socket.inet_aton(MCAST_GROUP)
-            mreq = struct.pack("4s4s", group, socket.inet_aton("0.0.0.0"))
+            group = socket.inet_aton(self.address)
+            mreq = struct.pack(
+                "4s4s", group, socket.inet_aton(self.bind_address or "0.0.0.0")
+            )
 
             # Set the socket option to join the multicast group
             self.sock.setsockopt(
@@ -38,6 +98,34 @@ class UDPTransport(ITransport):
         # Set non-blocking
         self.sock.setblocking(False)
 
+        try:
+            self.loop.add_reader(self.sock.fileno(), self._read_ready)
+            self._use_reader = True
+        except NotImplementedError:
+            # Proactor loops can't watch sockets, receive one at a time
+            self._use_reader = False
+
+    def _read_ready(self):
+        """Drain everything the socket has, straight into PacketBuffers"""
+        sock = self.sock
+        if sock is None:
+            return
+        got = False
+        for _i in range(MAX_READS_PER_WAKEUP):
+            buf = PacketBuffer(MAX_PACKET_SIZE)
+            try:
+                n = sock.recv_into(buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logger.warning(f"[UDPTransport] recv error: {e}")
+                break
+            del buf[n:]
+            self._received.append(buf)
+            got = True
+        if got:
+            self._received_event.set()
+
     async def listen(self) -> AsyncGenerator[RawPacketMetadata | None, None]:
         if not self.sock:
             await self.setup()
@@ -46,31 +134,83 @@ class UDPTransport(ITransport):
 
         while True:
             try:
-                data, _addr = await loop.sock_recvfrom(self.sock, 4096)
-                yield RawPacketMetadata(data, self)
+                if not self._use_reader:
+                    data, _addr = await loop.sock_recvfrom(
+                        self.sock, MAX_PACKET_SIZE
+                    )
+                    yield RawPacketMetadata(data, self)
+                    continue
+
+                await self._received_event.wait()
+                self._received_event.clear()
+                q = self._received
+                while q:
+                    yield RawPacketMetadata(q.popleft(), self)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 print(f"[UDPTransport] recv error: {e}")
                 continue
 
-    async def send(self, data: bytes):
-        if not self.sock:
-            await self.setup()
+    def _sendto(self, data: bytes | bytearray) -> bool:
+        """False if the socket buffer is full"""
         assert self.sock
-        loop = asyncio.get_running_loop()
         try:
-            await loop.sock_sendto(self.sock, data, (MCAST_GROUP, MCAST_PORT))
-        except Exception as e:
+            self.sock.sendto(data, (self.address, self.port))
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError as e:
             print(f"[UDPTransport] send error: {e}")
+        return True
+
+    def _write_ready(self):
+        while self._backlog:
+            if not self._sendto(self._backlog[0]):
+                return
+            self._backlog.popleft()
+        if self.loop and self.sock:
+            self.loop.remove_writer(self.sock.fileno())
+
+    async def send_batch(self, datas: list[bytes | bytearray]):
+        """Send straight from the caller's buffers while the socket
+        has room, only copying what has to wait for it."""
+        if not self.sock:
+            await self.setup()
+        assert self.sock
+
+        if not self._use_reader:
+            loop = asyncio.get_running_loop()
+            for data in datas:
+                try:
+                    await loop.sock_sendto(
+                        self.sock, data, (self.address, self.port)
+                    )
+                except Exception as e:
+                    print(f"[UDPTransport] send error: {e}")
+            return
+
+        for data in datas:
+            if self._backlog or not self._sendto(data):
+                if not self._backlog:
+                    assert self.loop
+                    self.loop.add_writer(self.sock.fileno(), self._write_ready)
+                # Buffers may be changed in place after we return
+                self._backlog.append(bytes(data))
+
+    async def send(self, data: bytes | bytearray):
+        await self.send_batch([data])
 
     async def global_route(self, data: bytes) -> bool:
         return False
 
     async def close(self):
         if self.sock:
+            if self.loop and self._use_reader:
+                self.loop.remove_reader(self.sock.fileno())
+                self.loop.remove_writer(self.sock.fileno())
             self.sock.close()
             self.sock = None
+        self._backlog.clear()
 
     async def maintain(self):
         pass
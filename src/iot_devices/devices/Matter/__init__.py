@@ -3,8 +3,7 @@
 from __future__ import annotations
 
 import asyncio
-import threading
-import time
+import concurrent.futures
 import traceback
 import weakref
 from typing import Any
@@ -83,10 +82,14 @@ class MatterControllerClient(Device):
 
         try:
             if self.config.get("name_map"):
-                name_map = self.config["name_map"]
-                for i in list(name_map.keys()):
-                    if isinstance(i, (int, float)):
-                        name_map.pop(i, None)
+                # Config is frozen, build a new map
+                name_map = {
+                    k: v
+                    for k, v in self.config["name_map"].items()
+                    if not isinstance(k, (int, float))
+                }
+                if len(name_map) != len(self.config["name_map"]):
+                    self.set_config_option("name_map", name_map)
         except Exception:
             self.handle_exception()
 
@@ -95,20 +98,12 @@ class MatterControllerClient(Device):
         self.nodes_by_id: dict[int, Any] = {}  # Raw node objects
         self.client: MatterClient | None = None
 
-        # LazyMesh pattern: separate async event loop in daemon thread
-        self.loop = asyncio.new_event_loop()
+        # Shared event loop from the host, subdevices use the same one
+        self.loop = self.host.get_event_loop(self)
         self.should_run = True
 
-        # Start event loop in daemon thread
-        self.thread = threading.Thread(
-            target=self.loop.run_forever,
-            daemon=True,
-            name="MatterControllerClient:" + self.name,
-        )
-        self.thread.start()
-
         # Start main connection task
-        asyncio.run_coroutine_threadsafe(self.main_loop(), self.loop)
+        self.run_coroutine(self.main_loop())
 
     def rescan_trigger(self, ev: EventType, d: Any):
         if ev == EventType.NODE_ADDED or ev == EventType.NODE_REMOVED:
@@ -126,8 +121,9 @@ class MatterControllerClient(Device):
 
         This allows subdevices and handlers running in the main thread
         to schedule work in the asyncio event loop.
+        The host cancels anything still running when this device closes.
         """
-        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return self.host.create_task(self, coro)
 
     async def main_loop(self):
         """Main connection loop with auto-reconnect and exponential backoff."""
@@ -332,7 +328,7 @@ class MatterControllerClient(Device):
             )
 
     def _get_node_name(self, node: Any):
-        cfg = self.config.get("name_map", {})
+        cfg = dict(self.config.get("name_map", {}))
 
         if str(node.node_id) in cfg:
             return cfg[str(node.node_id)]
@@ -473,15 +469,10 @@ class MatterControllerClient(Device):
 
         try:
             if self.client:
-                self.run_coroutine(self.client.disconnect())
+                f = self.run_coroutine(self.client.disconnect())
+                # The host already reports errors from inside the task
+                concurrent.futures.wait([f], 1)
+                if not f.done():
+                    self.handle_error("Timeout waiting for clean disconnect")
         except Exception:
             self.handle_exception()
-
-        # Stop the event loop
-        if self.loop.is_running():
-            self.loop.call_soon_threadsafe(self.loop.stop)
-
-        # Wait briefly for clean shutdown
-        time.sleep(0.1)
-
-        return super().close()
@@ -138,6 +138,7 @@ class YoLinkMQTTClient:
             self.client.subscribe(self.topic2)
 
             self.parent.connected = True
+            self.parent.connected_event.set()
             self.parent.set_data_point("connected", 1)
             self.parent.print("Connected to MQTT")
 
@@ -598,23 +599,20 @@ class YoLinkService(device.Device):
         self.client = c
 
         self.connected = False
+        self.connected_event.clear()
         c.connect_to_broker()
 
-        t = time.time()
-
-        while not self.connected:
-            if time.time() - t > 5:
-                break
+        self.connected_event.wait(5)
 
         for i in devList:
             t = i["type"]
-            d = {}
 
             if t in deviceTypes:
                 if i["name"] not in self.subdevices:
-                    d = self.create_subdevice(
-                        deviceTypes[t], i["name"], d
-                    ).wait_ready()
+                    d = self.create_subdevice(deviceTypes[t], i["name"], {})
+                    d.wait_ready()
+                else:
+                    d = self.subdevices[i["name"]]
 
                 d.deviceId = i["deviceId"]
                 d.token = i["token"]
@@ -644,6 +642,8 @@ class YoLinkService(device.Device):
         device.Device.__init__(self, data, **kw)
         name = self.name
         self.shouldRun = False
+        self.connected = False
+        self.connected_event = threading.Event()
         try:
             self.numeric_data_point("connected", subtype="bool", writable=False)
             self.set_alarm(
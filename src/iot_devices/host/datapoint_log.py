@@ -0,0 +1,372 @@
+"""Append-only log of every data point change, for auditing.
+
+A log is a directory of segment files named by sequence number.
+Each record is a fixed header of slot id, timestamp, type tag and
+payload length, followed by the payload. Slot ids are defined by
+a NAME record the first time a point appears in each segment,
+so every segment can be read on it's own.
+
+Next to each segment, a sparse .idx file in the same record format
+lists every name in the segment and one BLOCK record per
+index_interval records, with the block's offset, length and time
+range. The reader uses it to skip blocks outside the requested time.
+The index is only a hint. It is not fsynced, and anything past its
+last block is scanned.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterator
+from typing import Any
+
+import msgpack
+
+# slot id, timestamp, type tag, payload length
+_HEADER = struct.Struct("<IdBI")
+_DOUBLE = struct.Struct("<d")
+
+TAG_NONE = 0
+TAG_FLOAT = 1
+TAG_STR = 2
+TAG_BYTES = 3
+TAG_OBJECT = 4
+TAG_BLOCK = 254
+TAG_NAME = 255
+
+# Block offset, length and newest timestamp, the oldest is in the header
+_BLOCK = struct.Struct("<QQd")
+
+
+def _encode(value: Any) -> tuple[int, bytes]:
+    if value is None:
+        return TAG_NONE, b""
+    t = type(value)
+    if t is float or t is int:
+        return TAG_FLOAT, _DOUBLE.pack(value)
+    if t is str:
+        return TAG_STR, value.encode()
+    if t is bytes:
+        return TAG_BYTES, value
+    return TAG_OBJECT, msgpack.packb(value, default=str)
+
+
+def _decode(tag: int, payload: memoryview) -> Any:
+    if tag == TAG_FLOAT:
+        return _DOUBLE.unpack(payload)[0]
+    if tag == TAG_STR:
+        return str(payload, "utf-8")
+    if tag == TAG_BYTES:
+        return bytes(payload)
+    if tag == TAG_OBJECT:
+        return msgpack.unpackb(payload)
+    return None
+
+
+def _segment_name(seq: int) -> str:
+    return f"segment-{seq:08d}.log"
+
+
+def _index_name(path: str) -> str:
+    return path[:-4] + ".idx"
+
+
+def _segments(directory: str) -> list[str]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        os.path.join(directory, i)
+        for i in names
+        if i.startswith("segment-") and i.endswith(".log")
+    )
+
+
+class _Block:
+    __slots__ = ("start", "oldest", "newest", "count")
+
+    def __init__(self, start: int, timestamp: float):
+        self.start = start
+        self.oldest = timestamp
+        self.newest = timestamp
+        self.count = 0
+
+
+class DatapointLog:
+    """Buffers records in memory and a background thread writes
+    them out every commit_interval seconds, with one fsync
+    per batch instead of per record.
+
+    append() never touches the disk, so it is safe to call
+    while holding locks other threads are waiting on.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        segment_size: int = 64 * 1024 * 1024,
+        commit_interval: float = 0.2,
+        fsync: bool = True,
+        max_buffer: int = 16 * 1024 * 1024,
+        index_interval: int = 1024,
+    ):
+        """Args:
+        segment_size: Start a new segment once the current one
+            is this many bytes.
+        max_buffer: If this much is waiting, the background thread
+            is woken to commit early instead of waiting for
+            commit_interval.
+        index_interval: Records per block in the segment index.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.max_buffer = max_buffer
+        self.index_interval = index_interval
+
+        os.makedirs(directory, exist_ok=True)
+
+        existing = _segments(directory)
+        self._seq = 0
+        if existing:
+            self._seq = int(os.path.basename(existing[-1])[8:-4]) + 1
+
+        self._lock = threading.Lock()
+        # Only one commit writes to the file at a time
+        self._commit_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._ids: dict[str, int] = {}
+        self._defined: set[int] = set()
+        # Index records for what is in the buffer, names and blocks
+        # with offsets relative to the buffer
+        self._new_names = bytearray()
+        self._blocks: list[_Block] = []
+        self._open_segment()
+        self._closed = False
+        self._wake = threading.Event()
+        self.records = 0
+
+        self._thread = threading.Thread(
+            target=self._commit_loop, name="DatapointLog", daemon=True
+        )
+        self._thread.start()
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, _segment_name(self._seq))
+        self._file = open(path, "ab")
+        self._index_file = open(_index_name(path), "ab")
+
+    def append(self, name: str, timestamp: float, value: Any):
+        """Buffer one record. Dropped once the log is closed."""
+        tag, payload = _encode(value)
+        with self._lock:
+            if self._closed:
+                return
+            slot_id = self._ids.get(name)
+            if slot_id is None:
+                slot_id = self._ids[name] = len(self._ids)
+            b = self._buffer
+
+            blocks = self._blocks
+            if not blocks or blocks[-1].count >= self.index_interval:
+                blocks.append(_Block(len(b), timestamp))
+            block = blocks[-1]
+            block.count += 1
+            if timestamp < block.oldest:
+                block.oldest = timestamp
+            elif timestamp > block.newest:
+                block.newest = timestamp
+
+            if slot_id not in self._defined:
+                self._defined.add(slot_id)
+                n = name.encode()
+                record = _HEADER.pack(slot_id, timestamp, TAG_NAME, len(n)) + n
+                b += record
+                self._new_names += record
+            b += _HEADER.pack(slot_id, timestamp, tag, len(payload))
+            b += payload
+            self.records += 1
+            if len(b) > self.max_buffer:
+                self._wake.set()
+
+    def commit(self):
+        """Write and fsync everything buffered so far"""
+        with self._commit_lock:
+            self._commit()
+
+    def _commit(self):
+        with self._lock:
+            data = self._buffer
+            if not data or self._file.closed:
+                return
+            names = self._new_names
+            blocks = self._blocks
+            self._buffer = bytearray()
+            self._new_names = bytearray()
+            self._blocks = []
+            rotate = self._file.tell() + len(data) > self.segment_size
+            if rotate:
+                # Names must be defined again in the new segment
+                self._defined = set()
+
+        f = self._file
+        base = f.tell()
+        f.write(data)
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+        # Written after the data it points to, so a crash can only
+        # leave the index short
+        index = names
+        for n, block in enumerate(blocks):
+            end = blocks[n + 1].start if n + 1 < len(blocks) else len(data)
+            index += _HEADER.pack(0, block.oldest, TAG_BLOCK, _BLOCK.size)
+            index += _BLOCK.pack(
+                base + block.start, end - block.start, block.newest
+            )
+        self._index_file.write(index)
+        self._index_file.flush()
+
+        if rotate:
+            f.close()
+            self._index_file.close()
+            self._seq += 1
+            self._open_segment()
+
+    def _commit_loop(self):
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            self.commit()
+
+    def close(self):
+        with self._commit_lock:
+            with self._lock:
+                self._closed = True
+            self._commit()
+            self._file.close()
+            self._index_file.close()
+        self._wake.set()
+
+
+def _read_index(
+    path: str,
+) -> tuple[dict[int, str], list[tuple[int, int, float, float]]]:
+    """Names and (offset, length, oldest, newest) blocks from the
+    index next to a segment. Empty if there is none."""
+    names: dict[int, str] = {}
+    blocks: list[tuple[int, int, float, float]] = []
+    try:
+        with open(_index_name(path), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return names, blocks
+
+    pos = 0
+    hsize = _HEADER.size
+    while pos + hsize <= len(data):
+        slot_id, ts, tag, length = _HEADER.unpack_from(data, pos)
+        pos += hsize
+        if pos + length > len(data):
+            break
+        if tag == TAG_NAME:
+            names[slot_id] = data[pos : pos + length].decode()
+        elif tag == TAG_BLOCK and length == _BLOCK.size:
+            offset, size, newest = _BLOCK.unpack_from(data, pos)
+            blocks.append((offset, size, ts, newest))
+        pos += length
+    return names, blocks
+
+
+class DatapointLogReader:
+    """Reads a log directory through mmap, segment by segment.
+
+    With since or until, each segment's index is used to skip
+    blocks entirely outside the range, so only the pages of the
+    blocks that may match are touched.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def replay(
+        self, since: float | None = None, until: float | None = None
+    ) -> Iterator[tuple[str, float, Any]]:
+        """Yield (name, timestamp, value) in log order.
+
+        Records don't have to be in time order, blocks are skipped
+        by the oldest and newest timestamp they contain.
+        """
+        for path in _segments(self.directory):
+            yield from self._read_segment(path, since, until)
+
+    def _read_segment(
+        self, path: str, since: float | None, until: float | None
+    ) -> Iterator[tuple[str, float, Any]]:
+        names, blocks = _read_index(path)
+
+        # Only the blocks that may have something in range,
+        # then whatever was written after the index
+        ranges: list[tuple[int, int]] = []
+        indexed = 0
+        for offset, size, oldest, newest in blocks:
+            if offset != indexed:
+                # Not contiguous, don't trust the rest
+                break
+            indexed = offset + size
+            if (since is not None and newest < since) or (
+                until is not None and oldest > until
+            ):
+                continue
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], indexed)
+            else:
+                ranges.append((offset, indexed))
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if indexed < size:
+                ranges.append((indexed, size))
+            if not ranges:
+                return
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file
+                return
+
+        with m:
+            view = memoryview(m)
+            try:
+                hsize = _HEADER.size
+                unpack = _HEADER.unpack_from
+                for pos, end in ranges:
+                    end = min(end, len(m))
+                    while pos + hsize <= end:
+                        slot_id, ts, tag, length = unpack(m, pos)
+                        pos += hsize
+                        if pos + length > end:
+                            # Torn write at the end
+                            break
+                        if tag == TAG_NAME:
+                            names[slot_id] = str(
+                                view[pos : pos + length], "utf-8"
+                            )
+                        elif (since is None or ts >= since) and (
+                            until is None or ts <= until
+                        ):
+                            yield (
+                                names.get(slot_id, str(slot_id)),
+                                ts,
+                                _decode(tag, view[pos : pos + length]),
+                            )
+                        pos += length
+            finally:
+                view.release()
@@ -2,17 +2,33 @@ from __future__ import annotations
 
 import abc
 import asyncio
+import concurrent.futures
 import copy
 import logging
 import threading
-import time
 import traceback
 import warnings
 import weakref
-from collections.abc import Callable, Mapping
+from collections.abc import (
+    Callable,
+    Coroutine,
+    Iterable,
+    Mapping,
+    Sequence,
+)
+from types import MappingProxyType
 from typing import TYPE_CHECKING, Any, Generic, Self, TypeVar, final
 
+from ..datapoints import (
+    BytesDataPoint,
+    DataPoint,
+    NumericDataPoint,
+    ObjectDataPoint,
+    StringDataPoint,
+)
 from ..util import str_to_bool
+from .registry import DataPointRegistry
+from .subscriptions import Subscription, SubscriptionBus, SubscriptionCallback
 from .util import get_class
 
 if TYPE_CHECKING:
@@ -82,6 +98,46 @@ def normalize_legacy_config(cls, config: dict[str, Any]):
     return config
 
 
+class _LoopThread:
+    """One event loop running forever in a daemon thread.
+    Part of the host's shared async runtime."""
+
+    def __init__(self, index: int):
+        self.loop = asyncio.new_event_loop()
+        # Names of the top level devices sharded onto this loop
+        self.devices: set[str] = set()
+        self.thread = threading.Thread(
+            target=self._run, name=f"HostAsyncLoop{index}", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                tasks = asyncio.all_tasks(self.loop)
+                for i in tasks:
+                    i.cancel()
+                if tasks:
+                    self.loop.run_until_complete(
+                        asyncio.gather(*tasks, return_exceptions=True)
+                    )
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            except Exception:
+                _logger.exception("Error shutting down event loop")
+            self.loop.close()
+
+    def stop(self, timeout: float | None = None):
+        try:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        except RuntimeError:
+            return
+        if threading.current_thread() is not self.thread:
+            self.thread.join(timeout)
+
+
 class DeviceHostContainer:
     """Represents the host's associated state for one device.
     Created and made available before the device itself.
@@ -100,6 +156,11 @@ class DeviceHostContainer:
         self.device: device.Device | None = None
         self._device_exception: Exception | None = None
 
+        # Resolved by the host when __init__ finishes or fails
+        self._ready_future: concurrent.futures.Future[device.Device] = (
+            concurrent.futures.Future()
+        )
+
         self.__initial_config: Mapping[str, Any] = device_config
 
     @property
@@ -113,13 +174,20 @@ class DeviceHostContainer:
             return self.__initial_config
 
     @final
-    def wait_device_ready(self) -> device.Device:
-        while self.device is None:
-            if self._device_exception is not None:
-                raise self._device_exception
-            time.sleep(0.1)
+    def wait_device_ready(self, timeout: float | None = None) -> device.Device:
+        """Block until the device __init__ is done and return the device.
+        Raises whatever __init__ raised, or TimeoutError.
+        """
+        return self._ready_future.result(timeout)
 
-        return self.device
+    @final
+    async def async_wait_device_ready(
+        self, timeout: float | None = None
+    ) -> device.Device:
+        """Same as wait_device_ready, but can be awaited from any loop."""
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(self._ready_future)), timeout
+        )
 
     def on_device_ready(self, device: device.Device):
         """Called when the device __init__ is done"""
@@ -135,6 +203,8 @@ class DeviceHostContainer:
         return f"<{self.__class__.__name__} for {repr(self.device)}>"
 
 
+_T = TypeVar("_T")
+
 _HostContainerTypeVar = TypeVar(
     "_HostContainerTypeVar", bound=DeviceHostContainer
 )
@@ -150,6 +220,10 @@ class Host(Generic[_HostContainerTypeVar]):
 
     """
 
+    event_loop_threads: int = 4
+    """Size of the shared async runtime. Devices are spread across
+    this many event loop threads, which are started lazily."""
+
     def __init__(self, container_type: type[_HostContainerTypeVar]):
         self.__container_type = container_type
         self.devices: dict[str, _HostContainerTypeVar] = {}
@@ -158,7 +232,27 @@ class Host(Generic[_HostContainerTypeVar]):
 
         self.host_apis = {}
 
-        self.__async_loop: asyncio.AbstractEventLoop | None = None
+        # Shared async runtime, see get_event_loop()
+        self.__loops: list[_LoopThread] = []
+        self.__device_loops: dict[str, _LoopThread] = {}
+        self.__device_tasks: dict[str, set[concurrent.futures.Future[Any]]] = {}
+        # Loop each device's tasks run on, subdevices use their root's
+        self.__task_loops: dict[str, _LoopThread] = {}
+        self.__loops_stopped = False
+
+        self.__subscriptions = SubscriptionBus()
+
+        self.datapoint_registry = DataPointRegistry()
+        """Metadata of every data point, for filtering by device,
+        type, subtype, unit or name prefix."""
+
+        # Bumped whenever self.devices changes, so get_devices()
+        # only copies when something happened.
+        self.__devices_generation = 0
+        self.__devices_snapshot: Mapping[str, _HostContainerTypeVar] = (
+            MappingProxyType({})
+        )
+        self.__devices_snapshot_generation = 0
 
         # Bottom layer lock, out code cannot call user code
         # While under this.  Just to protect iterable state
@@ -168,31 +262,197 @@ class Host(Generic[_HostContainerTypeVar]):
 
     @final
     def get_devices(self) -> Mapping[str, _HostContainerTypeVar]:
-        """Immutable snapshot of devices that is safe to iterate"""
+        """Immutable snapshot of devices that is safe to iterate.
+        The same object is returned until a device is added or removed."""
+        with self.__lock:
+            if self.__devices_snapshot_generation != self.__devices_generation:
+                self.__devices_snapshot = MappingProxyType(dict(self.devices))
+                self.__devices_snapshot_generation = self.__devices_generation
+            return self.__devices_snapshot
+
+    @final
+    def subscribe(
+        self,
+        pattern: str,
+        callback: SubscriptionCallback,
+        *,
+        min_interval: float = 0,
+        deadband: float = 0,
+    ) -> Subscription:
+        """Get callback(name, value, timestamp, annotation) whenever
+        a data point matching the pattern changes. Patterns match resolved
+        names segment by segment, like "dev.*" or "dev.temp*",
+        and "dev.**" matches everything under dev.
+
+        Args:
+            min_interval: Drop updates that come sooner than this many
+                seconds after the last delivered one, per data point.
+            deadband: Drop numeric updates closer than this to the
+                last delivered value.
+
+        Callbacks run in whatever thread set the value and must not block.
+        """
+        sub = Subscription(
+            self.__subscriptions, pattern, callback, min_interval, deadband
+        )
+        self.__subscriptions.add(sub)
+        return sub
+
+    @final
+    def publish_data_point(
+        self, name: str, value: Any, timestamp: float, annotation: Any
+    ):
+        """Hosts call this with the resolved name when a value changes,
+        to notify subscribers. Nearly free when nobody subscribed."""
+        if self.__subscriptions.count:
+            self.__subscriptions.publish(name, value, timestamp, annotation)
+
+    def __root_name(self, device: device.Device) -> str:
+        c = self.devices.get(device.name)
+        if c is None:
+            return device.name
+        while c.parent is not None:
+            c = c.parent
+        return c.name
+
+    def __loop_for(self, device: device.Device) -> _LoopThread:
         with self.__lock:
-            return copy.copy(self.devices)
+            if self.__loops_stopped:
+                raise RuntimeError("Host is closed")
+            root = self.__root_name(device)
+            lt = self.__device_loops.get(root)
+            if lt is None:
+                if len(self.__loops) < max(1, self.event_loop_threads):
+                    lt = _LoopThread(len(self.__loops))
+                    self.__loops.append(lt)
+                else:
+                    lt = min(self.__loops, key=lambda x: len(x.devices))
+                lt.devices.add(root)
+                self.__device_loops[root] = lt
+            return lt
 
     @final
     def get_event_loop(
         self, device: device.Device
     ) -> asyncio.AbstractEventLoop:
         """Devices can request an event loop to avoid having to manage it.
-        Currently does nothing except managing loop lifetime.
+
+        The host runs a small pool of loop threads, see event_loop_threads.
+        Each top level device is pinned to the least busy loop,
+        and subdevices share their parent's loop.
+
+        The loop runs in another thread, use create_task() or
+        asyncio.run_coroutine_threadsafe() to run things on it,
+        and never stop or close it.
         """
+        return self.__loop_for(device).loop
+
+    @final
+    def create_task(
+        self,
+        device: device.Device,
+        coro: Coroutine[Any, Any, _T],
+    ) -> concurrent.futures.Future[_T]:
+        """Run a coroutine on the device's event loop, from any thread.
+
+        Exceptions are reported through the device's handle_exception(),
+        so code waiting on the future should not report them again.
+        Anything still running when the device is closed gets cancelled.
+
+        Returns:
+            A thread safe future for the result.
+        """
+        lt = self.__loop_for(device)
+        name = device.name
+
+        async def supervised() -> _T:
+            try:
+                return await coro
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                device.handle_exception()
+                raise
+
+        f = asyncio.run_coroutine_threadsafe(supervised(), lt.loop)
+
         with self.__lock:
-            if self.__async_loop is None:
-                self.__async_loop = asyncio.get_event_loop()
-                t = threading.Thread(
-                    target=self.__async_loop.run_forever,
-                    name="HostAsyncLoop",
-                )
-                t.start()
-            return self.__async_loop
+            self.__device_tasks.setdefault(name, set()).add(f)
+            self.__task_loops[name] = lt
+
+        def done(f: concurrent.futures.Future[_T]):
+            with self.__lock:
+                tasks = self.__device_tasks.get(name)
+                if tasks is not None:
+                    tasks.discard(f)
+                    if not tasks:
+                        del self.__device_tasks[name]
+
+        f.add_done_callback(done)
+        return f
+
+    @final
+    def cancel_device_tasks(self, name: str, timeout: float = 5) -> bool:
+        """Cancel everything started with create_task() for one device.
+        The host does this automatically when the device closes.
+
+        Returns:
+            False if any task didn't finish within the timeout
+        """
+        with self.__lock:
+            tasks = self.__device_tasks.pop(name, set())
+            # By now the device may already be gone from self.devices
+            lt = self.__task_loops.pop(name, None)
+
+        for i in tasks:
+            i.cancel()
+
+        # Can't wait on ourselves
+        if lt and threading.current_thread() is lt.thread:
+            return True
+
+        done, pending = concurrent.futures.wait(tasks, timeout)
+        return not pending
+
+    def __release_event_loop(self, name: str):
+        with self.__lock:
+            lt = self.__device_loops.pop(name, None)
+            if lt:
+                lt.devices.discard(name)
+
+    def __stop_event_loops(self, timeout: float | None = 5):
+        with self.__lock:
+            loops = self.__loops
+            self.__loops = []
+            self.__loops_stopped = True
+            self.__device_loops.clear()
+            self.__task_loops.clear()
+
+        for i in loops:
+            i.stop(timeout)
 
     @final
-    def close(self):
+    def close(
+        self, *, max_workers: int = 1, timeout: float | None = None
+    ) -> list[str]:
+        """Close every device, in reverse load order.
+        Devices close their own subdevices before themselves.
+
+        Args:
+            max_workers: If more than 1, top level devices are closed
+                in parallel, each along with it's whole subtree.
+
+            timeout: Overall deadline in seconds for closing devices.
+                Devices still closing after that are abandoned. Their
+                close() keeps running on a daemon thread that is never
+                joined, and devices that had not started closing yet
+                are not closed at all.
+
+        Returns:
+            Names of the top level devices that missed the deadline.
+        """
         if self.closing:
-            return
+            return []
 
         with self.__lock:
             self.closing = True
@@ -202,40 +462,77 @@ class Host(Generic[_HostContainerTypeVar]):
 
             x = list(self.devices.values())
 
-            if self.__async_loop:
-                self.__async_loop.stop()
-                # Reduce nuisance errors
-                for i in range(100):
-                    if self.__async_loop.is_running():
-                        break
+        top_level: list[_HostContainerTypeVar] = []
 
         for i in ordered:
             d = i.device
             if d:
-                try:
-                    if not d.config.get("is_subdevice", False):
-                        d.close()
-                except Exception:
-                    _logger.exception("Error closing device")
+                if not d.config.get("is_subdevice", False):
+                    top_level.append(i)
                 try:
                     x.remove(i)
                 except ValueError:
                     pass
 
         # Close anything the ordered list somehow missed
-
-        # Close outside of lock for deadlock prevention
         for i in x:
             d = i.device
+            if d and not d.config.get("is_subdevice", False):
+                top_level.append(i)
+
+        def close_one(c: _HostContainerTypeVar):
+            d = c.device
             if d:
-                if not d.config.get("is_subdevice", False):
-                    try:
-                        d.close()
-                    except Exception:
-                        _logger.exception("Error closing device")
+                try:
+                    d.close()
+                except Exception:
+                    _logger.exception("Error closing device")
+
+        # Close outside of lock for deadlock prevention
+        missed: list[str] = []
+        if max_workers <= 1 and timeout is None:
+            for i in top_level:
+                close_one(i)
+        else:
+            # Daemon threads rather than an executor, so a device that
+            # never finishes closing can't block interpreter exit
+            queue = list(reversed(top_level))
+            remaining = {i.name for i in top_level}
+            cond = threading.Condition()
+            abandoned = False
+
+            def worker():
+                while True:
+                    with cond:
+                        if abandoned or not queue:
+                            return
+                        c = queue.pop()
+                    close_one(c)
+                    with cond:
+                        remaining.discard(c.name)
+                        cond.notify_all()
+
+            for _i in range(min(max(1, max_workers), len(top_level))):
+                threading.Thread(
+                    target=worker, name="HostDeviceClose", daemon=True
+                ).start()
+
+            with cond:
+                cond.wait_for(lambda: not remaining, timeout)
+                abandoned = True
+                missed = sorted(remaining)
+
+            if missed:
+                _logger.warning(
+                    "Devices did not close in time and were abandoned, "
+                    "any close() still running is left on it's thread: "
+                    f"{missed}"
+                )
 
         # Close any subdevices that the parent didn't close
         for i in x:
+            if any(i.name == m or i.name.startswith(m + "/") for m in missed):
+                continue
             try:
                 d = i.device
                 if d:
@@ -249,6 +546,17 @@ class Host(Generic[_HostContainerTypeVar]):
 
         with self.__lock:
             self.devices.clear()
+            self.__devices_generation += 1
+
+        # Devices that missed the deadline may still be using their loop
+        self.__stop_event_loops(5 if not missed else 0)
+
+        try:
+            self.on_after_close()
+        except Exception:
+            _logger.exception("Error in on_after_close")
+
+        return missed
 
     @final
     def close_device(self, name: str):
@@ -262,10 +570,14 @@ class Host(Generic[_HostContainerTypeVar]):
                 c = self.devices[name]
                 x = c.device
                 del self.devices[name]
+                self.__devices_generation += 1
 
         if c:
             if x:
                 x.close()
+            if not self.cancel_device_tasks(name):
+                _logger.warning(f"Tasks for {name} did not finish cancelling")
+            self.__release_event_loop(name)
             c.on_after_device_removed()
             self.on_after_device_removed(c)
 
@@ -309,7 +621,14 @@ class Host(Generic[_HostContainerTypeVar]):
         dashboard: bool = True,  # pylint: disable=unused-argument
         on_request: Callable[[], Any] | None = None,
         **kwargs: Any,  # pylint: disable=unused-argument
-    ) -> None:
+    ) -> Any:
+        """Register a new string data point with the given properties.
+
+        All of the data point registration functions may return an
+        opaque handle, which will be given back to set_data_point_by_handle
+        and get_data_point_by_handle. Return None to always be called
+        by name.
+        """
         raise NotImplementedError
 
     def object_data_point(
@@ -327,7 +646,7 @@ class Host(Generic[_HostContainerTypeVar]):
         default: Mapping[str, Any] | None = None,
         on_request: Callable[[], Any] | None = None,
         **kwargs: Any,  # pylint: disable=unused-argument
-    ) -> None:
+    ) -> Any:
         """Register a new object data point with the given properties.   Here "object"
         means a JSON-like object.
         """
@@ -352,7 +671,7 @@ class Host(Generic[_HostContainerTypeVar]):
         dashboard: bool = True,  # pylint: disable=unused-argument
         on_request: Callable[[], Any] | None = None,
         **kwargs: Any,  # pylint: disable=unused-argument
-    ) -> None:
+    ) -> Any:
         """Called by the device to get a new data point."""
         raise NotImplementedError
 
@@ -368,7 +687,7 @@ class Host(Generic[_HostContainerTypeVar]):
         dashboard: bool = True,  # pylint: disable=unused-argument
         on_request: Callable[[], Any] | None = None,
         **kwargs: Any,  # pylint: disable=unused-argument
-    ) -> None:
+    ) -> Any:
         """register a new bytestream data point with the
         given properties. handler will be called when it changes.
         only meant to be called from within __init__.
@@ -381,6 +700,27 @@ class Host(Generic[_HostContainerTypeVar]):
         """
         raise NotImplementedError
 
+    def set_data_point_by_handle(
+        self,
+        handle: Any,
+        value: Any,
+        timestamp: float | None = None,
+        annotation: Any | None = None,
+        force_push_on_repeat: bool = False,
+    ) -> None:
+        """Set a data point using the handle returned when it was registered.
+        The value has already been coerced to the point's type.
+
+        Only called if the host gives out handles. Must happen locklessly.
+        """
+        raise NotImplementedError
+
+    def get_data_point_by_handle(self, handle: Any) -> tuple[Any, float, Any]:
+        """Get a data point using the handle returned when it was registered.
+        Only called if the host gives out handles.
+        """
+        raise NotImplementedError
+
     @final
     def request_data_point(self, device: str, name: str) -> None:
         """Ask a device to refresh it's data point"""
@@ -462,6 +802,35 @@ class Host(Generic[_HostContainerTypeVar]):
         """Subclass to handle data points.  Must happen locklessly."""
         raise NotImplementedError
 
+    def set_data_points(
+        self,
+        device: str,
+        values: Sequence[tuple[DataPoint[Any], Any, float, Any]],
+    ) -> None:
+        """Apply a whole frame of values from one device at once.
+
+        Values have already been coerced to the point's type and
+        every entry has a timestamp.
+
+        Subclass this to write a frame to storage in one go.
+        The default just calls the per-type setters one at a time.
+        Must happen locklessly.
+        """
+        for dp, value, timestamp, annotation in values:
+            name = dp.datapoint_name
+            if dp.handle is not None:
+                self.set_data_point_by_handle(
+                    dp.handle, value, timestamp, annotation
+                )
+            elif isinstance(dp, NumericDataPoint):
+                self.set_number(device, name, value, timestamp, annotation)
+            elif isinstance(dp, StringDataPoint):
+                self.set_string(device, name, value, timestamp, annotation)
+            elif isinstance(dp, ObjectDataPoint):
+                self.set_object(device, name, value, timestamp, annotation)
+            elif isinstance(dp, BytesDataPoint):
+                self.set_bytes(device, name, value, timestamp, annotation)
+
     @final
     def add_new_device(
         self,
@@ -480,6 +849,64 @@ class Host(Generic[_HostContainerTypeVar]):
             c, config, host_container_kwargs=host_container_kwargs, **kwargs
         )
 
+    @final
+    def add_devices_bulk(
+        self,
+        configs: Iterable[dict[str, Any]],
+        *,
+        max_workers: int = 16,
+        host_container_kwargs: dict[str, Any] = {},
+    ) -> dict[str, _HostContainerTypeVar]:
+        """Add many devices at once, building independent top level
+        devices in parallel on a thread pool, so startup takes about as
+        long as the slowest device rather than the sum of all of them.
+
+        Subdevices are still built by their parents, on the parent's
+        worker thread, so configs marked is_subdevice are skipped.
+        Supply their config through get_config_for_device instead.
+
+        Failures are reported through on_device_init_fail as usual and
+        logged, and are left out of the result.
+
+        Returns:
+            The containers of the devices that were added, by name.
+        """
+        top_level: list[tuple[type[device.Device], dict[str, Any]]] = []
+
+        # Class lookup may scan the disk and isn't threadsafe,
+        # so do it all here first.
+        for config in configs:
+            if config.get("is_subdevice", False):
+                continue
+            try:
+                top_level.append((get_class(config), config))
+            except Exception:
+                _logger.exception(f"Could not find class for {config['name']}")
+
+        results: dict[str, _HostContainerTypeVar] = {}
+
+        if top_level:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, min(max_workers, len(top_level))),
+                thread_name_prefix="HostDeviceStartup",
+            ) as pool:
+                futures = {
+                    pool.submit(
+                        self.add_device_from_class,
+                        cls,
+                        config,
+                        host_container_kwargs=host_container_kwargs,
+                    ): config["name"]
+                    for cls, config in top_level
+                }
+                for f in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[f]] = f.result()
+                    except Exception:
+                        _logger.exception(f"Error adding {futures[f]}")
+
+        return results
+
     # This is the only function to actually add a device
     @final
     def add_device_from_class(
@@ -528,6 +955,7 @@ class Host(Generic[_HostContainerTypeVar]):
                     self, parentContainer, data, **host_container_kwargs
                 )
                 self.devices[name] = cont
+                self.__devices_generation += 1
 
             try:
                 self.on_before_device_added(name, cont)
@@ -541,6 +969,9 @@ class Host(Generic[_HostContainerTypeVar]):
                     ]
 
                 cont.device = d
+                cont._ready_future.set_result(d)
+                if d.ready_after_init:
+                    d.set_ready()
                 cont.on_device_ready(d)
                 self.on_device_added(self.devices[name])
 
@@ -548,8 +979,11 @@ class Host(Generic[_HostContainerTypeVar]):
             except Exception as e:
                 with self.__lock:
                     x = self.devices.pop(name, None)
+                    self.__devices_generation += 1
                 if x is not None:
                     x._device_exception = e
+                    if not x._ready_future.done():
+                        x._ready_future.set_exception(e)
                     x.on_device_init_fail(e)
                 raise
 
@@ -669,6 +1103,10 @@ class Host(Generic[_HostContainerTypeVar]):
     def on_device_added(self, device_container: _HostContainerTypeVar) -> None:
         pass
 
+    def on_after_close(self) -> None:
+        """Called at the end of close(), after devices are closed,
+        to flush and release host level resources."""
+
     def on_before_device_added(
         self,
         name: str,
@@ -0,0 +1,240 @@
+"""Index of data point metadata, for UIs that need to filter points."""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterator, Mapping
+from types import MappingProxyType
+from typing import Any, Literal
+
+DataPointType = Literal["numeric", "string", "object", "bytes"]
+
+
+class DataPointInfo:
+    """Everything a device said about a data point when registering it"""
+
+    __slots__ = (
+        "name",
+        "device",
+        "datapoint",
+        "type",
+        "subtype",
+        "unit",
+        "description",
+        "writable",
+        "dashboard",
+        "min",
+        "max",
+        "hi",
+        "lo",
+        "interval",
+        "extra",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        device: str,
+        datapoint: str,
+        type: DataPointType,
+        *,
+        subtype: str = "",
+        unit: str = "",
+        description: str = "",
+        writable: bool = True,
+        dashboard: bool = True,
+        min: float | None = None,
+        max: float | None = None,
+        hi: float | None = None,
+        lo: float | None = None,
+        interval: float = 0,
+        extra: Mapping[str, Any] | None = None,
+    ):
+        self.name = name
+        self.device = device
+        self.datapoint = datapoint
+        self.type = type
+        self.subtype = subtype
+        self.unit = unit
+        self.description = description
+        self.writable = writable
+        self.dashboard = dashboard
+        self.min = min
+        self.max = max
+        self.hi = hi
+        self.lo = lo
+        self.interval = interval
+        # Any other keyword arguments, like deadband
+        self.extra: Mapping[str, Any] = MappingProxyType(dict(extra or {}))
+
+    def __repr__(self) -> str:
+        return f"<DataPointInfo {self.name} {self.type}>"
+
+
+class _TrieNode:
+    __slots__ = ("children", "point")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.point: str | None = None
+
+
+class DataPointRegistry:
+    """Metadata of every registered data point, indexed by device,
+    type, subtype and unit, with a trie over the dot separated names.
+
+    generation changes whenever anything is added or removed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.points: dict[str, DataPointInfo] = {}
+        self.by_device: dict[str, dict[str, DataPointInfo]] = {}
+        self._by_field: dict[str, dict[Any, set[str]]] = {
+            "type": {},
+            "subtype": {},
+            "unit": {},
+        }
+        self._root = _TrieNode()
+        self.generation = 0
+        self._snapshot: Mapping[str, DataPointInfo] = MappingProxyType({})
+        self._snapshot_generation = 0
+
+    def add(self, info: DataPointInfo):
+        """Add or replace a point"""
+        with self._lock:
+            if info.name in self.points:
+                self._remove(info.name)
+
+            self.points[info.name] = info
+            self.by_device.setdefault(info.device, {})[info.name] = info
+            for field, index in self._by_field.items():
+                index.setdefault(getattr(info, field), set()).add(info.name)
+
+            node = self._root
+            for part in info.name.split("."):
+                node = node.children.setdefault(part, _TrieNode())
+            node.point = info.name
+
+            self.generation += 1
+
+    def remove(self, name: str) -> DataPointInfo | None:
+        with self._lock:
+            info = self._remove(name)
+            if info is not None:
+                self.generation += 1
+            return info
+
+    def remove_device(self, device: str) -> list[str]:
+        """Remove every point of one device, returning their names"""
+        with self._lock:
+            names = list(self.by_device.get(device, {}))
+            for i in names:
+                self._remove(i)
+            if names:
+                self.generation += 1
+            return names
+
+    def _remove(self, name: str) -> DataPointInfo | None:
+        info = self.points.pop(name, None)
+        if info is None:
+            return None
+
+        d = self.by_device.get(info.device)
+        if d is not None:
+            d.pop(name, None)
+            if not d:
+                del self.by_device[info.device]
+
+        for field, index in self._by_field.items():
+            key = getattr(info, field)
+            s = index.get(key)
+            if s is not None:
+                s.discard(name)
+                if not s:
+                    del index[key]
+
+        # Unlink the name, pruning empty branches
+        path = [self._root]
+        parts = name.split(".")
+        for part in parts:
+            nxt = path[-1].children.get(part)
+            if nxt is None:
+                return info
+            path.append(nxt)
+        path[-1].point = None
+        for i in range(len(parts), 0, -1):
+            node = path[i]
+            if node.children or node.point is not None:
+                break
+            del path[i - 1].children[parts[i - 1]]
+
+        return info
+
+    def _walk(self, node: _TrieNode) -> Iterator[str]:
+        if node.point is not None:
+            yield node.point
+        for i in node.children.values():
+            yield from self._walk(i)
+
+    def with_prefix(self, prefix: str) -> list[str]:
+        """Names under a dotted prefix, "dev" gives "dev.x", "dev.sub.y"..."""
+        with self._lock:
+            node = self._root
+            if prefix:
+                for part in prefix.split("."):
+                    x = node.children.get(part)
+                    if x is None:
+                        return []
+                    node = x
+            return list(self._walk(node))
+
+    def query(
+        self,
+        *,
+        device: str | None = None,
+        prefix: str | None = None,
+        type: DataPointType | None = None,
+        subtype: str | None = None,
+        unit: str | None = None,
+        writable: bool | None = None,
+        dashboard: bool | None = None,
+    ) -> list[DataPointInfo]:
+        """Points matching every given filter, smallest index first"""
+        with self._lock:
+            candidates: list[set[str] | dict[str, Any]] = []
+            if device is not None:
+                candidates.append(self.by_device.get(device, {}))
+            for field, value in (
+                ("type", type),
+                ("subtype", subtype),
+                ("unit", unit),
+            ):
+                if value is not None:
+                    candidates.append(self._by_field[field].get(value, set()))
+            if prefix is not None:
+                candidates.append(set(self.with_prefix(prefix)))
+
+            if candidates:
+                candidates.sort(key=len)
+                names = set(candidates[0])
+                for i in candidates[1:]:
+                    names.intersection_update(i)
+                infos = [self.points[i] for i in names]
+            else:
+                infos = list(self.points.values())
+
+        return [
+            i
+            for i in infos
+            if (writable is None or i.writable == writable)
+            and (dashboard is None or i.dashboard == dashboard)
+        ]
+
+    def snapshot(self) -> Mapping[str, DataPointInfo]:
+        """Read only copy of points, only rebuilt after changes"""
+        with self._lock:
+            if self._snapshot_generation != self.generation:
+                self._snapshot = MappingProxyType(dict(self.points))
+                self._snapshot_generation = self.generation
+            return self._snapshot
@@ -1,20 +1,99 @@
 from __future__ import annotations
 
-import copy
+import ast
+import bisect
+import heapq
 import logging
+import operator
+import re
+import threading
 import time
-from collections.abc import Callable, Mapping
-from typing import TYPE_CHECKING, Any
+from array import array
+from collections import deque
+from collections.abc import (
+    Callable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Sequence,
+)
+from typing import TYPE_CHECKING, Any, Literal
 
+from ..util import FrozenDict, FrozenList, freeze, frozen_changed
+from .datapoint_log import DatapointLog
 from .host import DeviceHostContainer, Host
+from .registry import DataPointInfo, DataPointType
+from .snapshot import SnapshotFile, load_snapshot
 
 if TYPE_CHECKING:
-    pass
+    from ..datapoints import DataPoint
+    from ..device import Device
 
 _logger = logging.getLogger(__name__)
 
+_FROZEN_TYPES = (FrozenDict, FrozenList)
+
+
+_COMPARISONS: dict[str, Callable[[Any, Any], Any]] = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+_simple_comparison = re.compile(r"^\s*value\s*(<=|>=|==|!=|<|>)\s*(.+?)\s*$")
+
+
+class AlarmCondition:
+    """An alarm expression like "value > 90".
+
+    Comparisons of the value against a literal are parsed
+    into an operator and operand once. Anything else
+    is compiled and falls back to eval().
+    """
+
+    __slots__ = ("expression", "op", "operand", "code")
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.op: Callable[[Any, Any], Any] | None = None
+        self.operand: Any = None
+        self.code = None
+
+        m = _simple_comparison.match(expression)
+        if m:
+            try:
+                self.operand = ast.literal_eval(m.group(2))
+                self.op = _COMPARISONS[m.group(1)]
+            except (ValueError, SyntaxError):
+                pass
+
+        if self.op is None:
+            self.code = compile(expression, "<alarm>", "eval")
+
+    def __call__(self, value: Any) -> bool:
+        """Errors, like comparing None to a number, count as False"""
+        try:
+            if self.op is not None:
+                return bool(self.op(value, self.operand))
+            return bool(eval(self.code, {"value": value}))  # type: ignore[arg-type]
+        except Exception:
+            return False
+
+
+AlarmState = Literal["normal", "pending", "active", "cleared"]
+
 
 class SimpleAlert:
+    """One alarm, see Device.set_alarm.
+
+    state is "normal", "pending" while waiting out the trip delay,
+    "active" while tripped, or "cleared" once released but
+    not yet acknowledged.
+    """
+
     def __init__(
         self,
         host: SimpleHost,
@@ -22,18 +101,513 @@ class SimpleAlert:
         datapoint: str,
         message: str,
         condition: str,
+        *,
+        priority: str = "info",
+        trip_delay: float = 0,
+        auto_ack: bool = False,
+        release_condition: str | None = None,
     ):
         self.name = name
         self.datapoint = datapoint
         self.message = message
         self.condition = condition
         self.host = host
-        self.ctx = {}
-        self.f = compile(condition, "<string>", "eval")
+        self.priority = priority
+        self.trip_delay = trip_delay
+        self.auto_ack = auto_ack
+
+        self.trip_condition = AlarmCondition(condition)
+        self.release_condition = (
+            AlarmCondition(release_condition) if release_condition else None
+        )
+
+        self.state: AlarmState = "normal"
+        self.acknowledged = False
+        # time.monotonic() when the trip condition became true
+        self.pending_since = 0.0
+        self.removed = False
+
+    def check(self) -> bool:
+        """Evaluate the trip condition against the current value"""
+        return self.trip_condition(self.host.datapoint_vta[self.datapoint][0])
+
+    def update(self, value: Any, now: float) -> bool:
+        """Advance the state machine, return True if the state changed.
+        Must be called under the host's alarm lock."""
+        old = self.state
+
+        if old == "active":
+            if self.release_condition is not None:
+                released = self.release_condition(value)
+            else:
+                released = not self.trip_condition(value)
+            if released:
+                if self.acknowledged or self.auto_ack:
+                    self.state = "normal"
+                else:
+                    self.state = "cleared"
+
+        elif self.trip_condition(value):
+            if old != "pending":
+                self.pending_since = now
+                self.state = "pending"
+            if now >= self.pending_since + self.trip_delay:
+                self.state = "active"
+                self.acknowledged = False
+
+        elif old == "pending":
+            self.state = "normal"
+
+        return self.state != old
+
+    def acknowledge(self):
+        with self.host._alarm_lock:
+            old = self.state
+            self.acknowledged = True
+            if old == "cleared":
+                self.state = "normal"
+        if self.state != old:
+            self.host._notify_alarm_changed(self, old)
+
+
+class DataPointSlot:
+    """Storage for one data point, pre-resolved at registration.
+    Devices get this back as their opaque handle, so setting a value
+    does not need any name lookups.
+    """
+
+    __slots__ = ("name", "vta", "handler", "coalesce", "history")
+
+    def __init__(
+        self,
+        name: str,
+        vta: tuple[Any, float, Any],
+        handler: Callable[[Any, float, Any], Any] | None = None,
+        coalesce: bool = True,
+    ):
+        self.name = name
+        self.vta = vta
+        self.handler = handler
+        # With queued dispatch, whether pending values may be dropped
+        # in favor of newer ones
+        self.coalesce = coalesce
+        self.history: HistoryRing | None = None
+
+    def update(
+        self,
+        value: Any,
+        timestamp: float,
+        annotation: Any,
+        force_push_on_repeat: bool = False,
+    ) -> bool:
+        """Store the value and return True if handlers need to run.
+        Must be called under the host's datapoint lock."""
+        old = self.vta
+        if type(value) in _FROZEN_TYPES:
+            changed = frozen_changed(old[0], value)
+        else:
+            changed = old[0] != value
+        changed = changed or force_push_on_repeat or old[1] == 0
+        self.vta = (value, timestamp, annotation)
+        return changed
+
+    def release(self) -> None:
+        """Called under the host's datapoint lock when the
+        data point is removed from the host"""
+
+
+class NumericColumns:
+    """Columnar storage for numeric data points.
+
+    Values and timestamps live in flat arrays of doubles indexed by
+    row number, so updating a point allocates nothing.  Annotations
+    are rare, so they go in a sparse side table, as do points that
+    are still None because they had no default.
+    """
+
+    def __init__(self):
+        self.values = array("d")
+        self.timestamps = array("d")
+        self.annotations: dict[int, Any] = {}
+        self.unset: set[int] = set()
+        self._free: list[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.values) - len(self._free)
+
+    def allocate(self, default: float | None) -> int:
+        with self._lock:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = len(self.values)
+                self.values.append(0.0)
+                self.timestamps.append(0.0)
+
+            self.timestamps[row] = 0
+            self.annotations.pop(row, None)
+            if default is None:
+                self.values[row] = 0.0
+                self.unset.add(row)
+            else:
+                self.values[row] = default
+                self.unset.discard(row)
+            return row
+
+    def release(self, row: int) -> None:
+        with self._lock:
+            self.annotations.pop(row, None)
+            self.unset.discard(row)
+            self._free.append(row)
+
+    def get(self, row: int) -> tuple[float | None, float, Any]:
+        return (
+            None if row in self.unset else self.values[row],
+            self.timestamps[row],
+            self.annotations.get(row),
+        )
+
+
+class NumericColumnSlot(DataPointSlot):
+    """A numeric data point that keeps it's value in a NumericColumns
+    row instead of a tuple. vta is rebuilt on read."""
+
+    __slots__ = ("columns", "row")
+
+    def __init__(
+        self,
+        name: str,
+        columns: NumericColumns,
+        default: float | None,
+        handler: Callable[[Any, float, Any], Any] | None = None,
+        coalesce: bool = True,
+    ):
+        self.columns = columns
+        self.row = columns.allocate(default)
+        self.name = name
+        self.handler = handler
+        self.coalesce = coalesce
+        self.history: HistoryRing | None = None
+
+    @property
+    def vta(self) -> tuple[float | None, float, Any]:  # type: ignore[override]
+        return self.columns.get(self.row)
+
+    @vta.setter
+    def vta(self, value: tuple[Any, float, Any]) -> None:
+        self.update(*value, force_push_on_repeat=True)
+
+    def update(
+        self,
+        value: Any,
+        timestamp: float,
+        annotation: Any,
+        force_push_on_repeat: bool = False,
+    ) -> bool:
+        if value is not None and type(value) is not float:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                # The array can only hold numbers, and raising here
+                # would break the device's set path
+                _logger.warning(
+                    f"Ignoring non-numeric value for {self.name}: {value!r}"
+                )
+                return False
+
+        c = self.columns
+        row = self.row
+        changed = (
+            force_push_on_repeat
+            or c.timestamps[row] == 0
+            or row in c.unset
+            or c.values[row] != value
+        )
+        if value is None:
+            c.unset.add(row)
+        else:
+            c.values[row] = value
+            if row in c.unset:
+                c.unset.discard(row)
+        c.timestamps[row] = timestamp
+        if annotation is None:
+            if row in c.annotations:
+                del c.annotations[row]
+        else:
+            c.annotations[row] = annotation
+        return changed
+
+    def release(self) -> None:
+        # Anyone still holding this handle gets a private row,
+        # so they can never write into a row that has been reused.
+        columns, row = self.columns, self.row
+        self.columns = NumericColumns()
+        self.row = self.columns.allocate(None)
+        self.update(*columns.get(row), force_push_on_repeat=True)
+        columns.release(row)
+
+
+class _RingTimestamps(Sequence[float]):
+    """Timestamps of a HistoryRing in logical order, for bisect"""
+
+    def __init__(self, ring: HistoryRing):
+        self.ring = ring
+
+    def __len__(self) -> int:
+        return self.ring.count
+
+    def __getitem__(self, i: int) -> float:  # type: ignore[override]
+        r = self.ring
+        return r.timestamps[(r.start + i) % r.capacity]
+
+
+class HistoryRing:
+    """Fixed size history of one numeric point, preallocated
+    so memory is 16 bytes per sample no matter how long it runs.
+    Samples are assumed to arrive in timestamp order.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self.values = array("d", bytes(8 * capacity))
+        self.timestamps = array("d", bytes(8 * capacity))
+        # Index of the oldest sample
+        self.start = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, value: float, timestamp: float):
+        with self._lock:
+            if self.count < self.capacity:
+                i = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                i = self.start
+                self.start = (self.start + 1) % self.capacity
+            self.values[i] = value
+            self.timestamps[i] = timestamp
+
+    def _range(self, a: array[float], lo: int, hi: int) -> array[float]:
+        """Logical slice [lo, hi) as one contiguous array"""
+        n = hi - lo
+        lo = (self.start + lo) % self.capacity
+        if lo + n <= self.capacity:
+            return a[lo : lo + n]
+        return a[lo:] + a[: lo + n - self.capacity]
+
+    def get_history(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        max_points: int = 500,
+    ) -> list[tuple[float, float, float, float]]:
+        """Return (timestamp, min, max, mean) for each bucket.
+
+        Samples between since and until are split into at most
+        max_points buckets with equal numbers of samples. The timestamp
+        is that of the first sample in the bucket. If there are few
+        enough samples, each is it's own bucket.
+        """
+        with self._lock:
+            ts = _RingTimestamps(self)
+            lo = 0 if since is None else bisect.bisect_left(ts, since)
+            hi = self.count if until is None else bisect.bisect_right(ts, until)
+            if hi <= lo:
+                return []
+            values = self._range(self.values, lo, hi)
+            timestamps = self._range(self.timestamps, lo, hi)
+
+        n = len(values)
+        if n <= max_points:
+            return [(t, v, v, v) for t, v in zip(timestamps, values)]
+
+        # Slices of an array are C level copies and min, max and sum
+        # run over them in C, so this is one pass per bucket, not per sample
+        r: list[tuple[float, float, float, float]] = []
+        for b in range(max_points):
+            i = b * n // max_points
+            j = (b + 1) * n // max_points
+            chunk = values[i:j]
+            r.append(
+                (timestamps[i], min(chunk), max(chunk), sum(chunk) / (j - i))
+            )
+        return r
+
+
+class _DispatchWorker:
+    """One worker thread and it's queue. Points are sharded across
+    workers by name, so each point's handler runs in order."""
+
+    def __init__(self, dispatcher: HandlerDispatcher, index: int):
+        self.dispatcher = dispatcher
+        # Either a coalescable slot, whose value is in latest,
+        # or a full (slot, value, timestamp, annotation) entry
+        self.queue: deque[
+            DataPointSlot | tuple[DataPointSlot, Any, float, Any]
+        ] = deque()
+        self.latest: dict[DataPointSlot, tuple[Any, float, Any]] = {}
+        self.busy = False
+        self.thread = threading.Thread(
+            target=self.run, name=f"SimpleHostHandlers{index}", daemon=True
+        )
+
+    def run(self):
+        d = self.dispatcher
+        while True:
+            with d.lock:
+                while not self.queue:
+                    self.busy = False
+                    d.cond.notify_all()
+                    if d.stopped:
+                        return
+                    d.cond.wait()
+                self.busy = True
+                item = self.queue.popleft()
+                d.depth -= 1
+                d.cond.notify_all()
+                if isinstance(item, tuple):
+                    slot, value, timestamp, annotation = item
+                else:
+                    slot = item
+                    value, timestamp, annotation = self.latest.pop(slot)
+
+            x = slot.handler
+            if x is None:
+                continue
+            try:
+                x(value, timestamp, annotation)
+            except Exception:
+                _logger.exception(f"Error in handler for {slot.name}")
+                with d.lock:
+                    d.stats["errors"] += 1
+            with d.lock:
+                d.stats["dispatched"] += 1
+
+
+class HandlerDispatcher:
+    """Runs data point handlers on worker threads, so slow handlers
+    do not stall whoever is setting the value.
+
+    While a value is still waiting, a newer value for the same point
+    replaces it, unless the point's slot has coalesce=False.
+    When maxsize values are waiting, producers block until there is room.
+    """
+
+    def __init__(self, workers: int = 2, maxsize: int = 10000):
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.maxsize = maxsize
+        self.depth = 0
+        self.stopped = False
+        self.stats = {
+            "dispatched": 0,
+            "coalesced": 0,
+            "blocked": 0,
+            "blocked_time": 0.0,
+            "max_depth": 0,
+            "errors": 0,
+        }
+        self.workers = [
+            _DispatchWorker(self, i) for i in range(max(1, workers))
+        ]
+        self._worker_threads = {w.thread for w in self.workers}
+        for w in self.workers:
+            w.thread.start()
+
+    def submit(
+        self, slot: DataPointSlot, value: Any, timestamp: float, annotation: Any
+    ):
+        w = self.workers[hash(slot.name) % len(self.workers)]
+        with self.lock:
+            if slot.coalesce and slot in w.latest:
+                w.latest[slot] = (value, timestamp, annotation)
+                self.stats["coalesced"] += 1
+                return
+
+            # A handler setting another point would deadlock waiting
+            # on itself, so workers may overfill the queue.
+            if (
+                self.depth >= self.maxsize
+                and threading.current_thread() not in self._worker_threads
+            ):
+                self.stats["blocked"] += 1
+                t = time.monotonic()
+                while self.depth >= self.maxsize and not self.stopped:
+                    self.cond.wait()
+                self.stats["blocked_time"] += time.monotonic() - t
+
+            if slot.coalesce:
+                w.latest[slot] = (value, timestamp, annotation)
+                w.queue.append(slot)
+            else:
+                w.queue.append((slot, value, timestamp, annotation))
+
+            self.depth += 1
+            if self.depth > self.stats["max_depth"]:
+                self.stats["max_depth"] = self.depth
+            self.cond.notify_all()
+
+    def get_stats(self) -> dict[str, float]:
+        with self.lock:
+            x: dict[str, float] = dict(self.stats)
+            x["depth"] = self.depth
+            return x
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait till every queued handler has run.
+        Returns False on timeout."""
+        with self.lock:
+            return self.cond.wait_for(
+                lambda: (
+                    self.depth == 0 and not any(w.busy for w in self.workers)
+                ),
+                timeout,
+            )
+
+    def stop(self):
+        """Let the workers finish what is queued, then exit"""
+        with self.lock:
+            self.stopped = True
+            self.cond.notify_all()
+
+
+class _SlotFieldView(MutableMapping[str, Any]):
+    """Dict-like view of one field of every slot by full name,
+    so datapoint_vta and datapoint_handlers keep working as before."""
+
+    def __init__(
+        self,
+        slots: dict[str, DataPointSlot],
+        field: str,
+        lock: threading.Lock,
+    ):
+        self._slots = slots
+        self._field = field
+        self._lock = lock
 
-    def check(self):
-        self.ctx["value"] = self.host.datapoint_vta[self.datapoint][0]
-        return eval(self.f, self.ctx)
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self._slots[key], self._field)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = DataPointSlot(key, (None, 0, None))
+            self._slots[key] = slot
+        setattr(slot, self._field, value)
+
+    def __delitem__(self, key: str) -> None:
+        slot = self._slots.pop(key)
+        with self._lock:
+            slot.release()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def __len__(self) -> int:
+        return len(self._slots)
 
 
 class SimpleHostDeviceContainer(DeviceHostContainer):
@@ -56,54 +630,253 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
 
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        numeric_storage: Literal["tuple", "array"] = "tuple",
+        handler_dispatch: Literal["inline", "queue"] = "inline",
+        dispatch_workers: int = 2,
+        dispatch_queue_size: int = 10000,
+        history_size: int = 0,
+        snapshot_file: str | None = None,
+        snapshot_interval: float = 10,
+        datapoint_log: str | None = None,
+    ):
+        """
+        Args:
+            numeric_storage: "tuple" keeps every value as a
+                (value, timestamp, annotation) tuple.
+                "array" keeps numeric points in NumericColumns instead,
+                which saves memory and allocation with very many points.
+                Values read back are then always floats.
+
+            handler_dispatch: "inline" calls data point handlers in
+                the thread that set the value. "queue" hands them to
+                a HandlerDispatcher with dispatch_workers threads and
+                at most dispatch_queue_size values waiting.
+                Triggers and bytestreams are never coalesced, other
+                points can opt out by registering with coalesce=False.
+
+            history_size: If nonzero, every numeric point keeps a
+                HistoryRing of this many samples, see get_history().
+                Points can override it with history_size= when
+                registering.
+
+            snapshot_file: If set, the last value of every point is
+                saved here every snapshot_interval seconds,
+                and points registered later start with the saved value
+                instead of their default. Bytestreams are not saved.
+
+            datapoint_log: Directory for a DatapointLog that records
+                every change, read it back with DatapointLogReader.
+        """
         super().__init__(SimpleHostDeviceContainer)
 
-        self.datapoint_vta: dict[str, tuple[Any, float, Any]] = {}
+        self.history_size = history_size
+
+        self.dispatcher: HandlerDispatcher | None = None
+        if handler_dispatch == "queue":
+            self.dispatcher = HandlerDispatcher(
+                dispatch_workers, dispatch_queue_size
+            )
+        elif handler_dispatch != "inline":
+            raise ValueError(f"Unknown handler dispatch {handler_dispatch}")
+
+        self.numeric_columns: NumericColumns | None = None
+        """Storage for numeric points if numeric_storage is "array" """
+        if numeric_storage == "array":
+            self.numeric_columns = NumericColumns()
+        elif numeric_storage != "tuple":
+            raise ValueError(f"Unknown numeric storage {numeric_storage}")
+
+        # Makes the compare-and-store of a value atomic,
+        # handlers are never called under it.
+        self._datapoint_lock = threading.Lock()
+
+        self.datapoint_slots: dict[str, DataPointSlot] = {}
+        """Every registered data point, with the format
+        devicename.datapointname"""
+
+        self.datapoint_vta: MutableMapping[str, tuple[Any, float, Any]] = (
+            _SlotFieldView(self.datapoint_slots, "vta", self._datapoint_lock)
+        )
         """This is where the data point values are stored,
         with the format devicename.datapointname"""
 
         # Functions devices use that are called when a data point changes
-        self.datapoint_handlers: dict[
+        self.datapoint_handlers: MutableMapping[
             str, Callable[[Any, float, Any], Any] | None
-        ] = {}
+        ] = _SlotFieldView(
+            self.datapoint_slots, "handler", self._datapoint_lock
+        )
+
+        # Alarms indexed by full data point name, copy on write
+        # so a data point update only costs a dict lookup.
+        self.alarms_by_datapoint: dict[str, tuple[SimpleAlert, ...]] = {}
+        self._alarm_lock = threading.Lock()
+        # Heap of (deadline, seq, alert) for alarms waiting out a trip delay
+        self._alarm_deadlines: list[tuple[float, int, SimpleAlert]] = []
+        self._alarm_seq = 0
+        self._alarm_wake = threading.Condition(self._alarm_lock)
+        self._alarm_thread: threading.Thread | None = None
+
+        # A subclass that overrides set_data_point to watch values
+        # must still see all of them, so don't take shortcuts around it.
+        self._watches_set_data_point = (
+            type(self).set_data_point is not SimpleHost.set_data_point
+        )
+
+        # Saved values not claimed by a registered point,
+        # and names that changed since the last save.
+        self._restored: dict[str, Sequence[Any]] = {}
+        self._dirty: set[str] | None = None
+        self._snapshot: SnapshotFile | None = None
+        self._snapshot_lock = threading.Lock()
+        if snapshot_file:
+            self._restored = load_snapshot(snapshot_file)
+            self._snapshot = SnapshotFile(snapshot_file, len(self._restored))
+            self._dirty = set()
+            threading.Thread(
+                target=self._snapshot_loop,
+                args=(snapshot_interval,),
+                name="SimpleHostSnapshot",
+                daemon=True,
+            ).start()
+
+        self.datapoint_log: DatapointLog | None = None
+        if datapoint_log:
+            self.datapoint_log = DatapointLog(datapoint_log)
+
+    def on_after_close(self):
+        self.save_snapshot()
+        if self.datapoint_log is not None:
+            self.datapoint_log.close()
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+
+    def _snapshot_loop(self, interval: float):
+        while not self.closing:
+            time.sleep(interval)
+            try:
+                self.save_snapshot()
+            except Exception:
+                _logger.exception("Error saving snapshot")
+
+    def save_snapshot(self):
+        """Write every point that changed since the last save.
+        Done periodically if snapshot_file is set."""
+        snap = self._snapshot
+        if snap is None:
+            return
+
+        with self._snapshot_lock:
+            with self._datapoint_lock:
+                dirty = self._dirty or set()
+                self._dirty = set()
+
+            entries: dict[str, Sequence[Any]] = {}
+            for name in dirty:
+                slot = self.datapoint_slots.get(name)
+                vta = slot.vta if slot else self._restored.get(name)
+                if vta is not None and not isinstance(vta[0], bytes):
+                    entries[name] = vta
+
+            live = len(self.datapoint_slots) + len(self._restored)
+            if snap.records + len(entries) > 2 * live + 1000:
+                everything = dict(self._restored)
+                for name, slot in list(self.datapoint_slots.items()):
+                    vta = slot.vta
+                    if vta[1] and not isinstance(vta[0], bytes):
+                        everything[name] = vta
+                snap.rewrite(everything)
+            else:
+                snap.append(entries)
+
+    def _restore_slot(self, slot: DataPointSlot):
+        vta = self._restored.pop(slot.name, None)
+        if vta is not None:
+            value = vta[0]
+            if isinstance(value, Mapping | list | tuple):
+                value = freeze(value)
+            with self._datapoint_lock:
+                slot.update(value, vta[1], vta[2], True)
+
+    def _record_metadata(
+        self, device: str, name: str, type: DataPointType, **kwargs: Any
+    ):
+        full_name = self.resolve_datapoint_name(device, name)
+        self.datapoint_registry.add(
+            DataPointInfo(full_name, device, name, type, **kwargs)
+        )
+
+    def _register_data_point(
+        self,
+        device: str,
+        name: str,
+        default: Any,
+        handler: Callable[[Any, float, Any], Any] | None,
+        coalesce: bool = True,
+    ) -> DataPointSlot:
+        name = self.resolve_datapoint_name(device, name)
+        old = self.datapoint_slots.get(name)
+        if old is not None:
+            with self._datapoint_lock:
+                old.release()
+        slot = DataPointSlot(name, (default, 0, None), handler, coalesce)
+        if self._restored:
+            self._restore_slot(slot)
+        self.datapoint_slots[name] = slot
+        return slot
 
     def string_data_point(
         self,
         device: str,
         name: str,
         *,
-        description: str = "",  # pylint: disable=unused-argument
-        unit: str = "",  # pylint: disable=unused-argument
+        description: str = "",
+        unit: str = "",
         handler: Callable[[str, float, Any], Any] | None = None,
         default: str | None = None,
-        interval: float = 0,  # pylint: disable=unused-argument
-        writable: bool = True,  # pylint: disable=unused-argument
-        subtype: str = "",  # pylint: disable=unused-argument
-        dashboard: bool = True,  # pylint: disable=unused-argument
+        interval: float = 0,
+        writable: bool = True,
+        subtype: str = "",
+        dashboard: bool = True,
         on_request: Callable[[], Any] | None = None,
-        **kwargs: Any,  # pylint: disable=unused-argument
-    ) -> None:
-        name = self.resolve_datapoint_name(device, name)
-        self.datapoint_vta[name] = (default, 0, None)
-        self.datapoint_handlers[name] = handler
+        coalesce: bool = True,
+        **kwargs: Any,
+    ) -> DataPointSlot:
+        self._record_metadata(
+            device,
+            name,
+            "string",
+            description=description,
+            unit=unit,
+            interval=interval,
+            writable=writable,
+            subtype=subtype,
+            dashboard=dashboard,
+            extra=kwargs,
+        )
+        return self._register_data_point(
+            device, name, default, handler, coalesce
+        )
 
     def object_data_point(
         self,
         device: str,
         name: str,
         *,
-        description: str = "",  # pylint: disable=unused-argument
-        unit: str = "",  # pylint: disable=unused-argument
+        description: str = "",
+        unit: str = "",
         handler: Callable[[Mapping[str, Any], float, Any], Any] | None = None,
-        interval: float = 0,  # pylint: disable=unused-argument
-        writable: bool = True,  # pylint: disable=unused-argument
-        subtype: str = "",  # pylint: disable=unused-argument
-        dashboard: bool = True,  # pylint: disable=unused-argument
+        interval: float = 0,
+        writable: bool = True,
+        subtype: str = "",
+        dashboard: bool = True,
         default: Mapping[str, Any] | None = None,
         on_request: Callable[[], Any] | None = None,
-        **kwargs: Any,  # pylint: disable=unused-argument
-    ):
+        coalesce: bool = True,
+        **kwargs: Any,
+    ) -> DataPointSlot:
         """Register a new object data point with the given properties.   Here "object"
         means a JSON-like object.
 
@@ -130,10 +903,21 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
 
             dashboard: Whether to show this data point in overview displays.
         """
-        name = self.resolve_datapoint_name(device, name)
-        self.datapoint_vta[name] = (copy.deepcopy(default), 0, None)
-
-        self.datapoint_handlers[name] = handler
+        self._record_metadata(
+            device,
+            name,
+            "object",
+            description=description,
+            unit=unit,
+            interval=interval,
+            writable=writable,
+            subtype=subtype,
+            dashboard=dashboard,
+            extra=kwargs,
+        )
+        return self._register_data_point(
+            device, name, freeze(default), handler, coalesce
+        )
 
     def numeric_data_point(
         self,
@@ -142,36 +926,93 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
         *,
         min: float | None = None,
         max: float | None = None,
-        hi: float | None = None,  # pylint: disable=unused-argument
-        lo: float | None = None,  # pylint: disable=unused-argument
+        hi: float | None = None,
+        lo: float | None = None,
         default: float | None = None,
-        description: str = "",  # pylint: disable=unused-argument
-        unit: str = "",  # pylint: disable=unused-argument
+        description: str = "",
+        unit: str = "",
         handler: Callable[[float, float, Any], Any] | None = None,
-        interval: float = 0,  # pylint: disable=unused-argument
-        subtype: str = "",  # pylint: disable=unused-argument
-        writable: bool = True,  # pylint: disable=unused-argument
-        dashboard: bool = True,  # pylint: disable=unused-argument
+        interval: float = 0,
+        subtype: str = "",
+        writable: bool = True,
+        dashboard: bool = True,
         on_request: Callable[[], Any] | None = None,
-        **kwargs: Any,  # pylint: disable=unused-argument
-    ):
-        """Called by the device to get a new data point."""
-        name = self.resolve_datapoint_name(device, name)
-        self.datapoint_vta[name] = (default, 0, None)
-        self.datapoint_handlers[name] = handler
+        coalesce: bool | None = None,
+        history_size: int | None = None,
+        **kwargs: Any,
+    ) -> DataPointSlot:
+        """Called by the device to get a new data point.
+        Triggers default to coalesce=False, every push counts."""
+        self._record_metadata(
+            device,
+            name,
+            "numeric",
+            description=description,
+            unit=unit,
+            interval=interval,
+            writable=writable,
+            subtype=subtype,
+            dashboard=dashboard,
+            min=min,
+            max=max,
+            hi=hi,
+            lo=lo,
+            extra=kwargs,
+        )
+        if coalesce is None:
+            coalesce = subtype != "trigger"
+        if history_size is None:
+            history_size = self.history_size
+
+        if self.numeric_columns is None:
+            slot = self._register_data_point(
+                device, name, default, handler, coalesce
+            )
+        else:
+            name = self.resolve_datapoint_name(device, name)
+            old = self.datapoint_slots.get(name)
+            if old is not None:
+                with self._datapoint_lock:
+                    old.release()
+            slot = NumericColumnSlot(
+                name, self.numeric_columns, default, handler, coalesce
+            )
+            if self._restored:
+                self._restore_slot(slot)
+            self.datapoint_slots[name] = slot
+
+        if history_size:
+            slot.history = HistoryRing(history_size)
+        return slot
+
+    def get_history(
+        self,
+        name: str,
+        since: float | None = None,
+        until: float | None = None,
+        max_points: int = 500,
+    ) -> list[tuple[float, float, float, float]]:
+        """Downsampled history of a numeric point by full name,
+        see HistoryRing.get_history().
+        Raises KeyError if the point keeps no history."""
+        ring = self.datapoint_slots[name].history
+        if ring is None:
+            raise KeyError(f"{name} has no history")
+        return ring.get_history(since, until, max_points)
 
     def bytestream_data_point(
         self,
         device: str,
         name: str,
         *,
-        description: str = "",  # pylint: disable=unused-argument
-        unit: str = "",  # pylint: disable=unused-argument
+        description: str = "",
+        unit: str = "",
         handler: Callable[[bytes, float, Any], Any] | None = None,
-        writable: bool = True,  # pylint: disable=unused-argument
-        dashboard: bool = True,  # pylint: disable=unused-argument
-        **kwargs: Any,  # pylint: disable=unused-argument
-    ):
+        writable: bool = True,
+        dashboard: bool = True,
+        coalesce: bool = False,
+        **kwargs: Any,
+    ) -> DataPointSlot:
         """register a new bytestream data point with the
         given properties. handler will be called when it changes.
         only meant to be called from within __init__.
@@ -182,9 +1023,17 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
         Despite the name, buffers of bytes may not be broken up or combined, this is buffer oriented,
 
         """
-        name = self.resolve_datapoint_name(device, name)
-        self.datapoint_vta[name] = (b"", 0, None)
-        self.datapoint_handlers[name] = handler
+        self._record_metadata(
+            device,
+            name,
+            "bytes",
+            description=description,
+            unit=unit,
+            writable=writable,
+            dashboard=dashboard,
+            extra=kwargs,
+        )
+        return self._register_data_point(device, name, b"", handler, coalesce)
 
     def set_string(
         self,
@@ -276,22 +1125,273 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
         if timestamp is None:
             timestamp = time.time()
 
-        if isinstance(value, Mapping):
-            value = copy.deepcopy(value)
+        if isinstance(value, Mapping | list):
+            value = freeze(value)
 
-        changed = force_push_on_repeat
+        self._set_slot(
+            self.datapoint_slots[name],
+            value,
+            timestamp,
+            annotation,
+            force_push_on_repeat,
+        )
 
-        if self.datapoint_vta[name][0] != value:
-            changed = True
+    def set_data_point_by_handle(
+        self,
+        handle: DataPointSlot,
+        value: Any,
+        timestamp: float | None = None,
+        annotation: Any | None = None,
+        force_push_on_repeat: bool = False,
+    ):
+        """Same as set_data_point, but with the slot returned at
+        registration. The value is already coerced and owned by us."""
+        if self._watches_set_data_point:
+            self.set_data_point(
+                handle.name, value, timestamp, annotation, force_push_on_repeat
+            )
+            return
 
-        if self.datapoint_vta[name][1] == 0:
-            changed = True
+        if timestamp is None:
+            timestamp = time.time()
 
-        self.datapoint_vta[name] = (value, timestamp, annotation)
-        if changed:
-            x = self.datapoint_handlers.get(name)
+        self._set_slot(
+            handle, value, timestamp, annotation, force_push_on_repeat
+        )
+
+    def get_data_point_by_handle(
+        self, handle: DataPointSlot
+    ) -> tuple[Any, float, Any]:
+        return handle.vta
+
+    def set_data_points(
+        self,
+        device: str,
+        values: Sequence[tuple[DataPoint[Any], Any, float, Any]],
+    ):
+        """Store a whole frame under one lock acquisition,
+        then call the handlers of everything that changed.
+        """
+        if self._watches_set_data_point:
+            for dp, value, timestamp, annotation in values:
+                self.set_data_point(dp.full_name, value, timestamp, annotation)
+            return
+
+        changed: list[tuple[DataPointSlot, Any, float, Any]] = []
+
+        with self._datapoint_lock:
+            for dp, value, timestamp, annotation in values:
+                slot = dp.handle
+                if slot is None:
+                    slot = self.datapoint_slots[dp.full_name]
+                if slot.update(value, timestamp, annotation):
+                    changed.append((slot, value, timestamp, annotation))
+                    if self._dirty is not None:
+                        self._dirty.add(slot.name)
+                    if self.datapoint_log is not None:
+                        self.datapoint_log.append(slot.name, timestamp, value)
+                    if slot.history is not None and value is not None:
+                        slot.history.append(value, timestamp)
+
+        dispatcher = self.dispatcher
+        for slot, value, timestamp, annotation in changed:
+            if dispatcher is not None:
+                if slot.handler is not None:
+                    dispatcher.submit(slot, value, timestamp, annotation)
+                continue
+            x = slot.handler
             if x is not None:
-                x(value, timestamp, annotation)
+                try:
+                    x(value, timestamp, annotation)
+                except Exception:
+                    _logger.exception(f"Error in handler for {slot.name}")
+
+        for slot, value, timestamp, annotation in changed:
+            self.publish_data_point(slot.name, value, timestamp, annotation)
+
+        alarms = self.alarms_by_datapoint
+        if alarms:
+            self._evaluate_alarms(
+                [
+                    (a, value)
+                    for slot, value, _ts, _ann in changed
+                    for a in alarms.get(slot.name, ())
+                ]
+            )
+
+    def _set_slot(
+        self,
+        slot: DataPointSlot,
+        value: Any,
+        timestamp: float,
+        annotation: Any,
+        force_push_on_repeat: bool,
+    ):
+        with self._datapoint_lock:
+            changed = slot.update(
+                value, timestamp, annotation, force_push_on_repeat
+            )
+            if changed:
+                if slot.history is not None and value is not None:
+                    slot.history.append(value, timestamp)
+                if self._dirty is not None:
+                    self._dirty.add(slot.name)
+                if self.datapoint_log is not None:
+                    self.datapoint_log.append(slot.name, timestamp, value)
+
+        if changed:
+            if self.dispatcher is not None:
+                if slot.handler is not None:
+                    self.dispatcher.submit(slot, value, timestamp, annotation)
+            else:
+                x = slot.handler
+                if x is not None:
+                    # Same as set_data_points() and queued dispatch,
+                    # a failing handler doesn't stop subscribers or alarms
+                    try:
+                        x(value, timestamp, annotation)
+                    except Exception:
+                        _logger.exception(f"Error in handler for {slot.name}")
+
+            self.publish_data_point(slot.name, value, timestamp, annotation)
+
+            alarms = self.alarms_by_datapoint.get(slot.name)
+            if alarms:
+                self._evaluate_alarms([(a, value) for a in alarms])
+
+    def set_alarm(
+        self,
+        device: Device,
+        name: str,
+        datapoint: str,
+        expression: str,
+        priority: str = "info",
+        trip_delay: float = 0,
+        auto_ack: bool = False,
+        release_condition: str | None = None,
+        **kw: Any,
+    ):
+        """Alarms are evaluated whenever their data point changes.
+        An alarm with the same name on the same point replaces the old one.
+        """
+        full_name = self.resolve_datapoint_name(device.name, datapoint)
+        alert = SimpleAlert(
+            self,
+            name,
+            full_name,
+            kw.get("message", ""),
+            expression,
+            priority=priority,
+            trip_delay=trip_delay,
+            auto_ack=auto_ack,
+            release_condition=release_condition,
+        )
+
+        container = self.devices.get(device.name)
+        if container is not None:
+            container.alerts = [i for i in container.alerts if i.name != name]
+            container.alerts.append(alert)
+
+        with self._alarm_lock:
+            existing = self.alarms_by_datapoint.get(full_name, ())
+            for i in existing:
+                if i.name == name:
+                    i.removed = True
+            self.alarms_by_datapoint[full_name] = tuple(
+                i for i in existing if not i.removed
+            ) + (alert,)
+
+        slot = self.datapoint_slots.get(full_name)
+        if slot is not None:
+            value, timestamp, _ann = slot.vta
+            if timestamp:
+                self._evaluate_alarms([(alert, value)])
+
+    def _remove_alarms(self, alerts: Sequence[SimpleAlert]):
+        with self._alarm_lock:
+            for i in alerts:
+                i.removed = True
+                x = tuple(
+                    a
+                    for a in self.alarms_by_datapoint.get(i.datapoint, ())
+                    if a is not i
+                )
+                if x:
+                    self.alarms_by_datapoint[i.datapoint] = x
+                else:
+                    self.alarms_by_datapoint.pop(i.datapoint, None)
+
+    def _evaluate_alarms(self, pending: Sequence[tuple[SimpleAlert, Any]]):
+        """Run alarm state machines against new values,
+        under one lock acquisition for the whole batch."""
+        if not pending:
+            return
+
+        changed: list[tuple[SimpleAlert, AlarmState]] = []
+        now = time.monotonic()
+
+        with self._alarm_lock:
+            for alert, value in pending:
+                if alert.removed:
+                    continue
+                old = alert.state
+                if alert.update(value, now):
+                    changed.append((alert, old))
+                    if alert.state == "pending":
+                        self._alarm_seq += 1
+                        heapq.heappush(
+                            self._alarm_deadlines,
+                            (
+                                alert.pending_since + alert.trip_delay,
+                                self._alarm_seq,
+                                alert,
+                            ),
+                        )
+                        self._alarm_wake.notify()
+                        if self._alarm_thread is None:
+                            self._alarm_thread = threading.Thread(
+                                target=self._alarm_timer,
+                                name="SimpleHostAlarms",
+                                daemon=True,
+                            )
+                            self._alarm_thread.start()
+
+        for alert, old in changed:
+            self._notify_alarm_changed(alert, old)
+
+    def _alarm_timer(self):
+        """Trips alarms whose trip delay ran out with no new value"""
+        while not self.closing:
+            with self._alarm_lock:
+                due: list[SimpleAlert] = []
+                now = time.monotonic()
+                while self._alarm_deadlines and (
+                    self._alarm_deadlines[0][0] <= now
+                ):
+                    due.append(heapq.heappop(self._alarm_deadlines)[2])
+
+                if not due:
+                    timeout = 10.0
+                    if self._alarm_deadlines:
+                        timeout = min(self._alarm_deadlines[0][0] - now, 10)
+                    self._alarm_wake.wait(timeout)
+                    continue
+
+            pending: list[tuple[SimpleAlert, Any]] = []
+            for alert in due:
+                slot = self.datapoint_slots.get(alert.datapoint)
+                if slot is not None and alert.state == "pending":
+                    pending.append((alert, slot.vta[0]))
+            self._evaluate_alarms(pending)
+
+    def _notify_alarm_changed(self, alert: SimpleAlert, old: AlarmState):
+        try:
+            self.on_alarm_state_changed(alert, old)
+        except Exception:
+            _logger.exception(f"Error in alarm handler for {alert.name}")
+
+    def on_alarm_state_changed(self, alert: SimpleAlert, old: AlarmState):
+        """Called outside any lock when an alarm changes state"""
 
     def get_config_for_device(
         self, parent_device: DeviceHostContainer | None, full_device_name: str
@@ -350,16 +1450,24 @@ class SimpleHost(Host[SimpleHostDeviceContainer]):
         """
         _logger.debug(f"on_config_changed {device.name}")
 
-    def on_after_device_removed(self, device: DeviceHostContainer):
+    def on_after_device_removed(self, device: SimpleHostDeviceContainer):
+        self._remove_alarms(device.alerts)
+        device.alerts = []
+
         with self:
+            # Every point the device registered, by full name
+            names = self.datapoint_registry.remove_device(device.name)
             dev = device.device
             if dev:
-                for d in dev.datapoints:
-                    i = dev.datapoints[d].full_name
-                    if i in self.datapoint_vta:
-                        del self.datapoint_vta[i]
-                    if i in self.datapoint_handlers:
-                        del self.datapoint_handlers[i]
+                names.extend(i.full_name for i in dev.datapoints.values())
+            for name in names:
+                slot = self.datapoint_slots.pop(name, None)
+                if slot is not None:
+                    with self._datapoint_lock:
+                        # Keep it in case the device comes back
+                        if self._dirty is not None and slot.vta[1]:
+                            self._restored[slot.name] = slot.vta
+                        slot.release()
 
     def on_device_added(self, device: DeviceHostContainer):
         pass
@@ -0,0 +1,92 @@
+"""Compact binary snapshots of data point values,
+so a restarted host can start from the last known values.
+
+The file is a sequence of msgpack maps of
+{full name: [value, timestamp, annotation]}. Each save appends one map
+with just the points that changed, and later maps win when loading.
+Every so often the whole file is rewritten to drop overwritten entries.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+import msgpack
+
+_logger = logging.getLogger(__name__)
+
+
+def _pack(entries: Mapping[str, Sequence[Any]]) -> bytes:
+    try:
+        return msgpack.packb({k: list(v) for k, v in entries.items()})
+    except (TypeError, ValueError, OverflowError):
+        pass
+
+    # Something in there can't be packed, find it and leave it out,
+    # trying without the annotation first.
+    ok: dict[str, list[Any]] = {}
+    for k, (value, timestamp, annotation) in entries.items():
+        for x in ([value, timestamp, annotation], [value, timestamp, None]):
+            try:
+                msgpack.packb(x)
+            except (TypeError, ValueError, OverflowError):
+                continue
+            ok[k] = x
+            break
+        else:
+            _logger.warning(f"Can't snapshot value of {k}")
+    return msgpack.packb(ok)
+
+
+def load_snapshot(path: str) -> dict[str, Sequence[Any]]:
+    """Read a snapshot file. A missing file is empty, and a
+    truncated last write is ignored.
+
+    Values are (value, timestamp, annotation) tuples, left as msgpack
+    made them for speed, so lists inside values come back as tuples.
+    """
+    r: dict[str, Any] = {}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return r
+
+    unpacker = msgpack.Unpacker(use_list=False, strict_map_key=False)
+    unpacker.feed(data)
+    try:
+        for frame in unpacker:
+            r.update(frame)
+    except (ValueError, msgpack.UnpackException):
+        _logger.warning(f"Snapshot {path} is damaged, using what was readable")
+    return r
+
+
+class SnapshotFile:
+    """Appends changed values to a snapshot file and compacts it"""
+
+    def __init__(self, path: str, records: int = 0):
+        self.path = path
+        # Entries in the file, including overwritten ones
+        self.records = records
+
+    def append(self, entries: Mapping[str, Sequence[Any]]):
+        if not entries:
+            return
+        b = _pack(entries)
+        with open(self.path, "ab") as f:
+            f.write(b)
+        self.records += len(entries)
+
+    def rewrite(self, entries: Mapping[str, Sequence[Any]]):
+        """Atomically replace the file with just these entries"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_pack(entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.records = len(entries)
@@ -0,0 +1,166 @@
+"""Subscription bus for data point values.
+
+Patterns are matched against resolved names segment by segment,
+split on ".". A segment may be a literal, "*" for any one segment,
+a glob like "temp*", and a final "**" matches everything below,
+so "mydevice.**" is a prefix subscription.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+_logger = logging.getLogger(__name__)
+
+SubscriptionCallback = Callable[[str, Any, float, Any], Any]
+
+
+class Subscription:
+    """Returned by Host.subscribe(). Filtering state is per
+    data point, so one subscription can cover many points."""
+
+    def __init__(
+        self,
+        bus: SubscriptionBus,
+        pattern: str,
+        callback: SubscriptionCallback,
+        min_interval: float = 0,
+        deadband: float = 0,
+    ):
+        self.bus = bus
+        self.pattern = pattern
+        self.callback = callback
+        self.min_interval = min_interval
+        self.deadband = deadband
+
+        # name -> (last delivered value, time.monotonic() of delivery)
+        self._last: dict[str, tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def unsubscribe(self):
+        self.bus.remove(self)
+
+    def deliver(self, name: str, value: Any, timestamp: float, annotation: Any):
+        if self.min_interval or self.deadband:
+            now = time.monotonic()
+            with self._lock:
+                last = self._last.get(name)
+                if last is not None:
+                    if now - last[1] < self.min_interval:
+                        return
+                    if self.deadband:
+                        try:
+                            if abs(value - last[0]) < self.deadband:
+                                return
+                        except TypeError:
+                            pass
+                self._last[name] = (value, now)
+
+        try:
+            self.callback(name, value, timestamp, annotation)
+        except Exception:
+            _logger.exception(f"Error in subscriber for {name}")
+
+
+class _TrieNode:
+    __slots__ = ("children", "star", "globs", "rest", "here")
+
+    def __init__(self):
+        self.children: dict[str, _TrieNode] = {}
+        self.star: _TrieNode | None = None
+        self.globs: dict[str, _TrieNode] = {}
+        # Subscriptions ending in "**" at this node
+        self.rest: list[Subscription] = []
+        # Subscriptions ending exactly at this node
+        self.here: list[Subscription] = []
+
+
+class SubscriptionBus:
+    """Trie of subscription patterns, with the matches for each name
+    cached until the set of subscriptions changes."""
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._lock = threading.Lock()
+        self._cache: dict[str, tuple[Subscription, ...]] = {}
+        self.count = 0
+
+    def add(self, sub: Subscription):
+        with self._lock:
+            node = self._root
+            parts = sub.pattern.split(".")
+            for i, part in enumerate(parts):
+                if part == "**" and i == len(parts) - 1:
+                    node.rest.append(sub)
+                    break
+                if part == "*":
+                    if node.star is None:
+                        node.star = _TrieNode()
+                    node = node.star
+                elif any(c in part for c in "*?["):
+                    node = node.globs.setdefault(part, _TrieNode())
+                else:
+                    node = node.children.setdefault(part, _TrieNode())
+            else:
+                node.here.append(sub)
+            self.count += 1
+            self._cache = {}
+
+    def remove(self, sub: Subscription):
+        with self._lock:
+            if self._remove(self._root, sub):
+                self.count -= 1
+                self._cache = {}
+
+    def _remove(self, node: _TrieNode, sub: Subscription) -> bool:
+        for x in (node.here, node.rest):
+            if sub in x:
+                x.remove(sub)
+                return True
+        children = list(node.children.values()) + list(node.globs.values())
+        if node.star is not None:
+            children.append(node.star)
+        return any(self._remove(i, sub) for i in children)
+
+    def match(self, name: str) -> tuple[Subscription, ...]:
+        x = self._cache.get(name)
+        if x is not None:
+            return x
+
+        found: list[Subscription] = []
+        parts = name.split(".")
+
+        with self._lock:
+            nodes = [self._root]
+            for part in parts:
+                nxt: list[_TrieNode] = []
+                for node in nodes:
+                    found.extend(node.rest)
+                    c = node.children.get(part)
+                    if c is not None:
+                        nxt.append(c)
+                    if node.star is not None:
+                        nxt.append(node.star)
+                    for pattern, c in node.globs.items():
+                        if fnmatch.fnmatchcase(part, pattern):
+                            nxt.append(c)
+                nodes = nxt
+                if not nodes:
+                    break
+
+            for node in nodes:
+                found.extend(node.here)
+                found.extend(node.rest)
+
+            x = tuple(dict.fromkeys(found))
+            self._cache[name] = x
+        return x
+
+    def publish(self, name: str, value: Any, timestamp: float, annotation: Any):
+        for sub in self.match(name):
+            sub.deliver(name, value, timestamp, annotation)
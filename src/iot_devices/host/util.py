@@ -6,6 +6,7 @@ import json
 import logging
 import os
 import sys
+import threading
 import weakref
 from typing import TYPE_CHECKING, Any
 
@@ -28,9 +29,148 @@ This dict lets you programmatically add new devices
 """
 
 
-def discover() -> dict[str, dict[str, Any]]:
+discovery_index_file: str | None = (
+    os.environ.get("IOT_DEVICES_DISCOVERY_INDEX") or None
+)
+"""
+Where discover() keeps what it found between runs, from the
+IOT_DEVICES_DISCOVERY_INDEX environment variable by default.
+If None, it is only cached in memory for this process.
+"""
+
+_INDEX_VERSION = 1
+
+_index_lock = threading.RLock()
+_index_loaded = False
+
+# Path entry -> {"mtime": directory mtime_ns,
+#                "manifests": {folder: [manifest mtime_ns, {type: info}]}}
+_path_index: dict[str, dict[str, Any]] = {}
+
+
+def _mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load_index():
+    global _index_loaded
+    _index_loaded = True
+    if not discovery_index_file:
+        return
+    try:
+        with open(discovery_index_file) as f:
+            d = json.load(f)
+        if d.get("version") == _INDEX_VERSION:
+            _path_index.update(d["paths"])
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("Ignoring bad discovery index")
+
+
+def _save_index():
+    if not discovery_index_file:
+        return
+    tmp = discovery_index_file + f".{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(discovery_index_file), exist_ok=True)
+        with open(tmp, "w") as f:
+            json.dump({"version": _INDEX_VERSION, "paths": _path_index}, f)
+        os.replace(tmp, discovery_index_file)
+    except Exception as e:
+        # Only a cache, a read only home or full disk is fine
+        logging.debug(f"Could not save discovery index: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _read_manifest(folder: str, here: str) -> dict[str, dict[str, Any]]:
+    found: dict[str, dict[str, Any]] = {}
+    try:
+        with open(os.path.join(folder, "devices_manifest.json")) as f:
+            d = json.loads(f.read())
+
+        for dev in d["devices"]:
+            info = d["devices"][dev]
+
+            # Special case handling devices included in this library for demo purposes.
+            modulename = os.path.basename(folder)
+            if os.path.dirname(folder) == here:
+                modulename = "iot_device"
+
+            x = info.get("submodule", None)
+            if x:
+                modulename = modulename + "." + x
+
+            info["importable"] = modulename
+
+            if "description" not in info:
+                info["description"] = ""
+
+            if "classname" not in info:
+                info["classname"] = dev
+
+            found[dev] = info
+    except Exception:
+        logging.exception("Error with devices manifest in: " + folder)
+    return found
+
+
+def _scan_path(path: str, here: str, full: bool) -> bool:
+    """Bring the index entry for one path entry up to date,
+    returning True if anything changed.
+
+    If the directory itself has not changed, only the manifests
+    already known are checked, without listing it.
+    """
+    mtime = _mtime(path)
+    if mtime is None or not os.path.isdir(path):
+        return _path_index.pop(path, None) is not None
+
+    old = _path_index.get(path)
+    known: dict[str, list[Any]] = old["manifests"] if old else {}
+    changed = False
+
+    if old is None or full or old["mtime"] != mtime:
+        folders = []
+        for d in os.listdir(path):
+            folder = os.path.join(path, d)
+            if os.path.isfile(os.path.join(folder, "devices_manifest.json")):
+                folders.append(folder)
+        manifests = {i: known.get(i, [None, {}]) for i in folders}
+        changed = old is None or set(manifests) != set(known)
+        _path_index[path] = {"mtime": mtime, "manifests": manifests}
+    else:
+        manifests = known
+
+    for folder, entry in list(manifests.items()):
+        m = _mtime(os.path.join(folder, "devices_manifest.json"))
+        if m is None:
+            del manifests[folder]
+            changed = True
+        elif m != entry[0]:
+            manifests[folder] = [m, _read_manifest(folder, here)]
+            changed = True
+
+    return changed
+
+
+def discover(rescan: bool = False) -> dict[str, dict[str, Any]]:
     """Search system paths for modules that have a devices manifest.
 
+    What was found is kept in an index, see discovery_index_file.
+    Directories that have not changed since the last call are not
+    listed again, only their known manifests are checked.
+
+    Args:
+        rescan: List every directory even if it looks unchanged,
+            to find manifests added to an existing package folder.
+
     Returns:
         A dict indexed by the device type name, with the values being info dicts.
         Keys not documented here should be considered opaque.
@@ -47,46 +187,35 @@ def discover() -> dict[str, dict[str, Any]]:
     here = os.path.dirname(os.path.abspath(__file__))
     paths.append(here)
 
-    # Priority
-    for i in reversed(paths):
-        if not os.path.isdir(i):
-            continue
-        for d in os.listdir(i):
-            folder = os.path.join(i, d)
-            if os.path.isdir(folder):
-                if os.path.isfile(
-                    os.path.join(folder, "devices_manifest.json")
-                ):
-                    try:
-                        with open(
-                            os.path.join(folder, "devices_manifest.json")
-                        ) as f:
-                            d = f.read()
-                            d = json.loads(d)
-
-                        for dev in d["devices"]:
-                            _known_device_types[dev] = d["devices"][dev]
-
-                            # Special case handling devices included in this library for demo purposes.
-                            modulename = os.path.basename(folder)
-                            if os.path.dirname(folder) == here:
-                                modulename = "iot_device"
-
-                            x = d["devices"][dev].get("submodule", None)
-                            if x:
-                                modulename = modulename + "." + x
-
-                            _known_device_types[dev]["importable"] = modulename
-
-                            if "description" not in _known_device_types[dev]:
-                                _known_device_types[dev]["description"] = ""
-
-                            if "classname" not in _known_device_types[dev]:
-                                _known_device_types[dev]["classname"] = dev
-                    except Exception:
-                        logging.exception(
-                            "Error with devices manifest in: " + folder
-                        )
+    with _index_lock:
+        if not _index_loaded:
+            _load_index()
+
+        changed = False
+        for i in dict.fromkeys(paths):
+            if _scan_path(i, here, rescan):
+                changed = True
+
+        # Paths no longer on sys.path stay indexed, in case they come
+        # back, but don't contribute types.
+        found: dict[str, dict[str, Any]] = {}
+        # Priority
+        for i in reversed(paths):
+            entry = _path_index.get(i)
+            if entry is None:
+                continue
+            for _mtime_ns, types in entry["manifests"].values():
+                found.update(types)
+
+        # In place, so lookups from other threads never see a known
+        # type missing while this runs
+        _known_device_types.update(found)
+        for i in [i for i in _known_device_types if i not in found]:
+            _known_device_types.pop(i, None)
+
+        if changed:
+            _save_index()
+
     return _known_device_types
 
 
@@ -107,10 +236,13 @@ def get_class(data: dict[str, Any]) -> type[device.Device]:
 
     if t not in _known_device_types:
         discover()
+    if t not in _known_device_types:
+        discover(rescan=True)
 
-    classname = _known_device_types[t].get("classname", t)
+    info = _known_device_types[t]
+    classname = info.get("classname", t)
 
-    m = _known_device_types[t]["importable"]
+    m = info["importable"]
     module = importlib.import_module(m)
     return module.__dict__[classname]
 
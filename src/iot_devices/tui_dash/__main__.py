@@ -2,7 +2,7 @@ import os
 import sys
 import tomllib
 import weakref
-from collections.abc import Callable, Mapping
+from collections.abc import Callable
 from typing import Any
 
 from textual.app import App, ComposeResult
@@ -28,24 +28,6 @@ class Host(SimpleHost):
         """
         return {"device.fixed_number_multiplier": "10000000"}
 
-    def set_data_point(
-        self,
-        name: str,
-        value: int | float | str | bytes | Mapping[str, Any] | list[Any],
-        timestamp: float | None = None,
-        annotation: Any | None = None,
-        force_push_on_repeat: bool = False,
-    ):
-        "This is how devices send data to hosts"
-        print(
-            f"set_data_point({self}, {name}, {value}, {timestamp}, {annotation}, {force_push_on_repeat})"
-        )
-        super().set_data_point(
-            name, value, timestamp, annotation, force_push_on_repeat
-        )
-        if name in point_to_widgets:
-            point_to_widgets[name].val_display.update(value)
-
     def numeric_data_point(
         self,
         device: str,
@@ -65,7 +47,7 @@ class Host(SimpleHost):
         dashboard: bool = True,
         **kwargs: Any,
     ):
-        super().numeric_data_point(
+        slot = super().numeric_data_point(
             device,
             name,
             min=min,
@@ -86,6 +68,7 @@ class Host(SimpleHost):
             dev_to_widgets[device].scroll.mount(
                 OneDataPointWidget(device, name, "numeric", subtype)
             )
+        return slot
 
     def on_before_device_added(
         self,
@@ -105,6 +88,14 @@ class Host(SimpleHost):
 host = Host()
 
 
+def update_widgets(name: str, value: Any, timestamp: float, annotation: Any):
+    if name in point_to_widgets:
+        point_to_widgets[name].val_display.update(value)
+
+
+host.subscribe("**", update_widgets)
+
+
 class OneDataPointWidget(Widget):
     DEFAULT_CSS = """
     OneDataPointWidget {
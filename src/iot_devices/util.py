@@ -1,4 +1,6 @@
 import warnings
+from collections.abc import Mapping
+from typing import Any, NoReturn
 
 TRUE_STRINGS = ("true", "yes", "on", "enable", "active", "enabled", "1")
 FALSE_STRINGS = ("false", "no", "off", "disable", "inactive", "disabled", "0")
@@ -16,3 +18,136 @@ def str_to_bool(s: str) -> bool:
         return False
     else:
         raise ValueError("Not a valid boolean string")
+
+
+def _readonly(*args: Any, **kwargs: Any) -> NoReturn:
+    raise TypeError("This object is immutable")
+
+
+class FrozenDict(dict[str, Any]):
+    """A dict that can't be modified, used for config snapshots.
+    It is still a real dict, so JSON and isinstance checks work.
+    Copying it gives back an ordinary mutable dict.
+    """
+
+    __slots__ = ("_content_hash",)
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def content_hash(self) -> int | None:
+        """Order independent hash of the contents, computed once.
+        None if something inside is unhashable."""
+        try:
+            return self._content_hash
+        except AttributeError:
+            pass
+        try:
+            h = hash(frozenset((k, _content_hash(v)) for k, v in self.items()))
+        except TypeError:
+            h = None
+        self._content_hash = h
+        return h
+
+    def __copy__(self) -> dict[str, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> dict[str, Any]:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (thaw(self),))
+
+
+class FrozenList(list[Any]):
+    """A list that can't be modified, see FrozenDict."""
+
+    __slots__ = ("_content_hash",)
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = _readonly
+    sort = reverse = _readonly
+
+    def content_hash(self) -> int | None:
+        """Hash of the contents, computed once, see FrozenDict."""
+        try:
+            return self._content_hash
+        except AttributeError:
+            pass
+        try:
+            h = hash(tuple(_content_hash(i) for i in self))
+        except TypeError:
+            h = None
+        self._content_hash = h
+        return h
+
+    def __copy__(self) -> list[Any]:
+        return list(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> list[Any]:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (thaw(self),))
+
+
+def freeze(obj: Any) -> Any:
+    """Recursively convert dicts and lists to FrozenDict and FrozenList.
+    Already frozen parts are shared, not copied."""
+    if isinstance(obj, FrozenDict | FrozenList):
+        return obj
+    if isinstance(obj, Mapping):
+        return FrozenDict({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list | tuple):
+        return FrozenList(freeze(i) for i in obj)
+    return obj
+
+
+def freeze_shallow(obj: Any) -> Any:
+    """Wrap only the top level of obj as FrozenDict or FrozenList,
+    for values the caller hands over and promises never to modify.
+    Nested containers are kept as they are, not copied."""
+    if isinstance(obj, FrozenDict | FrozenList):
+        return obj
+    if isinstance(obj, Mapping):
+        return FrozenDict(obj)
+    if isinstance(obj, list | tuple):
+        return FrozenList(obj)
+    return obj
+
+
+def _content_hash(obj: Any) -> int:
+    if isinstance(obj, FrozenDict | FrozenList):
+        h = obj.content_hash()
+        if h is None:
+            raise TypeError("Unhashable contents")
+        return h
+    return hash(obj)
+
+
+def frozen_changed(old: Any, new: Any) -> bool:
+    """!= for values that may be frozen. The same object, or two frozen
+    values with different cached hashes, is answered without walking
+    the contents. Equal hashes don't prove equal values, so those
+    are still compared.
+
+    Frozen parts shared with an earlier value already have their hash,
+    so only the new parts of a value are ever hashed."""
+    if old is new:
+        return False
+    if isinstance(old, FrozenDict | FrozenList) and type(new) is type(old):
+        a = old.content_hash()
+        if a is not None:
+            b = new.content_hash()
+            if b is not None and a != b:
+                return True
+    return old != new
+
+
+def thaw(obj: Any) -> Any:
+    """Recursively convert frozen structures back to plain dicts and lists."""
+    if isinstance(obj, Mapping):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list | tuple):
+        return [thaw(i) for i in obj]
+    return obj
@@ -0,0 +1,228 @@
+import asyncio
+import copy
+import gc
+import json
+import threading
+import time
+from typing import Any
+
+import pytest
+from jsonschema import ValidationError
+
+from iot_devices import device
+from iot_devices.device import Device, get_all_devices
+from iot_devices.host.simple_host import SimpleHost
+
+
+class PlainDevice(Device):
+    device_type = "PlainDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+
+
+def test_all_devices_snapshot():
+    h = SimpleHost()
+    before = get_all_devices()
+
+    d = h.add_device_from_class(
+        PlainDevice, {"type": "PlainDevice", "name": "registry_a"}
+    ).wait_device_ready()
+
+    snapshot = get_all_devices()
+    assert "registry_a" not in before
+    assert snapshot["registry_a"]() is d
+    # Unchanged registry gives back the same snapshot without copying
+    assert get_all_devices() is snapshot
+    assert device.all_devices is snapshot
+
+    d.close()
+    del d
+    gc.collect()
+
+    assert "registry_a" not in get_all_devices()
+    # Old snapshots are immutable and unaffected
+    assert "registry_a" in snapshot
+
+
+class SchemaDevice(Device):
+    device_type = "SchemaDevice"
+    config_schema = {
+        "properties": {"speed": {"type": "number", "default": 1}},
+    }
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+
+
+def test_schema_is_cached_per_class():
+    h = SimpleHost()
+    a = h.add_device_from_class(
+        SchemaDevice, {"type": "SchemaDevice", "name": "schema_a"}
+    ).wait_device_ready()
+    b = h.add_device_from_class(
+        SchemaDevice, {"type": "SchemaDevice", "name": "schema_b"}
+    ).wait_device_ready()
+
+    assert a._get_compiled_schema() is b._get_compiled_schema()
+
+    # Callers get their own copy
+    s = a.get_full_schema()
+    s["properties"].clear()
+    assert "speed" in b.get_full_schema()["properties"]
+
+    with pytest.raises(ValidationError):
+        a.set_config_option("speed", "fast")
+    a.set_config_option("speed", 5)
+    assert a.config["speed"] == 5
+
+    a.close()
+    b.close()
+
+
+def test_config_is_frozen_snapshot():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        PlainDevice,
+        {"type": "PlainDevice", "name": "frozen", "items": [1, {"a": 2}]},
+    ).wait_device_ready()
+
+    c = d.config
+    assert c is d.config
+    with pytest.raises(TypeError):
+        c["items"] = []  # type: ignore
+    with pytest.raises(TypeError):
+        c["items"].append(3)
+    with pytest.raises(TypeError):
+        c["items"][1]["a"] = 3
+
+    assert json.loads(json.dumps(c))["items"] == [1, {"a": 2}]
+
+    editable = copy.deepcopy(c)
+    editable["items"].append(3)
+    d.update_config(editable)
+
+    assert d.config["items"] == [1, {"a": 2}, 3]
+    # Old snapshot unchanged
+    assert c["items"] == [1, {"a": 2}]
+    d.close()
+
+
+class LateReadyDevice(device.Device):
+    device_type = "LateReadyDevice"
+    ready_after_init = False
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data, **kwargs)
+        if self.config.get("delay") is not None:
+            threading.Timer(self.config["delay"], self.set_ready).start()
+
+
+class BrokenDevice(device.Device):
+    device_type = "BrokenDevice"
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data, **kwargs)
+        raise RuntimeError("broken")
+
+
+def test_event_based_readiness():
+    h = SimpleHost()
+    late = h.add_device_from_class(
+        LateReadyDevice,
+        {"type": "LateReadyDevice", "name": "late", "delay": 0.2},
+    ).wait_device_ready(5)
+    assert late.wait_ready(5)
+
+    never = h.add_device_from_class(
+        LateReadyDevice, {"type": "LateReadyDevice", "name": "never"}
+    ).wait_device_ready(5)
+    t = time.monotonic()
+    assert not never.wait_ready(0.1)
+    assert time.monotonic() - t < 1
+    assert not asyncio.run(never.async_wait_ready(0.1))
+
+    never.set_ready()
+    assert asyncio.run(never.async_wait_ready(0.1))
+
+    with pytest.raises(RuntimeError):
+        h.add_device_from_class(
+            BrokenDevice, {"type": "BrokenDevice", "name": "bad"}
+        )
+    assert "bad" not in h.devices
+
+    late.close()
+    never.close()
+
+
+class JitterDevice(Device):
+    device_type = "JitterDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.calls: list[float] = []
+        self.numeric_data_point(
+            "speed",
+            deadband=0.5,
+            hi=10,
+            max_silence=0.2,
+            handler=lambda v, t, a: self.calls.append(v),
+        )
+        self.numeric_data_point(
+            "beat",
+            max_silence=0.1,
+            handler=lambda v, t, a: self.calls.append(v),
+        )
+        self.numeric_data_point(
+            "temp",
+            deadband=10,
+            deadband_mode="pct",
+            handler=lambda v, t, a: self.calls.append(v),
+        )
+
+
+def test_deadband():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        JitterDevice, {"type": "JitterDevice", "name": "jitter"}
+    ).wait_device_ready()
+    assert isinstance(d, JitterDevice)
+
+    for v in (1, 1.1, 1.4, 1.6, 9.8, 10.1, 10.2):
+        d.set_data_point("speed", v)
+    # Crossing hi always goes through
+    assert d.calls == [1, 1.6, 9.8, 10.1]
+    assert d.datapoints["speed"].get()[0] == 10.1
+
+    time.sleep(0.25)
+    d.set_data_point("speed", 10.2)
+    assert d.calls[-1] == 10.2
+
+    # Unchanged values still get through as a heartbeat
+    n = len(d.calls)
+    time.sleep(0.25)
+    d.set_data_point("speed", 10.2)
+    assert d.calls[n:] == [10.2]
+    time.sleep(0.25)
+    d.set_data_points({"speed": 10.2})
+    assert d.calls[n:] == [10.2, 10.2]
+    d.set_data_point("speed", 10.2)
+    assert d.calls[n:] == [10.2, 10.2]
+
+    # Heartbeats without a deadband
+    d.calls.clear()
+    d.set_data_point("beat", 5)
+    d.set_data_point("beat", 5)
+    assert d.calls == [5]
+    time.sleep(0.2)
+    d.set_data_point("beat", 5)
+    assert d.calls == [5, 5]
+    d.set_data_point("beat", 6)
+    assert d.calls == [5, 5, 6]
+
+    d.calls.clear()
+    d.set_data_points({"temp": 100})
+    d.set_data_points({"temp": 105})
+    d.set_data_points({"temp": 111})
+    assert d.calls == [100, 111]
+    d.close()
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from iot_devices.devices.LazyMesh import benchmark, crypto, mesh_packet
+from iot_devices.devices.LazyMesh.mesh import MeshNode
+from iot_devices.devices.LazyMesh.seen_packets import SeenPacketTable
+from iot_devices.devices.LazyMesh.transports import RawPacketMetadata
+from iot_devices.devices.LazyMesh.transports.udp import UDPTransport
+
+
+def test_seen_packet_buckets():
+    t = SeenPacketTable(horizon=180, bucket_seconds=10)
+
+    r = t.get_or_create(1, now=1000)
+    r.real_copies_seen += 1
+    assert t.get_or_create(1, now=1005) is r
+    t.get_or_create(2, now=1100)
+
+    # Still remembered up to the horizon
+    assert 1 in t
+    t.get_or_create(3, now=1179)
+    assert 1 in t
+
+    # Whole bucket dropped once it is past the horizon
+    t.get_or_create(4, now=1190)
+    assert 1 not in t
+    assert 2 in t
+    assert len(t) == 3
+
+
+def test_seen_packet_overflow_never_marks_new_seen():
+    t = SeenPacketTable(max_packets=100)
+    for i in range(1000):
+        r = t.get_or_create(i, now=1000 + i / 100)
+        assert r.real_copies_seen == 0
+        r.real_copies_seen += 1
+        assert len(t) <= 100
+    assert 999 in t
+
+
+class RecordingTransport:
+    use_reliable_retransmission = True
+
+    def __init__(self):
+        self.sent: list[bytes] = []
+        self.batches = 0
+
+    async def listen(self):
+        await asyncio.Event().wait()
+        yield None
+
+    async def send(self, data: bytes):
+        self.sent.append(data)
+
+    async def send_batch(self, datas: list[bytes]):
+        self.batches += 1
+        self.sent.extend(datas)
+
+    async def global_route(self, data: bytes) -> bool:
+        return False
+
+    async def close(self):
+        pass
+
+    async def maintain(self):
+        pass
+
+
+def make_packet(n: int) -> bytes:
+    p = bytearray(mesh_packet.PACKET_OVERHEAD + 4)
+    p[0] = mesh_packet.PACKET_TYPE_RELIABLE_DATA | (3 << mesh_packet.TTL_OFFSET)
+    p[4:20] = b"r" * 16
+    # The packet ID is the last 4 random bytes and the time
+    p[24:28] = n.to_bytes(4, "little")
+    p[28:32] = int(time.time()).to_bytes(4, "little")
+    return bytes(p)
+
+
+def packet_id(p: bytes) -> int:
+    return int.from_bytes(p[24:32], "little")
+
+
+def test_outgoing_scheduler():
+    t = RecordingTransport()
+    node = MeshNode([t])
+    try:
+        # Nobody known to be listening, sent once
+        node.loop.call_soon_threadsafe(node.enqueue_packet, make_packet(1))
+        time.sleep(0.5)
+        assert len(t.sent) == 1
+
+        # Expecting a subscriber that never answers, retried 6 times
+        node.subscriber_interest_by_channel[b"r" * 8] = 1
+        p2 = make_packet(2)
+        node.loop.call_soon_threadsafe(node.enqueue_packet, p2)
+        time.sleep(1.8)
+        assert len(t.sent) == 7
+        # The first one is done waiting for replies
+        assert list(node.outgoing) == [packet_id(p2)]
+
+        # An ACK stops retries right away
+        p3 = make_packet(3)
+        node.loop.call_soon_threadsafe(node.enqueue_packet, p3)
+        time.sleep(0.1)
+        ack = bytes([0, 0, mesh_packet.CONTROL_TYPE_ACK]) + p3[24:32]
+        asyncio.run_coroutine_threadsafe(
+            node.handle_packet(RawPacketMetadata(ack, t)), node.loop
+        ).result()
+        n = len(t.sent)
+        time.sleep(0.6)
+        assert len(t.sent) == n
+        assert node.outgoing[packet_id(p3)].stopSending
+
+        # Finished packets are dropped 2s after their last send
+        time.sleep(2)
+        assert node.outgoing == {}
+        assert t.batches == len(t.sent)
+    finally:
+        node.close()
+
+
+def test_cached_crypto_matches_uncached():
+    key = crypto.derive_crypto_key(b"k" * 16, 500000)
+    assert key == benchmark._uncached_key(b"k" * 16, 500000)
+    iv = bytes(range(12))
+    payload = b"hello mesh" * 5
+
+    ct = crypto.aes_gcm_encrypt(key, payload, iv, 6)
+    assert ct == benchmark._uncached_encrypt(key, payload, iv)
+    assert crypto.aes_gcm_decrypt(key, ct, iv, 6) == payload
+
+    bad = ct[:-1] + bytes([ct[-1] ^ 1])
+    with pytest.raises(InvalidTag):
+        crypto.aes_gcm_decrypt(key, bad, iv, 6)
+
+    assert crypto.routing_id_topic_hash(b"r" * 16) == (
+        hashlib.sha256(b"r" * 16).digest()[:8].hex()
+    )
+
+
+def test_routing_index_demux(monkeypatch):
+    t = RecordingTransport()
+    node = MeshNode([t])
+    try:
+        a = node.add_channel("channel a")
+        b = node.add_channel("channel b")
+        got: list[str] = []
+        a.callback = lambda p: got.append("a")
+        b.callback = lambda p: got.append("b")
+
+        hour = int(time.time()) // 3600
+        assert node.routing_index[a.temp_keys["routing_key"]][0] is a
+        assert len(node.routing_index) == 6
+
+        decrypts: list[bytes] = []
+        real_decrypt = mesh_packet.MeshPacket.decrypt
+
+        def decrypt(self: mesh_packet.MeshPacket, key: bytes):
+            decrypts.append(key)
+            real_decrypt(self, key)
+
+        monkeypatch.setattr(mesh_packet.MeshPacket, "decrypt", decrypt)
+
+        def packet(routing_id: bytes, crypto_key: bytes) -> bytes:
+            p = mesh_packet.MeshPacket(
+                header=mesh_packet.header1(1, 0, False, False, False),
+                header2=0,
+                mesh_route_num=0,
+                path_loss=0,
+                last_hop_loss=0,
+                routing_id=routing_id,
+                entropy=os.urandom(8),
+                timestamp=int(time.time()),
+                plaintext=mesh_packet.Payload().to_buffer(),
+            )
+            p.encrypt(crypto_key)
+            return p.serialize()
+
+        def receive(raw: bytes):
+            asyncio.run_coroutine_threadsafe(
+                node.handle_packet(RawPacketMetadata(raw, t)), node.loop
+            ).result()
+
+        # Next hour's keys are accepted early
+        receive(
+            packet(
+                crypto.derive_routing_key(b.psk, hour + 1),
+                crypto.derive_crypto_key(b.psk, hour + 1),
+            )
+        )
+        assert got == ["b"]
+
+        receive(packet(b"x" * 16, b"k" * 16))
+        assert got == ["b"]
+        assert len(decrypts) == 1
+
+        node.remove_channel("channel b")
+        assert len(node.routing_index) == 3
+    finally:
+        node.close()
+
+
+def test_delivered_metadata_is_a_snapshot():
+    t = RecordingTransport()
+    node = MeshNode([t])
+    try:
+        channel = node.add_channel("snapshot")
+        got: list[mesh_packet.Payload] = []
+        channel.callback = got.append
+
+        hour = int(time.time()) // 3600
+        p = mesh_packet.MeshPacket(
+            header=mesh_packet.header1(1, 3, False, False, False),
+            header2=0,
+            mesh_route_num=0,
+            path_loss=0,
+            last_hop_loss=0,
+            routing_id=crypto.derive_routing_key(channel.psk, hour),
+            entropy=os.urandom(8),
+            timestamp=int(time.time()),
+            plaintext=mesh_packet.Payload().to_buffer(),
+        )
+        p.encrypt(crypto.derive_crypto_key(channel.psk, hour))
+        meta = RawPacketMetadata(p.serialize(), t)
+
+        asyncio.run_coroutine_threadsafe(
+            node.handle_packet(meta), node.loop
+        ).result()
+
+        # Repeated in place, but what the listener kept is unchanged
+        assert meta.raw.ttl == 2
+        assert len(got) == 1
+        assert got[0].metadata.raw.ttl == 3
+        assert got[0].metadata.raw is not meta.raw
+    finally:
+        node.close()
+
+
+def test_forwarding_in_place():
+    t = RecordingTransport()
+    node = MeshNode([t])
+    try:
+        meta = RawPacketMetadata(make_packet(5), t)
+        raw = meta.raw
+        assert raw.ttl == 3
+
+        parsed = mesh_packet.MeshPacket.parse(raw)
+        assert isinstance(parsed.ciphertext, memoryview)
+        assert parsed.routing_id == b"r" * 16
+
+        asyncio.run_coroutine_threadsafe(
+            node.handle_packet(meta), node.loop
+        ).result()
+
+        # The received buffer itself is queued for repeating
+        entry = node.outgoing[raw.packet_id]
+        assert entry.packet is raw
+        assert raw.ttl == 2
+        assert raw[1] & (1 << mesh_packet.HEADER_2_REPEATER_BIT)
+        assert parsed.routing_id == b"r" * 16
+    finally:
+        node.close()
+
+
+def test_udp_transport_batches():
+    async def run():
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(("127.0.0.1", 0))
+        sink.settimeout(1)
+
+        port = benchmark._free_port()
+        t = UDPTransport(
+            "127.0.0.1",
+            sink.getsockname()[1],
+            bind_address="127.0.0.1",
+            bind_port=port,
+            rcvbuf=1 << 20,
+        )
+        await t.setup()
+
+        source = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        packets = [make_packet(i) for i in range(50)]
+        for i in packets:
+            source.sendto(i, ("127.0.0.1", port))
+        await asyncio.sleep(0.1)
+
+        # Drained into PacketBuffers in arrival order
+        received = []
+        async for meta in t.listen():
+            assert meta
+            assert isinstance(meta.raw, mesh_packet.PacketBuffer)
+            received.append(meta.raw)
+            if len(received) == len(packets):
+                break
+        assert received == packets
+
+        await t.send_batch(received)
+        assert [sink.recv(2048) for _i in packets] == packets
+
+        await t.close()
+        source.close()
+        sink.close()
+
+    asyncio.run(run())
@@ -0,0 +1,802 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from iot_devices.device import Device
+from iot_devices.host import util
+from iot_devices.host.datapoint_log import DatapointLog, DatapointLogReader
+from iot_devices.host.simple_host import DataPointSlot, SimpleHost
+from iot_devices.util import FrozenDict
+
+
+class FrameDevice(Device):
+    device_type = "FrameDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.calls: list[tuple[str, Any, float, Any]] = []
+
+        def handler(name: str):
+            def f(v: Any, t: float, a: Any):
+                self.calls.append((name, v, t, a))
+
+            return f
+
+        self.numeric_data_point("a", handler=handler("a"))
+        self.numeric_data_point("b", handler=handler("b"))
+        self.string_data_point("s", handler=handler("s"))
+        self.object_data_point("o", handler=handler("o"))
+
+
+def test_set_data_points_frame():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "frame"}
+    ).wait_device_ready()
+    assert isinstance(d, FrameDevice)
+
+    obj = {"x": 1}
+    d.set_data_points({"a": 1, "b": 2, "s": "hello", "o": obj}, 1234)
+    obj["x"] = 2
+
+    assert d.datapoints["a"].get() == (1.0, 1234, None)
+    assert isinstance(d.datapoints["a"].get()[0], float)
+    assert d.datapoints["s"].get()[0] == "hello"
+    assert d.datapoints["o"].get()[0] == {"x": 1}
+    assert [i[0] for i in d.calls] == ["a", "b", "s", "o"]
+
+    # Only changed values notify, per-value timestamps override the frame
+    d.calls.clear()
+    d.set_data_points([("a", 1, None, None), ("b", 3, 5678, "note")])
+    assert d.calls == [("b", 3.0, 5678, "note")]
+    assert d.datapoints["a"].get()[1] != 5678
+
+    d.close()
+
+
+class FailingHandlerDevice(Device):
+    device_type = "FailingHandlerDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+
+        def fail(v: Any, t: float, a: Any):
+            raise ValueError("handler failed")
+
+        self.numeric_data_point("a", handler=fail)
+
+
+def test_handler_errors_same_for_single_and_frame():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        FailingHandlerDevice, {"type": "FailingHandlerDevice", "name": "fh"}
+    ).wait_device_ready()
+    got: list[Any] = []
+    h.subscribe("fh.a", lambda *a: got.append(a[1]))
+
+    # Logged, and subscribers still run, however the point is set
+    d.set_data_point("a", 1)
+    d.set_data_points({"a": 2})
+    assert got == [1, 2]
+    d.close()
+
+
+def test_handles_skip_name_lookup():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "handles"}
+    ).wait_device_ready()
+
+    dp = d.datapoints["a"]
+    assert isinstance(dp.handle, DataPointSlot)
+    assert h.datapoint_slots["handles.a"] is dp.handle
+
+    dp.set(5, 100)
+    assert h.datapoint_vta["handles.a"] == (5.0, 100, None)
+    assert h.get_number("handles", "a") == dp.get()
+    assert d.calls[-1] == ("a", 5.0, 100, None)
+
+    d.close()
+    assert "handles.a" not in h.datapoint_vta
+
+
+def test_subclass_watching_set_data_point_sees_handle_sets():
+    seen: list[str] = []
+
+    class WatchingHost(SimpleHost):
+        def set_data_point(self, name: str, value: Any, *a: Any, **k: Any):
+            seen.append(name)
+            super().set_data_point(name, value, *a, **k)
+
+    h = WatchingHost()
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "watched"}
+    ).wait_device_ready()
+
+    d.set_data_point("a", 1)
+    d.set_data_points({"b": 2})
+    assert seen == ["watched.a", "watched.b"]
+    d.close()
+
+
+def test_array_numeric_storage():
+    h = SimpleHost(numeric_storage="array")
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "columns"}
+    ).wait_device_ready()
+    assert h.numeric_columns is not None
+    assert len(h.numeric_columns) == 2
+
+    dp = d.datapoints["a"]
+    assert dp.get() == (None, 0, None)
+
+    dp.set(3, 10, "note")
+    assert dp.get() == (3.0, 10, "note")
+    assert h.datapoint_vta["columns.a"] == (3.0, 10, "note")
+    assert d.calls[-1] == ("a", 3.0, 10, "note")
+
+    # Same value is not a change, annotation side table is cleared
+    d.calls.clear()
+    dp.set(3, 11)
+    assert d.calls == []
+    assert dp.get() == (3.0, 11, None)
+
+    d.set_data_points({"a": 4, "b": 5, "s": "x"}, 20)
+    assert h.get_number("columns", "b") == (5.0, 20, None)
+    assert d.datapoints["s"].get() == ("x", 20, None)
+
+    # Bad values from a misbehaving caller are skipped, not raised
+    h.set_data_point("columns.b", "oops", 21)
+    assert h.get_number("columns", "b") == (5.0, 20, None)
+    h.set_data_point("columns.b", "6", 22)
+    assert h.get_number("columns", "b") == (6.0, 22, None)
+
+    d.close()
+    assert len(h.numeric_columns) == 0
+
+    # Stale handles must not write into reused rows
+    d2 = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "columns2"}
+    ).wait_device_ready()
+    dp.set(99, 30)
+    assert d2.datapoints["a"].get()[0] is None
+    assert d2.datapoints["b"].get()[0] is None
+    d2.close()
+
+
+class SlowDevice(Device):
+    device_type = "SlowDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        if config.get("fail"):
+            raise RuntimeError("Failed on purpose")
+        time.sleep(0.3)
+        self.numeric_data_point("x", default=1)
+
+
+def test_add_devices_bulk_in_parallel():
+    h = SimpleHost()
+    util.device_classes["SlowDevice"] = SlowDevice
+    configs = [{"type": "SlowDevice", "name": f"slow{i}"} for i in range(10)]
+    configs.append({"type": "SlowDevice", "name": "broken", "fail": True})
+
+    start = time.time()
+    added = h.add_devices_bulk(configs, max_workers=16)
+    assert time.time() - start < 2
+
+    assert sorted(added) == sorted(f"slow{i}" for i in range(10))
+    assert "broken" not in h.devices
+    for c in added.values():
+        assert c.wait_device_ready().datapoints["x"].get()[0] == 1
+
+    h.close()
+
+
+class SlowCloseDevice(Device):
+    device_type = "SlowCloseDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.closed_at = 0.0
+        if not self.is_subdevice:
+            self.child = self.create_subdevice(
+                SlowCloseDevice, "child", {"delay": config.get("delay", 0)}
+            )
+
+    def on_before_close(self):
+        time.sleep(self.config.get("delay", 0))
+        self.closed_at = time.time()
+
+
+def test_parallel_close_with_deadline():
+    h = SimpleHost()
+    devs = [
+        h.add_device_from_class(
+            SlowCloseDevice,
+            {"type": "SlowCloseDevice", "name": f"closer{i}", "delay": 0.2},
+        ).wait_device_ready()
+        for i in range(8)
+    ]
+    stuck = h.add_device_from_class(
+        SlowCloseDevice,
+        {"type": "SlowCloseDevice", "name": "stuck", "delay": 2},
+    ).wait_device_ready()
+
+    start = time.time()
+    missed = h.close(max_workers=16, timeout=1)
+    assert time.time() - start < 2
+    assert missed == ["stuck"]
+
+    for d in devs:
+        assert d.closed_at
+        assert isinstance(d, SlowCloseDevice)
+        assert d.child.closed_at
+    assert not stuck.closed_at
+    # Left running on a daemon thread, so it can't block exit
+    closers = [i for i in threading.enumerate() if i.name == "HostDeviceClose"]
+    assert closers
+    assert all(i.daemon for i in closers)
+
+
+class PlainDevice(Device):
+    device_type = "PlainDevice"
+
+
+class ErrorRecordingHost(SimpleHost):
+    def __init__(self):
+        super().__init__()
+        self.errors: list[str] = []
+
+    def on_device_error(self, device_container, error: str):
+        self.errors.append(error)
+
+
+def test_shared_event_loops():
+    h = ErrorRecordingHost()
+    h.event_loop_threads = 2
+
+    devs = [
+        h.add_device_from_class(
+            PlainDevice, {"type": "PlainDevice", "name": f"loop{i}"}
+        ).wait_device_ready()
+        for i in range(3)
+    ]
+    loops = [h.get_event_loop(d) for d in devs]
+    assert len({id(i) for i in loops}) == 2
+    assert h.get_event_loop(devs[0]) is loops[0]
+
+    sub = devs[0].create_subdevice(PlainDevice, "sub", {})
+    assert h.get_event_loop(sub) is loops[0]
+
+    async def where():
+        return asyncio.get_running_loop()
+
+    assert h.create_task(devs[1], where()).result(5) is loops[1]
+
+    async def fail():
+        raise ValueError("in task")
+
+    try:
+        h.create_task(devs[1], fail()).result(5)
+    except ValueError:
+        pass
+    assert "in task" in h.errors[-1]
+
+    started = threading.Event()
+
+    async def forever():
+        started.set()
+        await asyncio.sleep(1000)
+
+    f = h.create_task(devs[2], forever())
+    assert started.wait(5)
+    devs[2].close()
+    assert f.cancelled()
+    # Other devices on the loop keep running
+    assert h.create_task(devs[0], where()).result(5) is loops[0]
+
+    # A subdevice can cancel it's own tasks from it's loop without waiting
+    h.create_task(sub, forever())
+
+    async def cancel_own():
+        t = time.monotonic()
+        h.cancel_device_tasks(sub.name)
+        return time.monotonic() - t
+
+    assert h.create_task(devs[0], cancel_own()).result(10) < 1
+
+    h.close()
+    assert not any(i.is_running() for i in loops)
+
+
+class AlarmDevice(Device):
+    device_type = "AlarmDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.numeric_data_point("temp")
+        self.numeric_data_point("other")
+        self.string_data_point("mode")
+        self.set_alarm("Hot", "temp", "value > 90", auto_ack=True)
+        self.set_alarm(
+            "Slow",
+            "temp",
+            "value>50",
+            trip_delay=0.2,
+            release_condition="value < 20",
+        )
+        self.set_alarm("Panic", "mode", "value == 'PANIC'")
+        self.set_alarm("Odd", "other", "int(value) % 2 == 1")
+
+
+class AlarmHost(SimpleHost):
+    def __init__(self):
+        super().__init__()
+        self.alarm_changes: list[tuple[str, str, str]] = []
+
+    def on_alarm_state_changed(self, alert, old):
+        self.alarm_changes.append((alert.name, old, alert.state))
+
+
+def test_alarm_engine():
+    h = AlarmHost()
+    d = h.add_device_from_class(
+        AlarmDevice, {"type": "AlarmDevice", "name": "alarms"}
+    ).wait_device_ready()
+    alarms = {a.name: a for a in h.devices["alarms"].alerts}
+
+    assert alarms["Hot"].trip_condition.op is not None
+    assert alarms["Panic"].trip_condition.operand == "PANIC"
+    assert alarms["Odd"].trip_condition.code is not None
+
+    d.set_data_point("temp", 95)
+    assert alarms["Hot"].state == "active"
+    assert alarms["Slow"].state == "pending"
+
+    d.set_data_points({"temp": 60, "mode": "PANIC", "other": 3})
+    assert alarms["Hot"].state == "normal"
+    assert alarms["Panic"].state == "active"
+    assert alarms["Odd"].state == "active"
+
+    # Trip delay runs out with no new value
+    deadline = time.monotonic() + 5
+    while alarms["Slow"].state == "pending" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert alarms["Slow"].state == "active"
+
+    # Stays active until the release condition
+    d.set_data_point("temp", 30)
+    assert alarms["Slow"].state == "active"
+    d.set_data_point("temp", 10)
+    assert alarms["Slow"].state == "cleared"
+    alarms["Slow"].acknowledge()
+    assert alarms["Slow"].state == "normal"
+
+    # Pending resets if the condition goes away
+    d.set_data_point("temp", 70)
+    assert alarms["Slow"].state == "pending"
+    d.set_data_point("temp", 0)
+    assert alarms["Slow"].state == "normal"
+
+    assert ("Hot", "normal", "active") in h.alarm_changes
+    assert ("Hot", "active", "normal") in h.alarm_changes
+
+    d.close()
+    assert not h.alarms_by_datapoint
+
+
+class TriggerDevice(Device):
+    device_type = "TriggerDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+        self.level_calls: list[float] = []
+        self.trigger_calls: list[float] = []
+
+        def level(v: float, t: float, a: Any):
+            self.entered.set()
+            self.gate.wait(5)
+            self.level_calls.append(v)
+
+        def trigger(v: float, t: float, a: Any):
+            self.trigger_calls.append(v)
+
+        self.numeric_data_point("level", handler=level)
+        self.numeric_data_point("button", subtype="trigger", handler=trigger)
+
+
+def test_queued_handler_dispatch():
+    h = SimpleHost(handler_dispatch="queue", dispatch_workers=1)
+    assert h.dispatcher
+    d = h.add_device_from_class(
+        TriggerDevice, {"type": "TriggerDevice", "name": "queued"}
+    ).wait_device_ready()
+    assert isinstance(d, TriggerDevice)
+
+    # Producer is not stalled by the slow handler
+    t = time.monotonic()
+    d.set_data_point("level", 0)
+    assert d.entered.wait(5)
+    d.set_data_point("button", 0)
+    for i in range(1, 10):
+        d.set_data_point("level", i)
+        d.set_data_point("button", i)
+    assert time.monotonic() - t < 1
+
+    d.gate.set()
+    assert h.dispatcher.flush(5)
+
+    # First value was already running, the rest collapse to the latest
+    assert d.level_calls == [0, 9]
+    assert d.trigger_calls == list(range(10))
+
+    stats = h.dispatcher.get_stats()
+    assert stats["coalesced"] == 8
+    assert stats["depth"] == 0
+    assert stats["dispatched"] == 12
+    h.dispatcher.stop()
+    d.close()
+
+
+def test_subscriptions():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "bus"}
+    ).wait_device_ready()
+
+    got: dict[str, list[Any]] = {"all": [], "a": [], "glob": [], "damped": []}
+
+    def rec(key: str):
+        def f(name: str, value: Any, timestamp: float, annotation: Any):
+            got[key].append((name, value))
+
+        return f
+
+    everything = h.subscribe("bus.**", rec("all"))
+    h.subscribe("bus.a", rec("a"))
+    h.subscribe("*.[ab]", rec("glob"))
+    h.subscribe("bus.b", rec("damped"), deadband=1, min_interval=0)
+
+    d.set_data_point("a", 1)
+    d.set_data_points({"b": 1, "s": "x"})
+    d.set_data_point("b", 1.5)
+    d.set_data_point("b", 3)
+
+    assert got["all"] == [
+        ("bus.a", 1),
+        ("bus.b", 1),
+        ("bus.s", "x"),
+        ("bus.b", 1.5),
+        ("bus.b", 3),
+    ]
+    assert got["a"] == [("bus.a", 1)]
+    assert [i[0] for i in got["glob"]] == ["bus.a", "bus.b", "bus.b", "bus.b"]
+    assert got["damped"] == [("bus.b", 1), ("bus.b", 3)]
+
+    everything.unsubscribe()
+    d.set_data_point("a", 2)
+    assert len(got["all"]) == 5
+    assert got["a"][-1] == ("bus.a", 2)
+
+    limited: list[Any] = []
+    h.subscribe("bus.a", lambda *a: limited.append(a[1]), min_interval=60)
+    d.set_data_point("a", 3)
+    d.set_data_point("a", 4)
+    assert limited == [3]
+    d.close()
+
+
+def test_frozen_object_points():
+    h = SimpleHost()
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "objs"}
+    ).wait_device_ready()
+    assert isinstance(d, FrameDevice)
+
+    d.set_data_point("o", {"a": [1, 2], "b": {"c": 3}})
+    stored = d.datapoints["o"].get()[0]
+    assert stored == {"a": [1, 2], "b": {"c": 3}}
+    with pytest.raises(TypeError):
+        stored["a"].append(3)
+
+    # Same object or same content is not a change
+    d.set_data_point("o", stored)
+    d.set_data_point("o", {"a": [1, 2], "b": {"c": 3}})
+    assert len([i for i in d.calls if i[0] == "o"]) == 1
+
+    # Unchanged frozen parts are shared, not copied
+    d.set_data_point("o", {"a": stored["a"], "b": {"c": 4}})
+    assert d.datapoints["o"].get()[0]["a"] is stored["a"]
+    assert len([i for i in d.calls if i[0] == "o"]) == 2
+
+    # Owned values are wrapped, not copied
+    inner = (1, 2)
+    owned = {"x": 1, "a": inner}
+    d.set_data_point("o", owned, take_ownership=True)
+    stored = d.datapoints["o"].get()[0]
+    assert isinstance(stored, FrozenDict)
+    assert stored["a"] is inner
+    with pytest.raises(TypeError):
+        stored["x"] = 2
+    assert len([i for i in d.calls if i[0] == "o"]) == 3
+    d.set_data_point("o", {"x": 1, "a": (1, 2)}, take_ownership=True)
+    assert len([i for i in d.calls if i[0] == "o"]) == 3
+    d.set_data_point("o", {"x": 2, "a": (1, 2)}, take_ownership=True)
+    assert len([i for i in d.calls if i[0] == "o"]) == 4
+
+    # Equal hashes are not trusted, hash(-1) == hash(-2)
+    n = len([i for i in d.calls if i[0] == "o"])
+    d.set_data_point("o", {"x": -1})
+    d.set_data_point("o", {"x": -2})
+    assert len([i for i in d.calls if i[0] == "o"]) == n + 2
+    assert d.datapoints["o"].get()[0] == {"x": -2}
+    d.close()
+
+
+def test_history_ring():
+    h = SimpleHost(history_size=1000)
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "hist"}
+    ).wait_device_ready()
+
+    # Wraps around several times
+    for i in range(2500):
+        d.set_data_point("a", i, timestamp=i + 1)
+
+    raw = h.get_history("hist.a", max_points=2000)
+    assert len(raw) == 1000
+    assert raw[0] == (1501, 1500, 1500, 1500)
+    assert raw[-1] == (2500, 2499, 2499, 2499)
+
+    buckets = h.get_history("hist.a", since=2001, until=2400, max_points=4)
+    assert buckets == [
+        (2001, 2000, 2099, 2049.5),
+        (2101, 2100, 2199, 2149.5),
+        (2201, 2200, 2299, 2249.5),
+        (2301, 2300, 2399, 2349.5),
+    ]
+
+    assert h.get_history("hist.a", since=5000) == []
+    with pytest.raises(KeyError):
+        h.get_history("hist.s")
+    d.close()
+
+
+def test_snapshot_warm_restart(tmp_path):
+    fn = str(tmp_path / "points.snapshot")
+
+    h = SimpleHost(snapshot_file=fn, snapshot_interval=1000)
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "warm"}
+    ).wait_device_ready()
+    d.set_data_points({"a": 5, "s": "hello", "o": {"x": [1, 2]}}, 100)
+    h.save_snapshot()
+
+    size = os.path.getsize(fn)
+    d.set_data_point("a", 6, 101)
+    h.save_snapshot()
+    # Only the changed point gets appended
+    assert os.path.getsize(fn) - size < 30
+    d.close()
+
+    h2 = SimpleHost(snapshot_file=fn, numeric_storage="array")
+    d2 = h2.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "warm"}
+    ).wait_device_ready()
+    assert isinstance(d2, FrameDevice)
+
+    assert d2.datapoints["a"].get() == (6, 101, None)
+    assert d2.datapoints["s"].get() == ("hello", 100, None)
+    assert d2.datapoints["o"].get()[0] == {"x": [1, 2]}
+    assert d2.datapoints["b"].get()[0] is None
+    assert not d2.calls
+
+    # Same value as before the restart is not a change
+    d2.set_data_point("a", 6)
+    assert not d2.calls
+    d2.close()
+
+
+def test_datapoint_log(tmp_path):
+    logdir = str(tmp_path / "log")
+    h = SimpleHost(datapoint_log=logdir)
+    assert h.datapoint_log
+    h.datapoint_log.segment_size = 2000
+    d = h.add_device_from_class(
+        FrameDevice, {"type": "FrameDevice", "name": "audit"}
+    ).wait_device_ready()
+
+    for i in range(200):
+        d.set_data_point("a", i, 1000 + i)
+        h.datapoint_log.commit()
+    d.set_data_points({"s": "hi", "o": {"x": 1}}, 2000)
+    h.close()
+
+    assert len(os.listdir(logdir)) > 2
+
+    records = list(DatapointLogReader(logdir).replay())
+    assert [v for n, t, v in records if n == "audit.a"] == list(range(200))
+    assert ("audit.s", 2000, "hi") in records
+    assert ("audit.o", 2000, {"x": 1}) in records
+
+    since = list(DatapointLogReader(logdir).replay(since=1150, until=1160))
+    assert [t for n, t, v in since] == list(range(1150, 1161))
+
+
+def test_datapoint_log_index(tmp_path):
+    log = DatapointLog(str(tmp_path), commit_interval=60, index_interval=10)
+    for i in range(1000):
+        log.append("p", 1000 + i, float(i))
+    log.commit()
+    # Out of order timestamps still land in the right block
+    log.append("late", 5, "old")
+    log.close()
+    log.append("p", 3000, 1.0)
+
+    segment = os.path.join(str(tmp_path), "segment-00000000.log")
+    with open(segment, "r+b") as f:
+        # Garbage over the start of the segment, which an indexed
+        # read after it must never look at
+        f.write(b"\xff" * 400)
+
+    reader = DatapointLogReader(str(tmp_path))
+    got = list(reader.replay(since=1500, until=1510))
+    assert got == [("p", 1500 + i, 500.0 + i) for i in range(11)]
+    assert list(reader.replay(until=5)) == [("late", 5, "old")]
+    assert all(t < 3000 for n, t, v in reader.replay(since=1990))
+
+
+def test_datapoint_log_full_buffer_commits_in_background(tmp_path):
+    log = DatapointLog(str(tmp_path), commit_interval=60, max_buffer=10)
+    committed = threading.Event()
+    threads: list[str] = []
+    commit = log.commit
+
+    def f():
+        threads.append(threading.current_thread().name)
+        commit()
+        committed.set()
+
+    log.commit = f
+    log.append("x", 1, 1.0)
+    log.append("x", 2, 2.0)
+    assert committed.wait(5)
+    assert threads == ["DatapointLog"]
+    log.close()
+    assert [v for n, t, v in DatapointLogReader(str(tmp_path)).replay()] == [
+        1.0,
+        2.0,
+    ]
+
+
+class MetaDevice(Device):
+    device_type = "MetaDevice"
+
+    def __init__(self, config: dict[str, Any], **kw: Any):
+        super().__init__(config, **kw)
+        self.numeric_data_point("temp", unit="degC", min=-40, hi=90)
+        self.numeric_data_point("press", subtype="trigger", writable=False)
+        self.numeric_data_point("rssi", unit="dBm", deadband=2)
+        self.string_data_point("mode", subtype="mode")
+
+
+def test_datapoint_registry():
+    h = SimpleHost()
+    h.add_device_from_class(MetaDevice, {"type": "MetaDevice", "name": "m1"})
+    devices = h.get_devices()
+    assert h.get_devices() is devices
+    h.add_device_from_class(MetaDevice, {"type": "MetaDevice", "name": "m2"})
+    assert h.get_devices() is not devices
+    assert set(h.get_devices()) == {"m1", "m2"}
+
+    reg = h.datapoint_registry
+    info = reg.points["m1.temp"]
+    assert (info.device, info.datapoint, info.type) == ("m1", "temp", "numeric")
+    assert (info.unit, info.min, info.hi) == ("degC", -40, 90)
+    assert reg.points["m2.rssi"].extra["deadband"] == 2
+
+    def names(infos: Any) -> set[str]:
+        return {i.name for i in infos}
+
+    assert names(reg.query(unit="degC")) == {"m1.temp", "m2.temp"}
+    assert names(reg.query(device="m2", subtype="trigger")) == {"m2.press"}
+    assert names(reg.query(type="string")) == {"m1.mode", "m2.mode"}
+    assert names(reg.query(prefix="m1", writable=False)) == {"m1.press"}
+    assert len(reg.query()) == 8
+
+    snap = reg.snapshot()
+    assert reg.snapshot() is snap
+
+    h.close_device("m1")
+    assert reg.snapshot() is not snap
+    assert reg.with_prefix("m1") == []
+    assert reg.query(device="m1") == []
+    assert names(reg.query(unit="degC")) == {"m2.temp"}
+    assert "m1.temp" not in h.datapoint_slots
+    assert set(h.get_devices()) == {"m2"}
+    h.close()
+
+
+def test_discovery_index(tmp_path, monkeypatch):
+    pkg = tmp_path / "site" / "fakedevices"
+    pkg.mkdir(parents=True)
+    (pkg / "devices_manifest.json").write_text(
+        '{"devices": {"FakeOne": {"description": "one"}}}'
+    )
+    index = tmp_path / "index.json"
+    monkeypatch.setattr(util, "discovery_index_file", str(index))
+    monkeypatch.syspath_prepend(str(tmp_path / "site"))
+
+    found = util.discover()
+    assert found["FakeOne"]["importable"] == "fakedevices"
+    assert "FakeOne" in index.read_text()
+
+    # A new manifest folder changes the directory, so it is picked up
+    other = tmp_path / "site" / "otherdevices"
+    other.mkdir()
+    (other / "devices_manifest.json").write_text(
+        '{"devices": {"FakeTwo": {"classname": "Two"}}}'
+    )
+    assert util.discover()["FakeTwo"]["classname"] == "Two"
+
+    # Editing a known manifest is seen without listing the directory
+    (pkg / "devices_manifest.json").write_text('{"devices": {"FakeThree": {}}}')
+    os.utime(pkg / "devices_manifest.json", ns=(1, 1))
+    found = util.discover()
+    assert "FakeOne" not in found
+    assert found["FakeThree"]["description"] == ""
+
+    # A fresh process starts from the saved index
+    monkeypatch.setattr(util, "_index_loaded", False)
+    monkeypatch.setattr(util, "_path_index", {})
+    assert "FakeThree" in util.discover()
+
+    # Failing to save is not an error, it is only a cache
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    monkeypatch.setattr(
+        util, "discovery_index_file", str(blocker / "index.json")
+    )
+    os.utime(pkg / "devices_manifest.json", ns=(2, 2))
+    assert "FakeThree" in util.discover()
+
+
+def test_discovery_keeps_known_types_visible(monkeypatch):
+    util.discover()
+
+    class Watched(dict[str, Any]):
+        """Fails if a known type is ever missing between two mutations,
+        where a lookup from another thread could land"""
+
+        def check(self):
+            assert "DemoDevice" in self
+
+        def clear(self):
+            super().clear()
+            self.check()
+
+        def update(self, *a: Any, **kw: Any):
+            super().update(*a, **kw)
+            self.check()
+
+        def pop(self, *a: Any):
+            r = super().pop(*a)
+            self.check()
+            return r
+
+        def __delitem__(self, k: str):
+            super().__delitem__(k)
+            self.check()
+
+    watched = Watched(util._known_device_types)
+    watched["StaleType"] = {}
+    monkeypatch.setattr(util, "_known_device_types", watched)
+    assert util.discover(rescan=True) is watched
+    assert "StaleType" not in watched